@@ -0,0 +1,49 @@
+# app/ciclo_filtros.py
+"""
+Filtros de ciclos por año e idioma, compartidos por todos los routers.
+
+`Ciclo.anio` es una columna generada (año de curso_inicio; si faltara, el
+prefijo 'YYYY-' del código) con índice (anio, idioma). Antes cada router
+filtraba a su manera (ILIKE sobre el código, substr OR extract...), sin índice
+y con resultados distintos entre pantallas; ahora todos pasan por aquí.
+"""
+import unicodedata
+from typing import Optional
+
+from sqlalchemy import false
+
+from .models import Ciclo, Idioma
+
+
+def idioma_de(idioma: Optional[str]) -> Optional[Idioma]:
+    """'Inglés' / 'INGLES' / 'ingles' → Idioma.ingles; None si no se reconoce."""
+    if not idioma:
+        return None
+    if isinstance(idioma, Idioma):
+        return idioma
+    s = unicodedata.normalize("NFKD", str(idioma).strip().lower())
+    s = "".join(ch for ch in s if not unicodedata.combining(ch))
+    try:
+        return Idioma(s)
+    except ValueError:
+        return None
+
+
+def filtro_anio(anio: int):
+    """Condición 'ciclo del año `anio`' (usa ix_ciclos_anio_idioma)."""
+    return Ciclo.anio == int(anio)
+
+
+def filtro_idioma(idioma: str):
+    """Condición por idioma (igualdad sobre el enum, usable por el índice); idioma desconocido → sin resultados."""
+    member = idioma_de(idioma)
+    return Ciclo.idioma == member if member is not None else false()
+
+
+def filtrar_ciclos(q, anio: Optional[int] = None, idioma: Optional[str] = None):
+    """Aplica los filtros opcionales de año e idioma a una consulta que incluye Ciclo."""
+    if anio:
+        q = q.filter(filtro_anio(anio))
+    if idioma:
+        q = q.filter(filtro_idioma(idioma))
+    return q
@@ -0,0 +1,111 @@
+# app/db_upgrades.py
+"""
+DDL idempotente que `create_all` no cubre: índices y columnas sobre tablas que
+ya existen en producción, extensiones, vistas materializadas.
+
+Se ejecuta en el arranque (después de create_all). Cada sentencia va en su
+propia transacción; si una falla (p. ej. falta de privilegios para CREATE
+EXTENSION) se registra y se continúa con las demás.
+"""
+import logging
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from .historial import resumen_backfill_sql
+from .models import CICLO_ANIO_SQL
+from . import ranking_docentes
+from .search import PERSONA_DOC_SQL
+
+logger = logging.getLogger("celex.db_upgrades")
+
+UPGRADES: list[tuple[str, str]] = [
+    # --- Búsqueda de comentarios de encuesta (full-text, configuración 'spanish') ---
+    (
+        "ix_survey_answers_value_text_fts",
+        "CREATE INDEX IF NOT EXISTS ix_survey_answers_value_text_fts "
+        "ON survey_answers USING gin (to_tsvector('spanish', coalesce(value_text, '')))",
+    ),
+    # Orden/keyset de comentarios por fecha
+    (
+        "ix_survey_answers_created_id",
+        "CREATE INDEX IF NOT EXISTS ix_survey_answers_created_id "
+        "ON survey_answers (created_at DESC, id DESC) WHERE value_text IS NOT NULL",
+    ),
+    # --- Búsqueda de personas: trigramas sin acentos (ver search.filtro_personas) ---
+    ("pg_trgm", "CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+    ("unaccent", "CREATE EXTENSION IF NOT EXISTS unaccent"),
+    (
+        # unaccent() no es IMMUTABLE; el envoltorio con diccionario fijo sí puede indexarse
+        "f_unaccent",
+        "CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text "
+        "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT "
+        "AS $$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$",
+    ),
+    (
+        "ix_users_search_trgm",
+        f"CREATE INDEX IF NOT EXISTS ix_users_search_trgm ON users USING gin ({PERSONA_DOC_SQL} gin_trgm_ops)",
+    ),
+    # --- Huella de la solicitud en idempotency_keys (ver idempotency._huella) ---
+    ("idempotency_keys_huella", "ALTER TABLE idempotency_keys ADD COLUMN IF NOT EXISTS huella varchar(64)"),
+    # --- Latido de report_jobs (ver report_jobs.marcar_huerfanos) ---
+    ("report_jobs_heartbeat_at", "ALTER TABLE report_jobs ADD COLUMN IF NOT EXISTS heartbeat_at timestamptz"),
+    # --- Llaves NOT NULL del keyset de listados (ver pagination.keyset_after) ---
+    *[
+        (
+            f"{tabla}_created_at_not_null",
+            "DO $$ BEGIN "
+            "IF EXISTS (SELECT 1 FROM information_schema.columns "
+            f"WHERE table_name = '{tabla}' AND column_name = 'created_at' AND is_nullable = 'YES') THEN "
+            # Filas viejas sin fecha: al final del orden DESC
+            f"UPDATE {tabla} SET created_at = to_timestamp(0) WHERE created_at IS NULL; "
+            f"ALTER TABLE {tabla} ALTER COLUMN created_at SET NOT NULL; "
+            "END IF; END $$",
+        )
+        for tabla in ("users", "ciclos")
+    ],
+    # --- Última inscripción por alumno (ver inscripcion_utils.actualizar_ultima_inscripcion) ---
+    (
+        "ix_inscripciones_alumno_created",
+        "CREATE INDEX IF NOT EXISTS ix_inscripciones_alumno_created "
+        "ON inscripciones (alumno_id, created_at DESC, id DESC)",
+    ),
+    (
+        # Rellena alumnos sin puntero (primera vez, o filas perdidas por borrados fuera de la API)
+        "alumno_ultima_inscripcion_backfill",
+        "INSERT INTO alumno_ultima_inscripcion (alumno_id, inscripcion_id, inscripcion_created_at) "
+        "SELECT DISTINCT ON (i.alumno_id) i.alumno_id, i.id, i.created_at "
+        "FROM inscripciones i "
+        "WHERE NOT EXISTS (SELECT 1 FROM alumno_ultima_inscripcion p WHERE p.alumno_id = i.alumno_id) "
+        "ORDER BY i.alumno_id, i.created_at DESC, i.id DESC "
+        "ON CONFLICT DO NOTHING",
+    ),
+    # --- Cola de revisión de coordinación (ver coordinacion_inscripciones.cola_revision) ---
+    (
+        "ix_inscripciones_pendientes",
+        "CREATE INDEX IF NOT EXISTS ix_inscripciones_pendientes "
+        "ON inscripciones (ciclo_id, created_at, id) WHERE validated_at IS NULL",
+    ),
+    # --- Resumen por inscripción (ver historial.recalcular_resumen) ---
+    ("inscripcion_summary_backfill", resumen_backfill_sql()),
+    # --- Año del ciclo para filtros (ver ciclo_filtros); antes que el ranking, que lo usa ---
+    (
+        "ciclos_anio",
+        "ALTER TABLE ciclos ADD COLUMN IF NOT EXISTS anio integer "
+        f"GENERATED ALWAYS AS ({CICLO_ANIO_SQL}) STORED",
+    ),
+    ("ix_ciclos_anio_idioma", "CREATE INDEX IF NOT EXISTS ix_ciclos_anio_idioma ON ciclos (anio, idioma)"),
+    # --- Ranking de docentes precalculado (ver ranking_docentes) ---
+    *ranking_docentes.UPGRADES,
+]
+
+
+def apply_db_upgrades(engine: Engine) -> None:
+    if engine.dialect.name != "postgresql":
+        return
+    for name, ddl in UPGRADES:
+        try:
+            with engine.begin() as conn:
+                conn.execute(text(ddl))
+        except Exception:
+            logger.exception("DB upgrade '%s' falló; se continúa", name)
@@ -0,0 +1,232 @@
+# app/docente_snapshot.py
+"""
+Snapshot del overview del docente (/docente/overview).
+
+- `calcular_snapshot` arma los cuatro indicadores (grupos activos, alumnos,
+  último grupo evaluado, satisfacción) en UN solo SELECT de sub-selects
+  escalares, más los ids de sus ciclos para poder invalidar por ciclo.
+- Caché en memoria por docente con stale-while-revalidate:
+    * fresco (< DOCENTE_OVERVIEW_TTL): se sirve tal cual;
+    * vencido pero < DOCENTE_OVERVIEW_STALE: se sirve y se recalcula en un hilo
+      (uno por docente a la vez);
+    * más viejo o invalidado: se calcula en el request.
+- Invalidación por evento, después del commit: inscripciones (alta, baja,
+  validación), guardado de evaluaciones y envío de encuestas llaman
+  `invalidar_overview`. Se guarda la hora de la última invalidación por docente
+  y por ciclo; un cálculo que empezó antes se descarta en vez de guardarse.
+  El TTL acota lo desfasado entre procesos.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal
+from .models import Ciclo, Evaluacion, Inscripcion, SurveyAnswer, SurveyResponse
+
+logger = logging.getLogger("celex.docente_snapshot")
+
+DOCENTE_OVERVIEW_TTL = float(os.getenv("DOCENTE_OVERVIEW_TTL", "60"))
+DOCENTE_OVERVIEW_STALE = float(os.getenv("DOCENTE_OVERVIEW_STALE", "900"))
+
+# Inscripciones que no cuentan como alumnos del docente
+ESTADOS_EXCLUIDOS = ("cancelada", "rechazada")
+
+
+# =========================
+#  Cálculo (una consulta)
+# =========================
+def _snapshot_select(docente_id: int):
+    ciclos_docente = select(Ciclo.id).where(Ciclo.docente_id == docente_id)
+
+    grupos = select(func.count(Ciclo.id)).where(Ciclo.docente_id == docente_id)
+    if hasattr(Ciclo, "curso_fin"):
+        grupos = grupos.where(Ciclo.curso_fin >= date.today())
+
+    alumnos = select(func.count(func.distinct(Inscripcion.alumno_id))).where(
+        Inscripcion.ciclo_id.in_(ciclos_docente)
+    )
+    if hasattr(Inscripcion, "status"):
+        alumnos = alumnos.where(~Inscripcion.status.in_(ESTADOS_EXCLUIDOS))
+
+    ultimo = (
+        select(Ciclo.codigo)
+        .join(Evaluacion, Evaluacion.ciclo_id == Ciclo.id)
+        .where(Ciclo.docente_id == docente_id)
+        .order_by(func.coalesce(Evaluacion.updated_at, Evaluacion.created_at).desc())
+        .limit(1)
+    )
+
+    sat = (
+        select(
+            func.coalesce(func.sum(SurveyAnswer.value_int), 0).label("suma"),
+            func.count(SurveyAnswer.value_int).label("n"),
+        )
+        .join(SurveyResponse, SurveyResponse.id == SurveyAnswer.response_id)
+        .where(SurveyResponse.ciclo_id.in_(ciclos_docente), SurveyAnswer.value_int.isnot(None))
+        .subquery("sat")
+    )
+
+    return select(
+        grupos.scalar_subquery().label("grupos_activos"),
+        alumnos.scalar_subquery().label("alumnos_total"),
+        ultimo.scalar_subquery().label("ultimo_grupo"),
+        select(func.array_agg(Ciclo.id)).where(Ciclo.docente_id == docente_id).scalar_subquery().label("ciclo_ids"),
+        sat.c.suma,
+        sat.c.n,
+    )
+
+
+def calcular_snapshot(db: Session, docente_id: int) -> Dict[str, Any]:
+    """Indicadores del overview + `ciclo_ids` (para invalidar)."""
+    r = db.execute(_snapshot_select(docente_id)).one()
+    n = int(r.n or 0)
+    if n > 0:
+        prom_int = float(r.suma or 0) / float(n)  # 1..5
+        satisfaccion = round((prom_int / 5.0) * 10.0, 2)  # 0..10
+    else:
+        satisfaccion = 0.0
+    return {
+        "grupos_activos": int(r.grupos_activos or 0),
+        "alumnos_total": int(r.alumnos_total or 0),
+        "satisfaccion_promedio": float(satisfaccion),
+        "ultimo_grupo": str(r.ultimo_grupo) if r.ultimo_grupo else None,
+        "ciclo_ids": [int(c) for c in (r.ciclo_ids or [])],
+    }
+
+
+# =========================
+#  Caché stale-while-revalidate
+# =========================
+class OverviewCache:
+    def __init__(self, ttl: float = DOCENTE_OVERVIEW_TTL, stale: float = DOCENTE_OVERVIEW_STALE,
+                 max_entries: int = 2048):
+        self.ttl = ttl
+        self.stale = max(stale, ttl)
+        self.max_entries = max_entries
+        self._data: dict = {}  # docente_id -> (calculado_en, frozenset(ciclo_ids), valor)
+        # Última invalidación (time.monotonic) por docente y por ciclo: un cálculo que
+        # empezó antes se descarta al guardarlo (pudo leer datos previos al commit)
+        self._inv_docente: Dict[int, float] = {}
+        self._inv_ciclo: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._refrescando: set = set()
+
+    def get(self, docente_id: int):
+        """(valor, vencido) o (None, False) si no hay nada servible."""
+        now = time.monotonic()
+        with self._lock:
+            hit = self._data.get(docente_id)
+        if not hit or now - hit[0] > self.stale:
+            return None, False
+        return hit[2], now - hit[0] > self.ttl
+
+    def put(self, docente_id: int, value: Dict[str, Any], inicio: float) -> bool:
+        """
+        Guarda un cálculo que empezó en `inicio` (time.monotonic() antes de consultar).
+        Chequeo y escritura en la misma sección crítica: se descarta (False) si el docente
+        o alguno de sus ciclos se invalidó desde `inicio`, o si ya hay un cálculo más nuevo.
+        """
+        now = time.monotonic()
+        ciclos = frozenset(value.get("ciclo_ids") or ())
+        with self._lock:
+            if now - inicio > self.stale:
+                return False  # más viejo que cualquier marca de invalidación conservada
+            if self._inv_docente.get(docente_id, -1.0) >= inicio:
+                return False
+            if any(self._inv_ciclo.get(c, -1.0) >= inicio for c in ciclos):
+                return False
+            hit = self._data.get(docente_id)
+            if hit is not None and hit[0] > inicio:
+                return False
+            if len(self._data) >= self.max_entries:
+                self._data = {k: v for k, v in self._data.items() if now - v[0] <= self.stale}
+                if len(self._data) >= self.max_entries:
+                    self._data.clear()
+            self._data[docente_id] = (inicio, ciclos, value)
+            return True
+
+    def _podar_marcas(self, now: float) -> None:
+        # Las marcas más viejas que `stale` ya no descartan nada (put rechaza esos cálculos)
+        for marcas in (self._inv_docente, self._inv_ciclo):
+            if len(marcas) >= self.max_entries:
+                vigentes = {k: t for k, t in marcas.items() if now - t <= self.stale}
+                marcas.clear()
+                marcas.update(vigentes)
+
+    def invalidar(self, docente_ids: Iterable[int] = (), ciclo_ids: Iterable[int] = ()) -> None:
+        docentes, ciclos = set(docente_ids), set(ciclo_ids)
+        if not docentes and not ciclos:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._podar_marcas(now)
+            for d in docentes:
+                self._inv_docente[d] = now
+            for c in ciclos:
+                self._inv_ciclo[c] = now
+            self._data = {
+                k: v for k, v in self._data.items()
+                if k not in docentes and not (v[1] & ciclos)
+            }
+
+    def marcar_refresco(self, docente_id: int) -> bool:
+        """True si este hilo debe recalcular (evita recálculos duplicados por docente)."""
+        with self._lock:
+            if docente_id in self._refrescando:
+                return False
+            self._refrescando.add(docente_id)
+            return True
+
+    def fin_refresco(self, docente_id: int) -> None:
+        with self._lock:
+            self._refrescando.discard(docente_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._inv_docente.clear()
+            self._inv_ciclo.clear()
+
+
+overview_cache = OverviewCache()
+
+
+def _revalidar(docente_id: int) -> None:
+    inicio = time.monotonic()
+    db = SessionLocal()
+    try:
+        overview_cache.put(docente_id, calcular_snapshot(db, docente_id), inicio)
+    except Exception:
+        logger.exception("Overview docente %s: falló el recálculo", docente_id)
+    finally:
+        db.close()
+        overview_cache.fin_refresco(docente_id)
+
+
+def obtener_snapshot(db: Session, docente_id: int) -> Dict[str, Any]:
+    """Snapshot del docente desde caché (stale-while-revalidate) o calculado en el momento."""
+    valor, vencido = overview_cache.get(docente_id)
+    if valor is not None:
+        if vencido and overview_cache.marcar_refresco(docente_id):
+            threading.Thread(
+                target=_revalidar, args=(docente_id,), name=f"overview-docente-{docente_id}", daemon=True
+            ).start()
+        return valor
+    inicio = time.monotonic()
+    valor = calcular_snapshot(db, docente_id)
+    overview_cache.put(docente_id, valor, inicio)  # no se guarda si hubo invalidación mientras tanto
+    return valor
+
+
+def invalidar_overview(docente_id: Optional[int] = None, ciclo_id: Optional[int] = None) -> None:
+    """Llamar después del commit de inscripciones, evaluaciones o encuestas."""
+    overview_cache.invalidar(
+        docente_ids=[docente_id] if docente_id is not None else (),
+        ciclo_ids=[ciclo_id] if ciclo_id is not None else (),
+    )
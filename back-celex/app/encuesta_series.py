@@ -0,0 +1,103 @@
+# app/encuesta_series.py
+"""
+Series de encuesta por (pregunta, ciclo) a partir de una sola consulta agrupada.
+
+`conteos()` trae (question_id, ciclo_id, value_int, value_bool, n) de todos los
+ciclos pedidos; el pivote a porcentajes se hace en memoria con las mismas reglas
+de siempre: likert_1_5 → promedio/5, scale_0_10 → promedio/10, yes_no → % de Sí.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from .models import SurveyAnswer, SurveyResponse
+
+# tipo → (mínimo, máximo) válidos de value_int; el máximo es también el divisor
+ESCALAS: Dict[str, Tuple[int, int]] = {"likert_1_5": (1, 5), "scale_0_10": (0, 10)}
+TIPOS_SERIE = ("likert_1_5", "scale_0_10", "yes_no")
+
+# (question_id, ciclo_id, value_int, value_bool, n)
+Conteo = Tuple[int, int, Optional[int], Optional[bool], int]
+
+
+def conteos(
+    db: Session, ciclo_ids: Iterable[int], question_ids: Optional[Iterable[int]] = None
+) -> List[Conteo]:
+    """Una consulta: respuestas no nulas agrupadas por (pregunta, ciclo, valor)."""
+    ciclo_ids = list(ciclo_ids)
+    if not ciclo_ids:
+        return []
+    q = (
+        db.query(
+            SurveyAnswer.question_id,
+            SurveyResponse.ciclo_id,
+            SurveyAnswer.value_int,
+            SurveyAnswer.value_bool,
+            func.count(),
+        )
+        .join(SurveyResponse, SurveyResponse.id == SurveyAnswer.response_id)
+        .filter(
+            SurveyResponse.ciclo_id.in_(ciclo_ids),
+            or_(SurveyAnswer.value_int.isnot(None), SurveyAnswer.value_bool.isnot(None)),
+        )
+    )
+    if question_ids is not None:
+        question_ids = list(question_ids)
+        if not question_ids:
+            return []
+        q = q.filter(SurveyAnswer.question_id.in_(question_ids))
+    rows = q.group_by(
+        SurveyAnswer.question_id, SurveyResponse.ciclo_id, SurveyAnswer.value_int, SurveyAnswer.value_bool
+    ).all()
+    return [(int(qid), int(cid), vi, vb, int(n or 0)) for qid, cid, vi, vb, n in rows]
+
+
+def pct_por_pregunta_ciclo(filas: Iterable[Conteo], tipos: Dict[int, str]) -> Dict[Tuple[int, int], float]:
+    """
+    {(question_id, ciclo_id): % 0..100 redondeado a 1 decimal} según el tipo de la pregunta.
+    Valores fuera de escala se ignoran; sin respuestas válidas no hay punto.
+    """
+    acum: Dict[Tuple[int, int], List[int]] = defaultdict(lambda: [0, 0])  # [suma | sí, total]
+    for qid, cid, vi, vb, n in filas:
+        tipo = tipos.get(qid)
+        if n <= 0:
+            continue
+        if tipo in ESCALAS:
+            lo, hi = ESCALAS[tipo]
+            if vi is None or not (lo <= vi <= hi):
+                continue
+            a = acum[(qid, cid)]
+            a[0] += vi * n
+            a[1] += n
+        elif tipo == "yes_no":
+            if vb is None:
+                continue
+            a = acum[(qid, cid)]
+            a[1] += n
+            if vb is True:
+                a[0] += n
+
+    out: Dict[Tuple[int, int], float] = {}
+    for (qid, cid), (suma, total) in acum.items():
+        if total <= 0:
+            continue
+        tipo = tipos[qid]
+        if tipo in ESCALAS:
+            prom = suma / total
+            out[(qid, cid)] = round((prom / float(ESCALAS[tipo][1])) * 100.0, 1)
+        else:
+            out[(qid, cid)] = round((suma / total) * 100.0, 1)
+    return out
+
+
+def promedio_crudo_por_ciclo(filas: Iterable[Conteo]) -> Dict[int, Tuple[float, int]]:
+    """{ciclo_id: (promedio de value_int sin normalizar por tipo, n)} sobre todas las preguntas."""
+    acum: Dict[int, List[int]] = defaultdict(lambda: [0, 0])
+    for _qid, cid, vi, _vb, n in filas:
+        if vi is None:
+            continue
+        acum[cid][0] += vi * n
+        acum[cid][1] += n
+    return {cid: (float(suma) / n, n) for cid, (suma, n) in acum.items() if n > 0}
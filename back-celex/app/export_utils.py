@@ -0,0 +1,121 @@
+# app/export_utils.py
+"""
+Exportación tabular (CSV/XLSX) en streaming.
+
+Los reportes entregan un encabezado y un iterable de filas (tuplas); aquí se
+serializan por bloques para que la memoria no crezca con el número de filas.
+"""
+import csv
+import io
+import os
+import tempfile
+from datetime import date, datetime
+from typing import Iterable, Iterator, Sequence
+
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+
+EXPORT_FORMATS = ("csv", "xlsx")
+
+CSV_MIME = "text/csv; charset=utf-8"
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+_CHUNK_ROWS = 500
+_CHUNK_BYTES = 64 * 1024
+
+
+def _plain(v):
+    """Enums → su valor; lo demás se deja igual."""
+    return getattr(v, "value", v)
+
+
+def _csv_cell(v):
+    v = _plain(v)
+    if v is None:
+        return ""
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    return v
+
+
+def _xlsx_cell(v):
+    v = _plain(v)
+    if isinstance(v, datetime) and v.tzinfo is not None:
+        # openpyxl no acepta datetimes con zona: se escribe en hora local del servidor
+        return v.astimezone().replace(tzinfo=None)
+    return v
+
+
+def iter_csv(header: Sequence[str], rows: Iterable[Sequence]) -> Iterator[bytes]:
+    """CSV UTF-8 con BOM (Excel lo abre con acentos correctos), emitido por bloques."""
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    buf.write("\ufeff")
+    w.writerow(header)
+    n = 0
+    for row in rows:
+        w.writerow([_csv_cell(v) for v in row])
+        n += 1
+        if n % _CHUNK_ROWS == 0:
+            yield buf.getvalue().encode("utf-8")
+            buf.seek(0)
+            buf.truncate(0)
+    yield buf.getvalue().encode("utf-8")
+
+
+def write_xlsx(fh, header: Sequence[str], rows: Iterable[Sequence], sheet_title: str = "Reporte") -> None:
+    """Escribe un XLSX en `fh` con openpyxl write_only (filas a disco, memoria constante)."""
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise HTTPException(status_code=415, detail="Exportación XLSX no disponible en el servidor (usa CSV)")
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(title=sheet_title[:31])
+    ws.append(list(header))
+    for row in rows:
+        ws.append([_xlsx_cell(v) for v in row])
+    wb.save(fh)
+
+
+def iter_xlsx(header: Sequence[str], rows: Iterable[Sequence], sheet_title: str = "Reporte") -> Iterator[bytes]:
+    """
+    El formato XLSX es un ZIP: se arma en un archivo temporal y luego se
+    transmite por bloques. Nunca se mantiene completo en memoria.
+    """
+    tmp = tempfile.NamedTemporaryFile(suffix=".xlsx", delete=False)
+    try:
+        with tmp:
+            write_xlsx(tmp, header, rows, sheet_title)
+        with open(tmp.name, "rb") as fh:
+            while True:
+                chunk = fh.read(_CHUNK_BYTES)
+                if not chunk:
+                    break
+                yield chunk
+    finally:
+        try:
+            os.remove(tmp.name)
+        except OSError:
+            pass
+
+
+def tabular_response(
+    formato: str,
+    filename: str,
+    header: Sequence[str],
+    rows: Iterable[Sequence],
+    sheet_title: str = "Reporte",
+) -> StreamingResponse:
+    """StreamingResponse CSV/XLSX con Content-Disposition de descarga."""
+    if formato == "csv":
+        body, media, ext = iter_csv(header, rows), CSV_MIME, "csv"
+    elif formato == "xlsx":
+        body, media, ext = iter_xlsx(header, rows, sheet_title), XLSX_MIME, "xlsx"
+    else:
+        raise HTTPException(status_code=400, detail="Formato no soportado (csv|xlsx)")
+    return StreamingResponse(
+        body,
+        media_type=media,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{ext}"'},
+    )
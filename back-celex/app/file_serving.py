@@ -0,0 +1,119 @@
+# app/file_serving.py
+"""
+Entrega de archivos subidos/generados (comprobantes, reportes).
+
+`servir_archivo()` reemplaza el `FileResponse` directo de los endpoints de
+descarga:
+  - ETag fuerte = sha256 del contenido. Se calcula una vez por archivo
+    (memoizado por ruta+tamaño+mtime; los uploads son de escritura única).
+  - `If-None-Match` → 304 sin leer ni enviar el archivo.
+  - Range / If-Range (PDFs grandes) → 206, lo resuelve FileResponse de Starlette
+    comparando contra nuestro ETag.
+  - FILE_SENDFILE_MODE=accel|sendfile → sólo encabezados `X-Accel-Redirect`
+    (nginx) o `X-Sendfile` (Apache/lighttpd); los bytes no pasan por Python.
+    En ese modo el servidor web se encarga de ETag/Range/304.
+
+Ejemplo nginx para FILE_ACCEL_ROOT=/srv/celex/uploads, FILE_ACCEL_PREFIX=/_protected/:
+    location /_protected/ { internal; alias /srv/celex/uploads/; }
+"""
+import hashlib
+import mimetypes
+import os
+from functools import lru_cache
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+FILE_SENDFILE_MODE = os.getenv("FILE_SENDFILE_MODE", "").strip().lower()  # "" | accel | sendfile
+FILE_ACCEL_ROOT = os.path.abspath(os.getenv("FILE_ACCEL_ROOT", "uploads"))
+FILE_ACCEL_PREFIX = "/" + os.getenv("FILE_ACCEL_PREFIX", "/_protected/").strip("/") + "/"
+
+# Privado (requiere sesión) pero revalidable: el navegador reusa su copia con un 304
+_CACHE_CONTROL = "private, no-cache"
+_HASH_CHUNK = 1024 * 1024
+
+
+@lru_cache(maxsize=4096)
+def _sha256(path: str, size: int, mtime_ns: int) -> str:
+    # size/mtime_ns sólo forman parte de la llave: si el archivo cambia, se recalcula
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for chunk in iter(lambda: fh.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _etag(path: str, st: os.stat_result) -> str:
+    return f'"{_sha256(path, st.st_size, st.st_mtime_ns)}"'
+
+
+def _if_none_match(request: Request, etag: str) -> bool:
+    raw = request.headers.get("if-none-match")
+    if not raw:
+        return False
+    if raw.strip() == "*":
+        return True
+    # Comparación débil (RFC 9110 §13.1.2): W/"x" coincide con "x"
+    return any(t.strip().removeprefix("W/") == etag for t in raw.split(","))
+
+
+def _content_disposition(filename: str, disposition: str) -> str:
+    # Mismo formato que FileResponse, para que el modo offload no cambie lo que ve el navegador
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+
+def _offload(path: str, media_type: str, filename: str, disposition: str) -> Optional[Response]:
+    headers = {
+        "Content-Disposition": _content_disposition(filename, disposition),
+        "Cache-Control": _CACHE_CONTROL,
+    }
+    if FILE_SENDFILE_MODE == "sendfile":
+        headers["X-Sendfile"] = path
+    elif FILE_SENDFILE_MODE == "accel":
+        rel = os.path.relpath(path, FILE_ACCEL_ROOT)
+        if rel.startswith(".."):
+            return None  # fuera de la raíz publicada por nginx: se sirve desde Python
+        headers["X-Accel-Redirect"] = FILE_ACCEL_PREFIX + rel.replace(os.sep, "/")
+    else:
+        return None
+    return Response(status_code=200, media_type=media_type, headers=headers)
+
+
+def servir_archivo(
+    request: Request,
+    path: str,
+    media_type: Optional[str] = None,
+    filename: Optional[str] = None,
+    disposition: str = "attachment",
+) -> Response:
+    """Respuesta de descarga para `path` (ya validado/autorizado por el endpoint)."""
+    path = os.path.abspath(path)
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+
+    filename = filename or os.path.basename(path)
+    media_type = media_type or mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    resp = _offload(path, media_type, filename, disposition)
+    if resp is not None:
+        return resp
+
+    etag = _etag(path, st)
+    if _if_none_match(request, etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": _CACHE_CONTROL})
+
+    return FileResponse(
+        path,
+        media_type=media_type,
+        filename=filename,
+        stat_result=st,
+        content_disposition_type=disposition,
+        headers={"ETag": etag, "Cache-Control": _CACHE_CONTROL},
+    )
@@ -0,0 +1,230 @@
+# app/historial.py
+"""
+Historial académico del alumno (compartido por /alumno/historial y
+/coordinacion/alumnos/{id}/historial).
+
+- `inscripcion_summary` guarda por inscripción los conteos de asistencia, los
+  porcentajes, subtotales y promedio. `recalcular_resumen` lo actualiza dentro de
+  la transacción de cada escritura de asistencia/evaluación/inscripción, así el
+  historial sólo lee filas (`historial_query` + `historial_filas`).
+- Caché en memoria por (alumno, filtros) con los ciclos que abarca; las escrituras
+  de calificaciones/asistencia invalidan por ciclo y las de inscripciones por
+  alumno. El TTL acota lo que pueda quedar desfasado entre procesos.
+"""
+import os
+import threading
+import time
+from typing import Any, Hashable, Iterable, Optional
+
+from sqlalchemy import and_, case, func, select, true
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, aliased, noload
+
+from .models import Ciclo, Evaluacion, Inscripcion, InscripcionSummary, User
+from . import models_asistencia as ma
+
+HISTORIAL_CACHE_TTL = float(os.getenv("HISTORIAL_CACHE_TTL", "300"))
+
+
+class HistorialCache:
+    def __init__(self, ttl: float = HISTORIAL_CACHE_TTL, max_entries: int = 2048):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: dict = {}  # key -> (expira, alumno_id, frozenset(ciclo_ids), valor)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            hit = self._data.get(key)
+            if hit and hit[0] > now:
+                return hit[3]
+        return None
+
+    def put(self, key: Hashable, value: Any, alumno_id: int, ciclo_ids: Iterable[int]) -> None:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._data) >= self.max_entries:
+                self._data = {k: v for k, v in self._data.items() if v[0] > now}
+                if len(self._data) >= self.max_entries:
+                    self._data.clear()
+            self._data[key] = (now + self.ttl, alumno_id, frozenset(ciclo_ids), value)
+
+    def invalidar(self, alumno_ids: Iterable[int] = (), ciclo_ids: Iterable[int] = ()) -> None:
+        alumnos, ciclos = set(alumno_ids), set(ciclo_ids)
+        if not alumnos and not ciclos:
+            return
+        with self._lock:
+            self._data = {
+                k: v for k, v in self._data.items()
+                if v[1] not in alumnos and not (v[2] & ciclos)
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+historial_cache = HistorialCache()
+
+
+def invalidar_historial(alumno_id: Optional[int] = None, ciclo_id: Optional[int] = None) -> None:
+    """Llamar después del commit de cualquier escritura que cambie el historial."""
+    historial_cache.invalidar(
+        alumno_ids=[alumno_id] if alumno_id is not None else (),
+        ciclo_ids=[ciclo_id] if ciclo_id is not None else (),
+    )
+
+
+# ==========================================================
+# Resumen por inscripción
+# ==========================================================
+PESO_RETARDO = 0.5  # presente=1, justificado=1, retardo=0.5, ausente=0
+
+_RESUMEN_COLS = [
+    "inscripcion_id", "ciclo_id",
+    "registros_total", "presentes", "ausentes", "retardos", "justificados", "sesiones_ciclo",
+    "asistencia_pct", "asistencia_pct_ponderada",
+    "medio_subtotal", "final_subtotal", "promedio",
+]
+
+
+def _resumen_select():
+    """SELECT que calcula una fila de inscripcion_summary por inscripción (columnas de _RESUMEN_COLS)."""
+    AR, AS, E = ma.AsistenciaRegistro, ma.AsistenciaSesion, Evaluacion
+
+    reg = (
+        select(
+            func.count(AR.id).label("total"),
+            func.count(AR.id).filter(AR.estado == "presente").label("presentes"),
+            func.count(AR.id).filter(AR.estado == "ausente").label("ausentes"),
+            func.count(AR.id).filter(AR.estado == "retardo").label("retardos"),
+            func.count(AR.id).filter(AR.estado == "justificado").label("justificados"),
+        )
+        .where(AR.inscripcion_id == Inscripcion.id)
+        .correlate(Inscripcion)
+        .lateral("reg")
+    )
+    ses = (
+        select(func.count(AS.id).label("total"))
+        .where(AS.ciclo_id == Inscripcion.ciclo_id)
+        .correlate(Inscripcion)
+        .lateral("ses")
+    )
+
+    medio = case(
+        (and_(E.medio_examen.is_(None), E.medio_continua.is_(None)), None),
+        else_=func.coalesce(E.medio_examen, 0) + func.coalesce(E.medio_continua, 0),
+    )
+    final = case(
+        (and_(E.final_examen.is_(None), E.final_continua.is_(None), E.final_tarea.is_(None)), None),
+        else_=func.coalesce(E.final_examen, 0) + func.coalesce(E.final_continua, 0) + func.coalesce(E.final_tarea, 0),
+    )
+    promedio = case(
+        (E.id.is_(None), None),
+        else_=(func.coalesce(medio, 0) + func.coalesce(final, 0)) / 2.0,
+    )
+    pct = case(
+        (reg.c.total > 0, func.round(reg.c.presentes * 100.0 / reg.c.total, 1)),
+        else_=0,
+    )
+    pct_ponderada = case(
+        (ses.c.total > 0, func.round(
+            (reg.c.presentes + reg.c.justificados + reg.c.retardos * PESO_RETARDO) * 100.0 / ses.c.total, 2
+        )),
+        else_=0,
+    )
+
+    return (
+        select(
+            Inscripcion.id, Inscripcion.ciclo_id,
+            reg.c.total, reg.c.presentes, reg.c.ausentes, reg.c.retardos, reg.c.justificados, ses.c.total,
+            pct, pct_ponderada,
+            medio, final, promedio,
+        )
+        .select_from(Inscripcion)
+        .outerjoin(E, E.inscripcion_id == Inscripcion.id)
+        .join(reg, true())
+        .join(ses, true())
+    )
+
+
+def recalcular_resumen(
+    db: Session,
+    inscripcion_ids: Optional[Iterable[int]] = None,
+    ciclo_id: Optional[int] = None,
+) -> None:
+    """
+    Recalcula inscripcion_summary para las inscripciones dadas o para todo un ciclo
+    (p. ej. al generar sesiones cambia el denominador de todos). Upsert en un solo
+    statement; no hace commit.
+    """
+    sel = _resumen_select()
+    if inscripcion_ids is not None:
+        ids = sorted({int(i) for i in inscripcion_ids})
+        if not ids:
+            return
+        sel = sel.where(Inscripcion.id.in_(ids))
+    elif ciclo_id is not None:
+        sel = sel.where(Inscripcion.ciclo_id == ciclo_id)
+    else:
+        raise ValueError("recalcular_resumen requiere inscripcion_ids o ciclo_id")
+
+    t = InscripcionSummary.__table__
+    stmt = pg_insert(t).from_select(_RESUMEN_COLS, sel)
+    set_ = {c: stmt.excluded[c] for c in _RESUMEN_COLS[1:]}
+    set_["updated_at"] = func.now()
+    stmt = stmt.on_conflict_do_update(index_elements=[t.c.inscripcion_id], set_=set_)
+    db.execute(stmt)
+
+
+def resumen_backfill_sql() -> str:
+    """INSERT de las inscripciones sin resumen (lo ejecuta db_upgrades al arrancar)."""
+    t = InscripcionSummary.__table__
+    sel = _resumen_select().where(
+        ~select(t.c.inscripcion_id).where(t.c.inscripcion_id == Inscripcion.id).exists()
+    )
+    stmt = pg_insert(t).from_select(_RESUMEN_COLS, sel).on_conflict_do_nothing()
+    return str(stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+# ==========================================================
+# Lectura
+# ==========================================================
+def historial_query(db: Session, alumno_id: int):
+    """
+    Inscripciones del alumno con su Ciclo, Evaluacion, InscripcionSummary y docente
+    (doc_id, doc_first_name, doc_last_name, doc_email). Sin agregaciones: cada
+    endpoint agrega sus filtros y orden.
+    """
+    Docente = aliased(User)
+    return (
+        db.query(
+            Inscripcion, Ciclo, Evaluacion, InscripcionSummary,
+            Docente.id.label("doc_id"),
+            Docente.first_name.label("doc_first_name"),
+            Docente.last_name.label("doc_last_name"),
+            Docente.email.label("doc_email"),
+        )
+        .join(Ciclo, Ciclo.id == Inscripcion.ciclo_id)
+        .outerjoin(Evaluacion, Evaluacion.inscripcion_id == Inscripcion.id)
+        .outerjoin(InscripcionSummary, InscripcionSummary.inscripcion_id == Inscripcion.id)
+        .outerjoin(Docente, Docente.id == Ciclo.docente_id)
+        .options(noload(Ciclo.docente), noload(Evaluacion.inscripcion), noload(Evaluacion.ciclo))
+        .filter(Inscripcion.alumno_id == alumno_id)
+    )
+
+
+def historial_filas(db: Session, q) -> list:
+    """
+    Ejecuta `q` (de historial_query). Si alguna inscripción aún no tiene resumen
+    (escrita por una ruta que no lo mantiene), se calcula y se vuelve a leer.
+    """
+    rows = q.all()
+    faltan = [r.Inscripcion.id for r in rows if r.InscripcionSummary is None]
+    if faltan:
+        recalcular_resumen(db, inscripcion_ids=faltan)
+        db.commit()
+        rows = q.all()
+    return rows
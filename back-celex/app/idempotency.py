@@ -0,0 +1,210 @@
+# app/idempotency.py
+"""
+Soporte de encabezado `Idempotency-Key` para POST con archivos.
+
+Si el cliente manda la llave, la primera solicitud reserva una fila en
+`idempotency_keys` (commit inmediato) y al terminar guarda el código y el
+cuerpo de la respuesta. Un reintento con la misma llave:
+  - ya terminado  → se devuelve la respuesta guardada sin volver a procesar
+                    (no se re-suben ni re-guardan archivos);
+  - aún en curso  → 409 con Retry-After;
+  - otra ruta o otros campos identificadores (p. ej. otro ciclo_id)
+                  → 422 (la llave es de otra solicitud).
+Los errores no se guardan: la fila se borra y el reintento se ejecuta de nuevo.
+Sin encabezado el endpoint funciona igual que antes.
+"""
+import hashlib
+import json
+import os
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Optional, Sequence, Tuple
+
+from fastapi import HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+# Una solicitud "en curso" más vieja que esto se considera abandonada (proceso caído)
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "120"))
+
+_KEY_MAX = 128
+_PURGA_LOTE = 200
+# Si la fila desaparece entre el INSERT y el SELECT (la original falló y la borró), se reintenta
+_RESERVAR_INTENTOS = 3
+
+
+def _purgar_vencidas(db: Session) -> None:
+    """Borra un lote acotado de llaves vencidas (se llama al crear llaves nuevas)."""
+    vencidas = (
+        select(IdempotencyKey.id)
+        .where(IdempotencyKey.expires_at < func.now())
+        .limit(_PURGA_LOTE)
+    )
+    db.execute(delete(IdempotencyKey).where(IdempotencyKey.id.in_(vencidas)))
+
+
+async def _huella(request: Request, campos: Sequence[str]) -> Optional[str]:
+    """
+    sha256 de los `campos` del cuerpo (JSON o formulario) que identifican la solicitud.
+    Starlette guarda el cuerpo ya parseado en el request: el endpoint no lo vuelve a leer.
+    """
+    if not campos:
+        return None
+    valores: dict = {}
+    try:
+        if "application/json" in (request.headers.get("content-type") or "").lower():
+            datos = await request.json()
+            if isinstance(datos, dict):
+                valores = {c: datos.get(c) for c in campos}
+        else:
+            form = await request.form()
+            valores = {c: form.get(c) for c in campos if isinstance(form.get(c), (str, type(None)))}
+    except Exception:
+        valores = {}  # cuerpo inválido: el endpoint responde el error
+    normalizados = {c: None if v is None else str(v).strip() for c, v in valores.items()}
+    return hashlib.sha256(json.dumps(normalizados, sort_keys=True).encode()).hexdigest()
+
+
+def _reservar(
+    db: Session, user_id: int, alcance: str, key: str, ruta: str, huella: Optional[str] = None
+) -> Tuple[Optional[int], Optional[JSONResponse]]:
+    """(id de la fila reservada, None) o (None, respuesta guardada para repetir)."""
+    expira = func.now() + timedelta(hours=IDEMPOTENCY_TTL_HOURS)
+    for _intento in range(_RESERVAR_INTENTOS):
+        nuevo_id = db.execute(
+            pg_insert(IdempotencyKey)
+            .values(user_id=user_id, alcance=alcance, key=key, ruta=ruta, huella=huella, expires_at=expira)
+            .on_conflict_do_nothing(constraint="uq_idempotency_user_alcance_key")
+            .returning(IdempotencyKey.id)
+        ).scalar()
+        if nuevo_id is not None:
+            _purgar_vencidas(db)
+            db.commit()
+            return nuevo_id, None
+
+        existente = (
+            db.query(
+                IdempotencyKey,
+                (IdempotencyKey.expires_at <= func.now()).label("vencida"),
+                (IdempotencyKey.started_at < func.now() - timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)).label("abandonada"),
+            )
+            .filter(
+                IdempotencyKey.user_id == user_id,
+                IdempotencyKey.alcance == alcance,
+                IdempotencyKey.key == key,
+            )
+            .with_for_update(of=IdempotencyKey)
+            .one_or_none()
+        )
+        if existente is not None:
+            break
+        # La solicitud original la abandonó (borró la fila) entre el INSERT y el SELECT: reintentar
+        db.rollback()
+    else:
+        raise HTTPException(
+            status_code=409,
+            detail="Hay una solicitud con esta Idempotency-Key en proceso; reintenta en unos segundos",
+            headers={"Retry-After": "2"},
+        )
+    row, vencida, abandonada = existente
+
+    if vencida:
+        # Llave vieja: se reutiliza la fila como si fuera nueva
+        row.ruta = ruta
+        row.huella = huella
+        row.status_code = None
+        row.response_body = None
+        row.completed_at = None
+        row.started_at = func.now()
+        row.expires_at = expira
+        db.commit()
+        return row.id, None
+
+    # Filas previas a la columna huella (NULL) sólo se comparan por ruta
+    if row.ruta != ruta or (row.huella is not None and row.huella != huella):
+        db.rollback()
+        raise HTTPException(status_code=422, detail="Idempotency-Key ya usada con otra solicitud")
+
+    if row.completed_at is not None:
+        replay = JSONResponse(
+            content=row.response_body,
+            status_code=row.status_code or 200,
+            headers={"Idempotent-Replayed": "true"},
+        )
+        db.rollback()
+        return None, replay
+
+    if abandonada:
+        row.started_at = func.now()
+        db.commit()
+        return row.id, None
+
+    db.rollback()
+    raise HTTPException(
+        status_code=409,
+        detail="Hay una solicitud con esta Idempotency-Key en proceso; reintenta en unos segundos",
+        headers={"Retry-After": "2"},
+    )
+
+
+def _completar(db: Session, row_id: int, status_code: int, body: Any) -> None:
+    db.query(IdempotencyKey).filter(IdempotencyKey.id == row_id).update(
+        {
+            IdempotencyKey.status_code: status_code,
+            IdempotencyKey.response_body: body,
+            IdempotencyKey.completed_at: func.now(),
+        },
+        synchronize_session=False,
+    )
+    db.commit()
+
+
+def _abandonar(db: Session, row_id: int) -> None:
+    db.rollback()
+    db.query(IdempotencyKey).filter(IdempotencyKey.id == row_id).delete(synchronize_session=False)
+    db.commit()
+
+
+async def idempotente(
+    request: Request,
+    db: Session,
+    user_id: int,
+    alcance: str,
+    fn: Callable[[], Awaitable[Any]],
+    response: Optional[Response] = None,
+    status_code: int = 200,
+    campos: Sequence[str] = (),
+) -> Any:
+    """
+    Ejecuta `fn` respetando Idempotency-Key si viene en la solicitud.
+    `status_code` es el código por defecto del endpoint; si `fn` lo cambia vía
+    `response.status_code` (p.ej. 200 por "ya existía"), se guarda ese.
+    `campos`: campos del cuerpo que, junto con la ruta, identifican la solicitud
+    (la misma llave con otro valor → 422 en vez de repetir la respuesta).
+    """
+    key = (request.headers.get(IDEMPOTENCY_HEADER) or "").strip()
+    if not key:
+        return await fn()
+    if len(key) > _KEY_MAX:
+        raise HTTPException(status_code=422, detail=f"Idempotency-Key demasiado larga (máx. {_KEY_MAX})")
+
+    huella = await _huella(request, campos)
+    row_id, replay = _reservar(db, user_id, alcance, key, request.url.path, huella)
+    if replay is not None:
+        return replay
+
+    try:
+        result = await fn()
+    except BaseException:
+        _abandonar(db, row_id)
+        raise
+
+    code = (response.status_code if response is not None else None) or status_code
+    _completar(db, row_id, code, jsonable_encoder(result))
+    return result
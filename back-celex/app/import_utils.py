@@ -0,0 +1,71 @@
+# app/import_utils.py
+"""
+Importación tabular (CSV/XLSX): contraparte de export_utils.
+
+Lectura fila por fila (sin cargar el archivo completo) y normalización de
+encabezados e identificadores de alumno, compartidas por las importaciones de
+calificaciones (docente_evaluaciones) y de niveles de colocación (placement_teacher).
+"""
+import csv
+import io
+import unicodedata
+
+from fastapi import HTTPException, UploadFile
+
+# Alias de encabezados comunes → nombre canónico
+_HEADER_ALIAS = {"correo": "email", "id_inscripcion": "inscripcion_id"}
+
+
+def norm_header(h) -> str:
+    h = unicodedata.normalize("NFKD", str(h or "")).encode("ascii", "ignore").decode()
+    h = h.strip().lower().replace(" ", "_").replace("-", "_")
+    return _HEADER_ALIAS.get(h, h)
+
+
+def iter_filas(archivo: UploadFile):
+    """
+    Genera las filas del archivo (lista de celdas) sin cargarlo completo en memoria.
+    CSV con el módulo estándar; XLSX con openpyxl en modo read_only.
+    """
+    nombre = (archivo.filename or "").lower()
+    if nombre.endswith(".xlsx"):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise HTTPException(status_code=415, detail="Soporte XLSX no disponible en el servidor (usa CSV)")
+        try:
+            wb = load_workbook(archivo.file, read_only=True, data_only=True)
+        except Exception:
+            raise HTTPException(status_code=400, detail="Archivo XLSX inválido")
+        try:
+            for row in wb.active.iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            wb.close()
+    elif nombre.endswith(".csv") or (archivo.content_type or "").lower() in ("text/csv", "application/csv"):
+        texto = io.TextIOWrapper(archivo.file, encoding="utf-8-sig", errors="replace", newline="")
+        try:
+            muestra = texto.read(4096)
+            texto.seek(0)
+            try:
+                dialecto = csv.Sniffer().sniff(muestra, delimiters=",;\t")
+            except csv.Error:
+                dialecto = csv.excel
+            for row in csv.reader(texto, dialecto):
+                yield row
+        finally:
+            texto.detach()
+    else:
+        raise HTTPException(status_code=415, detail="Formato no soportado (usa .csv o .xlsx)")
+
+
+def norm_id(col: str, v) -> str:
+    """Identificador de alumno comparable: CURP en mayúsculas, email en minúsculas."""
+    if isinstance(v, float) and v.is_integer():
+        v = int(v)  # XLSX devuelve 2020123456.0 para boletas numéricas
+    v = str(v).strip()
+    if col == "curp":
+        return v.upper()
+    if col == "email":
+        return v.lower()
+    return v
@@ -0,0 +1,46 @@
+# app/inscripcion_utils.py
+"""
+Datos derivados de las inscripciones que se mantienen al escribir
+(en lugar de recalcularlos en cada listado).
+"""
+from typing import Iterable
+
+from sqlalchemy import select, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from .models import AlumnoUltimaInscripcion, Inscripcion
+
+
+def actualizar_ultima_inscripcion(db: Session, alumno_ids: Iterable[int]) -> None:
+    """
+    Recalcula el puntero alumno → inscripción más reciente para `alumno_ids`.
+    Llamar dentro de la misma transacción que crea/borra la inscripción (después
+    de flush); no hace commit.
+
+    El upsert sólo avanza el puntero, así dos inscripciones concurrentes del mismo
+    alumno no lo regresan. Si la inscripción apuntada se borra, el FK en cascada
+    elimina la fila y aquí se inserta la siguiente más reciente.
+    """
+    ids = sorted({int(a) for a in alumno_ids if a is not None})
+    if not ids:
+        return
+
+    mas_reciente = (
+        select(Inscripcion.alumno_id, Inscripcion.id, Inscripcion.created_at)
+        .where(Inscripcion.alumno_id.in_(ids))
+        .distinct(Inscripcion.alumno_id)
+        .order_by(Inscripcion.alumno_id, Inscripcion.created_at.desc(), Inscripcion.id.desc())
+    )
+    t = AlumnoUltimaInscripcion.__table__
+    stmt = pg_insert(t).from_select(["alumno_id", "inscripcion_id", "inscripcion_created_at"], mas_reciente)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.c.alumno_id],
+        set_={
+            "inscripcion_id": stmt.excluded.inscripcion_id,
+            "inscripcion_created_at": stmt.excluded.inscripcion_created_at,
+        },
+        where=tuple_(stmt.excluded.inscripcion_created_at, stmt.excluded.inscripcion_id)
+        > tuple_(t.c.inscripcion_created_at, t.c.inscripcion_id),
+    )
+    db.execute(stmt)
@@ -0,0 +1,340 @@
+# app/lista_espera.py
+"""
+Lista de espera FIFO para ciclos y exámenes de colocación llenos.
+
+- El alumno se forma (routers/alumno_lista_espera.py) en lugar de reintentar
+  la inscripción en bucle. Su posición es un conteo sobre el índice
+  (destino, status, created_at, id).
+- Quien libera un lugar (cancelar/rechazar inscripción o registro, subir el
+  cupo, soltar un apartado) llama a `despertar(...)` tras su commit.
+- Un hilo por proceso (el "promotor") bloquea la fila del ciclo/examen (igual
+  que la inscripción), admite a los siguientes en la fila hasta llenar los
+  lugares libres y les avisa por correo. La admisión reserva el lugar durante
+  LISTA_ESPERA_HORAS:
+    * ciclos: _check_cupo cuenta las admisiones vigentes de otros alumnos;
+    * exámenes: se crea un PlacementHold que vence al mismo tiempo.
+- Además de los avisos, cada LISTA_ESPERA_PERIODO segundos revisa todos los
+  destinos con gente esperando y expira admisiones no usadas.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func, tuple_, update
+from sqlalchemy.orm import Session, lazyload
+
+from .database import SessionLocal
+from .email_utils import send_email
+from .models import (
+    Ciclo,
+    Inscripcion,
+    ListaEspera,
+    ListaEsperaStatus,
+    PlacementExam,
+    User,
+)
+from . import placement_capacity, placement_holds
+
+logger = logging.getLogger("celex.lista_espera")
+
+LISTA_ESPERA_HORAS = int(os.getenv("LISTA_ESPERA_HORAS", "24"))
+LISTA_ESPERA_PERIODO = int(os.getenv("LISTA_ESPERA_PERIODO", "60"))
+
+# Inscripciones que ocupan lugar (mismo criterio que alumno_inscripciones._check_cupo)
+INSC_ACTIVAS = ("registrada", "preinscrita", "confirmada")
+
+ABIERTAS = (ListaEsperaStatus.ESPERANDO, ListaEsperaStatus.ADMITIDA)
+
+# (ciclo_id, exam_id) con exactamente uno de los dos
+Destino = Tuple[Optional[int], Optional[int]]
+
+
+def _destino_filter(ciclo_id: Optional[int] = None, exam_id: Optional[int] = None):
+    if ciclo_id is not None:
+        return ListaEspera.ciclo_id == ciclo_id
+    return ListaEspera.exam_id == exam_id
+
+
+# =========================
+#  Consultas
+# =========================
+def admitidos_vigentes(db: Session, ciclo_id: int, excluir_alumno_id: Optional[int] = None) -> int:
+    """Lugares de un ciclo ofrecidos a la lista de espera que aún no vencen."""
+    q = db.query(func.count(ListaEspera.id)).filter(
+        ListaEspera.ciclo_id == ciclo_id,
+        ListaEspera.status == ListaEsperaStatus.ADMITIDA,
+        ListaEspera.admitida_hasta > func.now(),
+    )
+    if excluir_alumno_id is not None:
+        q = q.filter(ListaEspera.alumno_id != excluir_alumno_id)
+    return q.scalar() or 0
+
+
+def lugares_libres_ciclo(db: Session, ciclo: Ciclo, alumno_id: Optional[int] = None) -> int:
+    inscritos = (
+        db.query(func.count(Inscripcion.id))
+        .filter(Inscripcion.ciclo_id == ciclo.id, Inscripcion.status.in_(INSC_ACTIVAS))
+        .scalar()
+        or 0
+    )
+    ofrecidos = admitidos_vigentes(db, ciclo.id, excluir_alumno_id=alumno_id)
+    return max((ciclo.cupo_total or 0) - inscritos - ofrecidos, 0)
+
+
+def posicion(db: Session, entry: ListaEspera) -> Optional[int]:
+    """Lugar en la fila (1 = el siguiente). None si ya no está esperando."""
+    if entry.status != ListaEsperaStatus.ESPERANDO:
+        return None
+    antes = (
+        db.query(func.count(ListaEspera.id))
+        .filter(
+            _destino_filter(entry.ciclo_id, entry.exam_id),
+            ListaEspera.status == ListaEsperaStatus.ESPERANDO,
+            tuple_(ListaEspera.created_at, ListaEspera.id) < tuple_(entry.created_at, entry.id),
+        )
+        .scalar()
+        or 0
+    )
+    return antes + 1
+
+
+def turno_abierto(
+    db: Session, alumno_id: int, ciclo_id: Optional[int] = None, exam_id: Optional[int] = None
+) -> Optional[ListaEspera]:
+    return (
+        db.query(ListaEspera)
+        .filter(
+            _destino_filter(ciclo_id, exam_id),
+            ListaEspera.alumno_id == alumno_id,
+            ListaEspera.status.in_(ABIERTAS),
+        )
+        .first()
+    )
+
+
+def cerrar_espera(db: Session, alumno_id: int, ciclo_id: Optional[int] = None, exam_id: Optional[int] = None) -> None:
+    """El alumno ya se inscribió/registró: su turno abierto queda como INSCRITA. No hace commit."""
+    db.query(ListaEspera).filter(
+        _destino_filter(ciclo_id, exam_id),
+        ListaEspera.alumno_id == alumno_id,
+        ListaEspera.status.in_(ABIERTAS),
+    ).update(
+        {ListaEspera.status: ListaEsperaStatus.INSCRITA, ListaEspera.cerrada_at: func.now()},
+        synchronize_session=False,
+    )
+
+
+# =========================
+#  Promoción
+# =========================
+def _siguientes(db: Session, destino: Destino, n: int) -> List[ListaEspera]:
+    return (
+        db.query(ListaEspera)
+        .filter(_destino_filter(*destino), ListaEspera.status == ListaEsperaStatus.ESPERANDO)
+        .order_by(ListaEspera.created_at.asc(), ListaEspera.id.asc())
+        .limit(n)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+
+def promover(db: Session, ciclo_id: Optional[int] = None, exam_id: Optional[int] = None) -> List[ListaEspera]:
+    """
+    Admite a los siguientes en la fila según los lugares libres del destino.
+    Bloquea la fila del ciclo/examen como lo hace la inscripción. No hace commit.
+    """
+    hasta = datetime.now(timezone.utc) + timedelta(hours=LISTA_ESPERA_HORAS)
+
+    if ciclo_id is not None:
+        ciclo = (
+            db.query(Ciclo)
+            .options(lazyload("*"))
+            .filter(Ciclo.id == ciclo_id)
+            .with_for_update(of=Ciclo)
+            .first()
+        )
+        # Con la ventana cerrada el admitido ya no podría inscribirse
+        if not ciclo or (ciclo.insc_fin and ciclo.insc_fin < date.today()):
+            return []
+        libres = lugares_libres_ciclo(db, ciclo)
+        admitidos = _siguientes(db, (ciclo_id, None), libres) if libres > 0 else []
+    else:
+        exam = (
+            db.query(PlacementExam)
+            .options(lazyload("*"))
+            .filter(PlacementExam.id == exam_id)
+            .with_for_update(of=PlacementExam)
+            .first()
+        )
+        if not exam or not bool(exam.activo):
+            return []
+        libres = placement_holds.lugares_libres(db, exam)
+        admitidos = _siguientes(db, (None, exam_id), libres) if libres > 0 else []
+        for e in admitidos:
+            placement_holds.apartar(db, exam_id, e.alumno_id, hasta)
+        if admitidos:
+            placement_capacity.notificar(db, [exam_id])
+
+    for e in admitidos:
+        e.status = ListaEsperaStatus.ADMITIDA
+        e.admitida_at = func.now()
+        e.admitida_hasta = hasta
+    return admitidos
+
+
+def expirar_admisiones(db: Session) -> Set[Destino]:
+    """Admisiones vencidas sin inscripción → EXPIRADA. Devuelve los destinos con lugar liberado."""
+    rows = db.execute(
+        update(ListaEspera)
+        .where(
+            ListaEspera.status == ListaEsperaStatus.ADMITIDA,
+            ListaEspera.admitida_hasta <= func.now(),
+        )
+        .values(status=ListaEsperaStatus.EXPIRADA, cerrada_at=func.now())
+        .returning(ListaEspera.ciclo_id, ListaEspera.exam_id)
+    ).all()
+    return {(r[0], r[1]) for r in rows}
+
+
+def destinos_con_espera(db: Session) -> Set[Destino]:
+    rows = (
+        db.query(ListaEspera.ciclo_id, ListaEspera.exam_id)
+        .filter(ListaEspera.status == ListaEsperaStatus.ESPERANDO)
+        .distinct()
+        .all()
+    )
+    return {(r[0], r[1]) for r in rows}
+
+
+def _aviso_admision(db: Session, entry: ListaEspera) -> None:
+    alumno = db.get(User, entry.alumno_id)
+    if not alumno or not alumno.email:
+        return
+    if entry.ciclo_id is not None:
+        ciclo = db.get(Ciclo, entry.ciclo_id)
+        que = f"el ciclo {getattr(ciclo, 'codigo', entry.ciclo_id)}"
+    else:
+        exam = db.get(PlacementExam, entry.exam_id)
+        que = f"el examen de colocación {getattr(exam, 'codigo', entry.exam_id)}"
+    hasta = entry.admitida_hasta.astimezone().strftime("%d/%m/%Y %H:%M") if entry.admitida_hasta else ""
+    nombre = (alumno.first_name or "").strip()
+    html = (
+        f"<p>Hola {nombre},</p>"
+        f"<p>Se liberó un lugar en {que} y es tuyo por estar en la lista de espera.</p>"
+        f"<p>Tienes hasta el <b>{hasta}</b> para completar tu inscripción en CELEX; "
+        f"después el lugar pasa a la siguiente persona.</p>"
+    )
+    text_alt = (
+        f"Hola {nombre}. Se liberó un lugar en {que}. "
+        f"Completa tu inscripción antes del {hasta}; después el lugar pasa a la siguiente persona."
+    )
+    send_email(alumno.email, "CELEX: tienes un lugar disponible", html, text_alt)
+
+
+def procesar(destinos: Iterable[Destino]) -> int:
+    """Una transacción por destino; los correos salen después del commit."""
+    total = 0
+    for ciclo_id, exam_id in destinos:
+        db = SessionLocal()
+        try:
+            admitidos = promover(db, ciclo_id=ciclo_id, exam_id=exam_id)
+            db.commit()
+            for e in admitidos:
+                try:
+                    _aviso_admision(db, e)
+                    e.notificada_at = func.now()
+                    db.commit()
+                except Exception:
+                    db.rollback()
+                    logger.exception("No se pudo avisar admisión id=%s", e.id)
+            total += len(admitidos)
+        except Exception:
+            db.rollback()
+            logger.exception("Promoción de lista de espera falló: ciclo=%s exam=%s", ciclo_id, exam_id)
+        finally:
+            db.close()
+    return total
+
+
+# =========================
+#  Promotor (un hilo por proceso)
+# =========================
+_pendientes: Set[Destino] = set()
+_pendientes_lock = threading.Lock()
+_despierta = threading.Event()
+
+
+def despertar(ciclo_id: Optional[int] = None, exam_id: Optional[int] = None) -> None:
+    """Llamar después del commit que liberó un lugar; el promotor lo atiende de inmediato."""
+    if ciclo_id is None and exam_id is None:
+        return
+    with _pendientes_lock:
+        _pendientes.add((ciclo_id, None) if ciclo_id is not None else (None, exam_id))
+    _despierta.set()
+
+
+def _tomar_pendientes() -> Set[Destino]:
+    global _pendientes
+    with _pendientes_lock:
+        destinos, _pendientes = _pendientes, set()
+    return destinos
+
+
+class _Promotor(threading.Thread):
+    def __init__(self):
+        super().__init__(name="lista-espera-promotor", daemon=True)
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        _despierta.set()
+
+    def run(self) -> None:
+        ultimo_barrido = -float(LISTA_ESPERA_PERIODO)
+        while not self._stop_event.is_set():
+            _despierta.wait(LISTA_ESPERA_PERIODO)
+            _despierta.clear()
+            if self._stop_event.is_set():
+                break
+
+            destinos = _tomar_pendientes()
+            ahora = time.monotonic()
+            if ahora - ultimo_barrido >= LISTA_ESPERA_PERIODO:
+                ultimo_barrido = ahora
+                db = SessionLocal()
+                try:
+                    destinos |= expirar_admisiones(db)
+                    db.commit()
+                    destinos |= destinos_con_espera(db)
+                except Exception:
+                    db.rollback()
+                    logger.exception("Barrido de lista de espera falló")
+                finally:
+                    db.close()
+
+            n = procesar(destinos)
+            if n:
+                logger.info("Lista de espera: %s alumno(s) admitido(s)", n)
+
+
+_promotor: Optional[_Promotor] = None
+_promotor_lock = threading.Lock()
+
+
+def start() -> None:
+    global _promotor
+    with _promotor_lock:
+        if _promotor is None or not _promotor.is_alive():
+            _promotor = _Promotor()
+            _promotor.start()
+
+
+def shutdown() -> None:
+    global _promotor
+    with _promotor_lock:
+        if _promotor is not None:
+            _promotor.stop()
+            _promotor = None
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 
 from .config import settings
 from .database import Base, engine, get_db
+from .db_upgrades import apply_db_upgrades
 from .models import User, UserRole as ModelUserRole
 from .schemas import UserCreate, UserOut, LoginRequest, TokenResponse, UserRole
 from .auth import get_password_hash, verify_password, create_access_token
@@ -32,6 +33,7 @@ from .routers.alumno_encuestas import router as alumno_encuestas_router  # 👈
 from app.routers import coordinacion_reportes
 from app.routers import public_examenes
 from .routers.alumno_perfil import router as alumno_perfil_router
+from .routers.alumno_lista_espera import router as alumno_lista_espera_router
 from app.routers import coordinacion_alumnos
 from .routers import docente_reportes  # 👈 importa el router nuevo
 from .routers import coordinacion_dashboard
@@ -39,6 +41,9 @@ from app.routers import coordinacion_perfil
 from app.routers import docente_perfil
 from app.routers import auth_password_reset
 from app.routers import docente_overview 
+from app.routers import coordinacion_reportes_jobs
+from . import report_jobs
+from . import placement_capacity, placement_holds, lista_espera, upload_variants, ranking_docentes
 
 
 
@@ -56,6 +61,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "Idempotent-Replayed"],
 )
 
 
@@ -79,6 +85,7 @@ app.include_router(alumno_encuestas_router)   # 👈 NUEVO
 app.include_router(coordinacion_reportes.router)
 app.include_router(public_examenes.router)
 app.include_router(alumno_perfil_router)
+app.include_router(alumno_lista_espera_router)
 app.include_router(coordinacion_alumnos.router)
 app.include_router(docente_reportes.router)  # 👈 monta endpoints del docente
 app.include_router(coordinacion_dashboard.router)
@@ -86,6 +93,7 @@ app.include_router(coordinacion_perfil.router)
 app.include_router(docente_perfil.router)
 app.include_router(auth_password_reset.router)
 app.include_router(docente_overview.router)
+app.include_router(coordinacion_reportes_jobs.router)
 
 
 
@@ -97,6 +105,27 @@ app.include_router(docente_overview.router)
 def _create_db_if_needed():
     # Sólo para desarrollo: crea todas las tablas si no existen
     Base.metadata.create_all(bind=engine)
+    # Índices/extensiones sobre tablas existentes (idempotente)
+    apply_db_upgrades(engine)
+    # LISTEN de cambios de cupo para el feed SSE de exámenes de colocación
+    placement_capacity.start()
+    # Barrido de apartados de lugar vencidos
+    placement_holds.start()
+    # Promotor de la lista de espera (ciclos y exámenes llenos)
+    lista_espera.start()
+    # Refresco de la vista materializada del ranking de docentes
+    ranking_docentes.start()
+    # Reportes: huérfanos de un arranque anterior → FAILED; los que quedaron en cola se re-encolan
+    report_jobs.recuperar()
+
+@app.on_event("shutdown")
+def _shutdown_report_jobs():
+    report_jobs.shutdown()
+    placement_capacity.shutdown()
+    placement_holds.shutdown()
+    lista_espera.shutdown()
+    upload_variants.shutdown()
+    ranking_docentes.shutdown()
 
 @app.post("/auth/register", response_model=UserOut, status_code=201)
 def register(payload: UserCreate, db: Session = Depends(get_db)):
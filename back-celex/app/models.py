@@ -2,7 +2,8 @@
 import enum
 from sqlalchemy import (
     Column, Integer, String, Date, Time, Text, DateTime,
-    Boolean, CheckConstraint, UniqueConstraint, ForeignKey, Numeric, func, Index
+    Boolean, CheckConstraint, UniqueConstraint, ForeignKey, Numeric, func, Index, JSON, BigInteger, text,
+    Computed,
 )
 from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.orm import relationship
@@ -46,8 +47,8 @@ class User(Base):
     # Estado de la cuenta
     is_active = Column(Boolean, default=True)
 
-    # Tiempos de registro
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Tiempos de registro (created_at es llave del keyset de los listados: NOT NULL)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     # Datos de contacto y domicilio (opcionales)
@@ -123,12 +124,21 @@ class ModalidadAsistencia(str, enum.Enum):
 
 
 # -------------------- Modelo Ciclo --------------------
+# Año del ciclo: el de curso_inicio; si faltara, el prefijo 'YYYY-' del código.
+# Columna generada (ver ciclo_filtros: todos los filtros por año pasan por ahí)
+CICLO_ANIO_SQL = (
+    "coalesce(extract(year from curso_inicio)::int, "
+    "CASE WHEN codigo ~ '^[0-9]{4}-' THEN substr(codigo, 1, 4)::int END)"
+)
+
+
 class Ciclo(Base):
     __tablename__ = "ciclos"
     __table_args__ = (
         UniqueConstraint("codigo", name="uq_ciclos_codigo"),
         CheckConstraint("cupo_total >= 0", name="ck_ciclos_cupo_total_nonneg"),
         CheckConstraint("hora_inicio < hora_fin", name="ck_ciclos_horario_orden"),
+        Index("ix_ciclos_anio_idioma", "anio", "idioma"),
     )
 
     id = Column(Integer, primary_key=True, index=True)
@@ -152,6 +162,9 @@ class Ciclo(Base):
     curso_inicio = Column(Date, nullable=False)
     curso_fin    = Column(Date, nullable=False)
 
+    # Derivado (solo lectura): año para filtros/reportes
+    anio = Column(Integer, Computed(CICLO_ANIO_SQL, persisted=True))
+
     # Exámenes (opcionales)
     examen_mt    = Column(Date, nullable=True)
     examen_final = Column(Date, nullable=True)
@@ -166,7 +179,7 @@ class Ciclo(Base):
 
     notas = Column(Text, nullable=True)
 
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)  # llave de keyset
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
 
@@ -248,6 +261,51 @@ class Inscripcion(Base):
     )
 
 
+# -------------------- Última inscripción por alumno --------------------
+class AlumnoUltimaInscripcion(Base):
+    """
+    Puntero a la inscripción más reciente (created_at, id) de cada alumno.
+    Lo mantiene inscripcion_utils.actualizar_ultima_inscripcion al inscribir/cancelar;
+    el listado de alumnos únicos lo lee en lugar de calcular row_number() por página.
+    """
+    __tablename__ = "alumno_ultima_inscripcion"
+
+    alumno_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # Si se borra la inscripción apuntada, la fila desaparece y se recalcula con la siguiente
+    inscripcion_id = Column(Integer, ForeignKey("inscripciones.id", ondelete="CASCADE"), nullable=False, unique=True)
+    inscripcion_created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+# -------------------- Resumen por inscripción --------------------
+class InscripcionSummary(Base):
+    """
+    Asistencia y calificación ya agregadas por inscripción, para que los historiales
+    sólo lean filas. Lo mantiene historial.recalcular_resumen en cada escritura de
+    asistencia/evaluación (misma transacción).
+    """
+    __tablename__ = "inscripcion_summary"
+
+    inscripcion_id = Column(Integer, ForeignKey("inscripciones.id", ondelete="CASCADE"), primary_key=True)
+    ciclo_id = Column(Integer, ForeignKey("ciclos.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    # Asistencia: conteos de registros de la inscripción y sesiones del ciclo
+    registros_total = Column(Integer, nullable=False, default=0)
+    presentes = Column(Integer, nullable=False, default=0)
+    ausentes = Column(Integer, nullable=False, default=0)
+    retardos = Column(Integer, nullable=False, default=0)
+    justificados = Column(Integer, nullable=False, default=0)
+    sesiones_ciclo = Column(Integer, nullable=False, default=0)
+    asistencia_pct = Column(Numeric(5, 1), nullable=False, default=0)            # presentes / registros
+    asistencia_pct_ponderada = Column(Numeric(5, 2), nullable=False, default=0)  # (p + j + r/2) / sesiones
+
+    # Evaluación (NULL si no hay captura)
+    medio_subtotal = Column(Integer, nullable=True)   # 0..100
+    final_subtotal = Column(Integer, nullable=True)   # 0..100
+    promedio = Column(Numeric(5, 2), nullable=True)   # (medio + final) / 2
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
 # -------------------- Modelo Evaluacion --------------------
 class Evaluacion(Base):
     __tablename__ = "evaluaciones"
@@ -380,6 +438,84 @@ class PlacementRegistro(Base):
     )
 
 
+# -------------------- Apartado temporal de lugar (PlacementHold) --------------------
+class PlacementHold(Base):
+    """
+    Lugar apartado por un alumno mientras llena el formulario de registro.
+    Cuenta contra el cupo hasta que vence (expires_at) o se libera (released_at):
+    al registrarse se convierte (registro_id) y el barrido de placement_holds
+    libera los vencidos.
+    """
+    __tablename__ = "placement_holds"
+    __table_args__ = (
+        # Un solo apartado sin liberar por alumno y examen
+        Index(
+            "uq_placement_holds_activo", "exam_id", "alumno_id",
+            unique=True, postgresql_where=text("released_at IS NULL"),
+        ),
+        Index("ix_placement_holds_vigentes", "exam_id", "expires_at", postgresql_where=text("released_at IS NULL")),
+    )
+
+    id = Column(Integer, primary_key=True)
+
+    exam_id   = Column(Integer, ForeignKey("placement_exams.id", ondelete="CASCADE"), nullable=False)
+    alumno_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+
+    created_at  = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    expires_at  = Column(DateTime(timezone=True), nullable=False)
+    released_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Registro en que se convirtió (NULL si venció o se soltó)
+    registro_id = Column(Integer, ForeignKey("placement_registros.id", ondelete="SET NULL"), nullable=True)
+
+
+# -------------------- Lista de espera (ciclos y exámenes de colocación) --------------------
+class ListaEsperaStatus(str, enum.Enum):
+    ESPERANDO = "esperando"
+    ADMITIDA  = "admitida"    # se le ofreció lugar hasta admitida_hasta
+    INSCRITA  = "inscrita"    # completó su inscripción/registro
+    EXPIRADA  = "expirada"    # no se inscribió a tiempo
+    CANCELADA = "cancelada"
+
+
+class ListaEspera(Base):
+    """
+    Turno FIFO (created_at, id) de un alumno para un ciclo o un examen de colocación lleno.
+    El promotor de app/lista_espera.py admite al siguiente cuando se libera un lugar.
+    """
+    __tablename__ = "lista_espera"
+    __table_args__ = (
+        CheckConstraint("(ciclo_id IS NULL) <> (exam_id IS NULL)", name="ck_lista_espera_destino"),
+        Index("ix_lista_espera_ciclo_fifo", "ciclo_id", "status", "created_at", "id"),
+        Index("ix_lista_espera_exam_fifo", "exam_id", "status", "created_at", "id"),
+        # Un solo turno abierto por alumno y destino (SAEnum guarda el nombre del miembro)
+        Index(
+            "uq_lista_espera_ciclo_abierta", "ciclo_id", "alumno_id",
+            unique=True, postgresql_where=text("ciclo_id IS NOT NULL AND status IN ('ESPERANDO', 'ADMITIDA')"),
+        ),
+        Index(
+            "uq_lista_espera_exam_abierta", "exam_id", "alumno_id",
+            unique=True, postgresql_where=text("exam_id IS NOT NULL AND status IN ('ESPERANDO', 'ADMITIDA')"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True)
+
+    alumno_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    ciclo_id  = Column(Integer, ForeignKey("ciclos.id", ondelete="CASCADE"), nullable=True)
+    exam_id   = Column(Integer, ForeignKey("placement_exams.id", ondelete="CASCADE"), nullable=True)
+
+    status = Column(SAEnum(ListaEsperaStatus, native_enum=False), nullable=False, default=ListaEsperaStatus.ESPERANDO)
+
+    created_at     = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    admitida_at    = Column(DateTime(timezone=True), nullable=True)
+    admitida_hasta = Column(DateTime(timezone=True), nullable=True)
+    notificada_at  = Column(DateTime(timezone=True), nullable=True)
+    cerrada_at     = Column(DateTime(timezone=True), nullable=True)
+
+    alumno = relationship("User", foreign_keys=[alumno_id])
+
+
 # -------------------- Encuestas: Categorías --------------------
 class SurveyCategory(Base):
     """
@@ -508,3 +644,91 @@ class PasswordResetToken(Base):
 
     # Por si en un futuro quieres otros propósitos (email_verify, etc.)
     purpose = Column(String(40), nullable=False, default="password_reset")
+
+
+# -------------------- Reportes en segundo plano --------------------
+class ReportJobStatus(str, enum.Enum):
+    QUEUED    = "queued"
+    RUNNING   = "running"
+    DONE      = "done"
+    FAILED    = "failed"
+    CANCELLED = "cancelled"
+
+
+class ReportJob(Base):
+    """
+    Exportación pesada (CSV/XLSX) que se ejecuta fuera del request.
+    El archivo resultante queda en disco (artifact_path) hasta que se descarga o se purga.
+    """
+    __tablename__ = "report_jobs"
+    __table_args__ = (
+        Index("ix_report_jobs_owner_status", "owner_id", "status"),
+        CheckConstraint("progress BETWEEN 0 AND 100", name="ck_report_jobs_progress"),
+    )
+
+    id = Column(Integer, primary_key=True)
+
+    owner_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    owner = relationship("User", foreign_keys=[owner_id])
+
+    tipo    = Column(String(40), nullable=False)          # inscritos | pagos | encuesta_respuestas | ...
+    formato = Column(String(10), nullable=False, default="csv")
+    params  = Column(JSON, nullable=False, default=dict)  # {"ciclo_id": .., "anio": ..}
+
+    status = Column(SAEnum(ReportJobStatus, native_enum=False), nullable=False, default=ReportJobStatus.QUEUED)
+    progress = Column(Integer, nullable=False, default=0)   # 0..100
+    rows_done = Column(Integer, nullable=False, default=0)
+    rows_total = Column(Integer, nullable=True)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    error = Column(Text, nullable=True)
+
+    artifact_path = Column(String(255), nullable=True)
+    artifact_mime = Column(String(100), nullable=True)
+    artifact_size = Column(BigInteger, nullable=True)
+
+    created_at  = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at  = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)  # latido del worker mientras RUNNING
+
+
+# -------------------- Idempotency-Key (respuestas guardadas) --------------------
+class IdempotencyKey(Base):
+    """
+    Resultado de un POST con encabezado Idempotency-Key (ver app/idempotency.py).
+    Mientras completed_at es NULL la solicitud original sigue en curso.
+    """
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("user_id", "alcance", "key", name="uq_idempotency_user_alcance_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    alcance = Column(String(40), nullable=False)    # inscripciones | placement_registro | ...
+    key     = Column(String(128), nullable=False)
+    ruta    = Column(String(255), nullable=False)   # path original: la misma llave no sirve para otra solicitud
+    huella  = Column(String(64), nullable=True)     # sha256 de los campos que identifican la solicitud (p. ej. ciclo_id)
+
+    status_code   = Column(Integer, nullable=True)
+    response_body = Column(JSON, nullable=True)
+
+    created_at   = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    started_at   = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    expires_at   = Column(DateTime(timezone=True), nullable=False, index=True)
+
+
+# -------------------- Cola de revisión (apartado suave) --------------------
+class RevisionClaim(Base):
+    """
+    Apartado temporal de una inscripción pendiente por un coordinador
+    (ver coordinacion_inscripciones.cola_revision). Vencido = libre; no bloquea validar.
+    """
+    __tablename__ = "revision_claims"
+
+    inscripcion_id = Column(Integer, ForeignKey("inscripciones.id", ondelete="CASCADE"), primary_key=True)
+    coordinador_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    hasta          = Column(DateTime(timezone=True), nullable=False)
+    created_at     = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
@@ -0,0 +1,175 @@
+# app/pagination.py
+"""
+Paginación por cursor (keyset) y conteos cacheados.
+
+El cursor es opaco para el cliente: base64 de la lista de valores de la llave
+de orden de la última fila entregada, p. ej. [created_at, id].
+"""
+import base64
+import json
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Literal, Optional, Sequence, Union
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, text
+from sqlalchemy.orm import Session
+
+# Cómo calcular `total` en los listados paginados:
+#   exact    → COUNT(*) (cacheado por count_cache al paginar con cursor)
+#   estimate → estadística del planner (pg_class.reltuples) si no hay filtros
+#   none     → no se calcula (total/pages = null)
+TotalMode = Literal["exact", "estimate", "none"]
+
+
+def _to_json(v):
+    if isinstance(v, datetime):
+        return {"dt": v.isoformat()}
+    if isinstance(v, date):
+        return {"d": v.isoformat()}
+    return getattr(v, "value", v)
+
+
+def _from_json(v):
+    if isinstance(v, dict):
+        if "dt" in v:
+            return datetime.fromisoformat(v["dt"])
+        if "d" in v:
+            return date.fromisoformat(v["d"])
+    return v
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_to_json(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        pad = "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + pad).decode())
+        if not isinstance(values, list) or len(values) != size:
+            raise ValueError
+        return [_from_json(v) for v in values]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+
+def _directions(columns: Sequence, desc: Union[bool, Sequence[bool]]) -> list:
+    if isinstance(desc, bool):
+        return [desc] * len(columns)
+    return list(desc)
+
+
+def keyset_after(columns: Sequence, values: Sequence, desc: Union[bool, Sequence[bool]] = True):
+    """
+    Condición "filas después del cursor" para ORDER BY columns.
+    `desc` aplica a todas las columnas o es una lista con la dirección de cada una.
+    Las llaves deben ser NOT NULL y la última única (normalmente el id).
+    """
+    dirs = _directions(columns, desc)
+    conds = []
+    for i, (col, val) in enumerate(zip(columns, values)):
+        prev = [c == v for c, v in zip(columns[:i], values[:i])]
+        step = col < val if dirs[i] else col > val
+        conds.append(and_(*prev, step) if prev else step)
+    return or_(*conds)
+
+
+def page_with_cursor(query, order_columns: Sequence, limit: int, cursor: Optional[str],
+                     desc: Union[bool, Sequence[bool]] = True, key: Optional[Callable] = None,
+                     offset: int = 0):
+    """
+    Aplica cursor + ORDER BY + LIMIT (limit+1 para saber si hay más).
+    Regresa (filas, next_cursor). `key(row)` extrae los valores de la llave;
+    por defecto usa los `name`/`key` de las columnas.
+
+    Sin cursor se usa `offset` (clientes por página); la respuesta trae igualmente
+    `next_cursor` para que puedan pasar a keyset desde cualquier página.
+    """
+    if cursor:
+        query = query.filter(keyset_after(order_columns, decode_cursor(cursor, len(order_columns)), desc))
+    elif offset:
+        query = query.offset(offset)
+    ordering = [c.desc() if d else c.asc() for c, d in zip(order_columns, _directions(order_columns, desc))]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        vals = key(last) if key else [getattr(last, c.key) for c in order_columns]
+        next_cursor = encode_cursor(vals)
+    return rows, next_cursor
+
+
+class CountCache:
+    """
+    Conteos con TTL en memoria del proceso. Evita repetir COUNT(*) en cada página:
+    el total puede ir hasta `ttl` segundos atrasado, lo cual es aceptable en listados.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 2048):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._data: dict = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key, compute: Callable[[], int]) -> int:
+        now = time.monotonic()
+        with self._lock:
+            hit = self._data.get(key)
+            if hit and hit[0] > now:
+                return hit[1]
+        value = int(compute() or 0)
+        with self._lock:
+            if len(self._data) >= self.max_entries:
+                self._data = {k: v for k, v in self._data.items() if v[0] > now}
+                if len(self._data) >= self.max_entries:
+                    self._data.clear()
+            self._data[key] = (now + self.ttl, value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+count_cache = CountCache()
+
+
+def estimate_rows(db: Session, table: str) -> Optional[int]:
+    """Filas estimadas por el planner (ANALYZE/autovacuum); None si no hay estadística."""
+    try:
+        n = db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:t)"), {"t": table}
+        ).scalar()
+    except Exception:
+        db.rollback()
+        return None
+    return int(n) if n is not None and n >= 0 else None
+
+
+def listing_total(db: Session, query, mode: TotalMode, cache_key=None,
+                  table: Optional[str] = None, filtered: bool = True) -> Optional[int]:
+    """
+    Total para un listado según `mode`. `query` es la consulta ya filtrada.
+    - estimate: sólo si no hay filtros (`filtered=False`) y se conoce la tabla; si no, exacto.
+    - exact con `cache_key`: pasa por count_cache (las páginas siguientes no repiten el COUNT).
+    """
+    if mode == "none":
+        return None
+    if mode == "estimate" and table and not filtered:
+        n = estimate_rows(db, table)
+        if n is not None:
+            return n
+    compute = query.order_by(None).count
+    if cache_key is None:
+        return compute()
+    return count_cache.get_or_compute(cache_key, compute)
+
+
+def total_pages(total: Optional[int], page_size: int) -> Optional[int]:
+    if total is None:
+        return None
+    return max(1, (total + page_size - 1) // page_size)
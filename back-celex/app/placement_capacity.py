@@ -0,0 +1,282 @@
+# app/placement_capacity.py
+"""
+Ocupación de exámenes de colocación en memoria y difusión de cambios (SSE).
+
+- `broadcaster` guarda, por examen, { cupo_total, inscritos_count, holds_activos,
+  cupo_restante }. Se llena de forma perezosa con una sola consulta agrupada
+  por lote de ids y cada entrada se revalida tras PLACEMENT_CAPACITY_TTL.
+- Quien cambia la ocupación (crear/cancelar/validar registro, apartar o
+  liberar lugar, editar cupo) llama a `notificar(db, exam_ids)` antes de su
+  commit: emite un NOTIFY en la misma transacción, así que sólo se entrega si
+  el commit ocurre.
+- Un hilo por proceso hace LISTEN, recalcula los exámenes afectados y publica
+  los deltas a las suscripciones SSE abiertas (una asyncio.Queue por cliente).
+  Con varios workers cada proceso mantiene su propia copia coherente.
+"""
+import asyncio
+import logging
+import os
+import select
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from .database import SessionLocal, engine
+from .models import PlacementExam, PlacementHold, PlacementRegistro, PlacementRegistroStatus
+
+logger = logging.getLogger("celex.placement_capacity")
+
+CAPACITY_CHANNEL = "placement_capacity"
+PLACEMENT_CAPACITY_TTL = int(os.getenv("PLACEMENT_CAPACITY_TTL", "60"))
+PLACEMENT_CAPACITY_KEEPALIVE = int(os.getenv("PLACEMENT_CAPACITY_KEEPALIVE", "15"))
+
+# Eventos pendientes por cliente; si se llena, se le manda un snapshot completo
+_MAX_PENDIENTES = 100
+
+# Estados que ocupan lugar (mismo criterio que routers/placement.py)
+ACTIVE_REG_STATUSES = (
+    PlacementRegistroStatus.PREINSCRITA,
+    PlacementRegistroStatus.VALIDADA,
+)
+
+
+def _entrada(exam_id: int, cupo_total: int, inscritos: int, holds: int = 0) -> dict:
+    return {
+        "id": exam_id,
+        "cupo_total": cupo_total,
+        "inscritos_count": inscritos,
+        "holds_activos": holds,
+        "cupo_restante": max(cupo_total - inscritos - holds, 0),
+    }
+
+
+def contar_ocupacion(db: Session, exam_ids: Iterable[int]) -> Dict[int, dict]:
+    """Una consulta: cupo, registros activos y apartados vigentes por examen. Ids inexistentes → en ceros."""
+    ids = sorted({int(x) for x in exam_ids})
+    if not ids:
+        return {}
+    inscritos = (
+        db.query(func.count(PlacementRegistro.id))
+        .filter(
+            PlacementRegistro.exam_id == PlacementExam.id,
+            PlacementRegistro.status.in_(ACTIVE_REG_STATUSES),
+        )
+        .correlate(PlacementExam)
+        .scalar_subquery()
+    )
+    holds = (
+        db.query(func.count(PlacementHold.id))
+        .filter(
+            PlacementHold.exam_id == PlacementExam.id,
+            PlacementHold.released_at.is_(None),
+            PlacementHold.expires_at > func.now(),
+        )
+        .correlate(PlacementExam)
+        .scalar_subquery()
+    )
+    rows = (
+        db.query(PlacementExam.id, PlacementExam.cupo_total, inscritos, holds)
+        .filter(PlacementExam.id.in_(ids))
+        .all()
+    )
+    out = {eid: _entrada(eid, 0, 0) for eid in ids}
+    for eid, cupo, n_insc, n_holds in rows:
+        out[int(eid)] = _entrada(int(eid), int(cupo or 0), int(n_insc or 0), int(n_holds or 0))
+    return out
+
+
+class Suscripcion:
+    """Cola de deltas de un cliente SSE; vive en el event loop que la creó."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, exam_ids: Optional[Iterable[int]]):
+        self.loop = loop
+        self.exam_ids = frozenset(exam_ids) if exam_ids is not None else None
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=_MAX_PENDIENTES)
+        self.resync = False
+
+    def _entregar(self, evento: dict) -> None:
+        try:
+            self.queue.put_nowait(evento)
+        except asyncio.QueueFull:
+            # Cliente lento: se descartan los deltas y se le reenvía el estado completo
+            self.resync = True
+
+
+class CapacityBroadcaster:
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._state: Dict[int, dict] = {}
+        self._stamp: Dict[int, float] = {}
+        self._subs: set = set()
+        self.seq = 0
+
+    # ---------- lectura ----------
+    def snapshot(self, db: Session, exam_ids: Iterable[int]) -> Dict[str, dict]:
+        """{ "<id>": {...} } para los ids pedidos; sólo consulta los que no están en memoria o vencieron."""
+        ids = list(dict.fromkeys(int(x) for x in exam_ids))
+        now = time.monotonic()
+        with self._lock:
+            faltan = [
+                eid for eid in ids
+                if eid not in self._state or now - self._stamp.get(eid, 0) > self.ttl
+            ]
+        if faltan:
+            self._aplicar(contar_ocupacion(db, faltan))
+        with self._lock:
+            return {str(eid): dict(self._state[eid]) for eid in ids if eid in self._state}
+
+    # ---------- escritura ----------
+    def refrescar(self, exam_ids: Iterable[int]) -> None:
+        """Recalcula (sesión propia) los exámenes indicados que ya se siguen en memoria."""
+        with self._lock:
+            ids = [int(x) for x in exam_ids if int(x) in self._state]
+        if not ids:
+            return
+        db = SessionLocal()
+        try:
+            self._aplicar(contar_ocupacion(db, ids))
+        finally:
+            db.close()
+
+    def invalidar(self) -> None:
+        """Olvida todo (p.ej. al reconectar el LISTEN: pudo perderse algún aviso)."""
+        with self._lock:
+            self._stamp.clear()
+
+    def _aplicar(self, frescos: Dict[int, dict]) -> None:
+        now = time.monotonic()
+        cambios: Dict[int, dict] = {}
+        with self._lock:
+            for eid, entrada in frescos.items():
+                if self._state.get(eid) != entrada:
+                    cambios[eid] = entrada
+                self._state[eid] = entrada
+                self._stamp[eid] = now
+            if cambios:
+                self.seq += 1
+                seq = self.seq
+            subs = list(self._subs)
+        if cambios:
+            self._publicar(subs, seq, cambios)
+
+    # ---------- suscripciones ----------
+    def suscribir(self, exam_ids: Optional[Iterable[int]]) -> Suscripcion:
+        """Debe llamarse desde el event loop (endpoint async)."""
+        sub = Suscripcion(asyncio.get_running_loop(), exam_ids)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def desuscribir(self, sub: Suscripcion) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    @staticmethod
+    def _publicar(subs: List[Suscripcion], seq: int, cambios: Dict[int, dict]) -> None:
+        for sub in subs:
+            data = {
+                str(eid): dict(entrada)
+                for eid, entrada in cambios.items()
+                if sub.exam_ids is None or eid in sub.exam_ids
+            }
+            if not data:
+                continue
+            try:
+                sub.loop.call_soon_threadsafe(sub._entregar, {"seq": seq, "data": data})
+            except RuntimeError:
+                pass  # loop cerrado: el cliente ya se fue
+
+
+broadcaster = CapacityBroadcaster(PLACEMENT_CAPACITY_TTL)
+
+
+def snapshot(exam_ids: Iterable[int]) -> Dict[str, dict]:
+    """Igual que broadcaster.snapshot pero con sesión propia (para endpoints async)."""
+    db = SessionLocal()
+    try:
+        return broadcaster.snapshot(db, exam_ids)
+    finally:
+        db.close()
+
+
+def notificar(db: Session, exam_ids: Iterable[Optional[int]]) -> None:
+    """
+    Avisa que cambió la ocupación de estos exámenes. Llamar ANTES del commit:
+    Postgres entrega el NOTIFY sólo si la transacción se confirma.
+    """
+    ids = sorted({int(x) for x in exam_ids if x is not None})
+    if not ids:
+        return
+    db.execute(
+        text("SELECT pg_notify(:canal, :payload)"),
+        {"canal": CAPACITY_CHANNEL, "payload": ",".join(str(x) for x in ids)},
+    )
+
+
+# =========================
+#  LISTEN (un hilo por proceso)
+# =========================
+class _Listener(threading.Thread):
+    def __init__(self):
+        super().__init__(name="placement-capacity-listener", daemon=True)
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {CAPACITY_CHANNEL}")
+                broadcaster.invalidar()
+                self._escuchar(conn)
+            except Exception:
+                logger.exception("LISTEN %s falló; reintentando", CAPACITY_CHANNEL)
+                self._stop_event.wait(5)
+            finally:
+                if raw is not None:
+                    try:
+                        raw.invalidate()  # no regresa al pool una conexión con LISTEN activo
+                    except Exception:
+                        pass
+
+    def _escuchar(self, conn) -> None:
+        while not self._stop_event.is_set():
+            if select.select([conn], [], [], 5.0) == ([], [], []):
+                continue
+            conn.poll()
+            ids = set()
+            while conn.notifies:
+                n = conn.notifies.pop(0)
+                ids.update(int(x) for x in (n.payload or "").split(",") if x.strip().isdigit())
+            if ids:
+                broadcaster.refrescar(ids)
+
+
+_listener: Optional[_Listener] = None
+_listener_lock = threading.Lock()
+
+
+def start() -> None:
+    global _listener
+    with _listener_lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = _Listener()
+            _listener.start()
+
+
+def shutdown() -> None:
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
@@ -0,0 +1,243 @@
+# app/placement_holds.py
+"""
+Apartados de lugar para exámenes de colocación (PlacementHold).
+
+- El alumno toma un apartado al abrir el formulario (`tomar_hold`); cuenta
+  contra el cupo durante PLACEMENT_HOLD_MINUTES.
+- Al registrarse, `reservar_lugar` vuelve a validar el cupo con el examen
+  bloqueado (FOR UPDATE de esa fila, no de la tabla) y `convertir_hold`
+  cierra el apartado en la misma transacción que crea el registro.
+- Un hilo por proceso libera los apartados vencidos y avisa al feed de
+  capacidad. El conteo ya ignora los vencidos aunque el barrido no haya
+  pasado; el barrido sólo sirve para notificar y limpiar.
+"""
+import logging
+import os
+import threading
+from datetime import timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func, update, delete
+from sqlalchemy.orm import Session, lazyload
+
+from .database import SessionLocal
+from .models import ListaEspera, ListaEsperaStatus, PlacementExam, PlacementHold, PlacementRegistro
+from . import placement_capacity
+
+logger = logging.getLogger("celex.placement_holds")
+
+PLACEMENT_HOLD_MINUTES = int(os.getenv("PLACEMENT_HOLD_MINUTES", "15"))
+PLACEMENT_HOLD_SWEEP_SECONDS = int(os.getenv("PLACEMENT_HOLD_SWEEP_SECONDS", "30"))
+# Apartados ya liberados se conservan este tiempo (auditoría) y luego se borran
+PLACEMENT_HOLD_RETENTION_DAYS = int(os.getenv("PLACEMENT_HOLD_RETENTION_DAYS", "7"))
+
+
+def hold_vigente():
+    """Condición SQL de apartado que sigue ocupando lugar."""
+    return (PlacementHold.released_at.is_(None)) & (PlacementHold.expires_at > func.now())
+
+
+def _fetch_exam_locked(db: Session, exam_id: int) -> PlacementExam:
+    exam = (
+        db.query(PlacementExam)
+        .options(lazyload("*"))
+        .filter(PlacementExam.id == exam_id)
+        .with_for_update(of=PlacementExam, nowait=False)
+        .first()
+    )
+    if not exam or not bool(exam.activo):
+        raise HTTPException(status_code=404, detail="Examen no disponible")
+    return exam
+
+
+def _hold_propio(db: Session, exam_id: int, alumno_id: int) -> Optional[PlacementHold]:
+    return (
+        db.query(PlacementHold)
+        .filter(
+            PlacementHold.exam_id == exam_id,
+            PlacementHold.alumno_id == alumno_id,
+            PlacementHold.released_at.is_(None),
+        )
+        .first()
+    )
+
+
+def lugares_libres(db: Session, exam: PlacementExam, alumno_id: Optional[int] = None) -> int:
+    """Cupo menos registros activos y apartados vigentes (sin contar los de `alumno_id`)."""
+    ocupados = (
+        db.query(func.count(PlacementRegistro.id))
+        .filter(
+            PlacementRegistro.exam_id == exam.id,
+            PlacementRegistro.status.in_(placement_capacity.ACTIVE_REG_STATUSES),
+        )
+        .scalar()
+        or 0
+    )
+    q = db.query(func.count(PlacementHold.id)).filter(PlacementHold.exam_id == exam.id, hold_vigente())
+    if alumno_id is not None:
+        q = q.filter(PlacementHold.alumno_id != alumno_id)
+    apartados = q.scalar() or 0
+    return max(int(getattr(exam, "cupo_total", 0) or 0) - ocupados - apartados, 0)
+
+
+def verificar_lugar(db: Session, exam: PlacementExam, alumno_id: int) -> None:
+    """409 si registros activos + apartados vigentes de OTROS alumnos llenan el cupo."""
+    if lugares_libres(db, exam, alumno_id) <= 0:
+        raise HTTPException(status_code=409, detail="No hay lugares disponibles")
+
+
+def apartar(db: Session, exam_id: int, alumno_id: int, expires_at) -> PlacementHold:
+    """Crea o extiende el apartado abierto del alumno. No valida cupo ni hace commit."""
+    hold = _hold_propio(db, exam_id, alumno_id)
+    if hold is None:
+        hold = PlacementHold(exam_id=exam_id, alumno_id=alumno_id)
+        db.add(hold)
+        hold.expires_at = expires_at
+    else:
+        # Nunca acorta: el apartado de una admisión de lista de espera dura más que el del formulario
+        hold.expires_at = func.greatest(PlacementHold.expires_at, expires_at)
+    return hold
+
+
+def tomar_hold(db: Session, exam_id: int, alumno_id: int) -> PlacementHold:
+    """Crea o renueva el apartado del alumno. Hace commit."""
+    exam = _fetch_exam_locked(db, exam_id)
+
+    ya = (
+        db.query(PlacementRegistro.id)
+        .filter(
+            PlacementRegistro.exam_id == exam_id,
+            PlacementRegistro.alumno_id == alumno_id,
+            PlacementRegistro.status.in_(placement_capacity.ACTIVE_REG_STATUSES),
+        )
+        .first()
+    )
+    if ya:
+        raise HTTPException(status_code=409, detail="Ya tienes un registro activo para este examen")
+
+    verificar_lugar(db, exam, alumno_id)
+
+    hold = apartar(db, exam_id, alumno_id, func.now() + timedelta(minutes=PLACEMENT_HOLD_MINUTES))
+
+    placement_capacity.notificar(db, [exam_id])
+    db.commit()
+    db.refresh(hold)
+    return hold
+
+
+def _respalda_admision(db: Session, exam_id: int, alumno_id: int) -> bool:
+    """¿El apartado abierto es el lugar ofrecido por la lista de espera (turno ADMITIDA vigente)?"""
+    return db.query(
+        db.query(ListaEspera.id)
+        .filter(
+            ListaEspera.exam_id == exam_id,
+            ListaEspera.alumno_id == alumno_id,
+            ListaEspera.status == ListaEsperaStatus.ADMITIDA,
+        )
+        .exists()
+    ).scalar()
+
+
+def soltar(db: Session, exam_id: int, alumno_id: int) -> bool:
+    """
+    Marca liberado el apartado abierto del alumno. No hace commit.
+    El de una admisión de lista de espera no se suelta (vence con la admisión).
+    """
+    if _respalda_admision(db, exam_id, alumno_id):
+        return False
+    hold = _hold_propio(db, exam_id, alumno_id)
+    if hold is None:
+        return False
+    hold.released_at = func.now()
+    return True
+
+
+def liberar_hold(db: Session, exam_id: int, alumno_id: int) -> bool:
+    """Suelta el apartado del alumno (si lo hay). Hace commit. True si se liberó un lugar."""
+    if soltar(db, exam_id, alumno_id):
+        placement_capacity.notificar(db, [exam_id])
+        db.commit()
+        return True
+    return False
+
+
+def reservar_lugar(db: Session, exam_id: int, alumno_id: int) -> Optional[PlacementHold]:
+    """
+    Bloquea el examen y valida cupo justo antes de escribir el registro.
+    Devuelve el apartado del alumno (si tenía) para convertirlo. No hace commit:
+    el bloqueo dura hasta el commit del registro.
+    """
+    exam = _fetch_exam_locked(db, exam_id)
+    verificar_lugar(db, exam, alumno_id)
+    return _hold_propio(db, exam_id, alumno_id)
+
+
+def convertir_hold(hold: Optional[PlacementHold], registro_id: int) -> None:
+    if hold is None:
+        return
+    hold.released_at = func.now()
+    hold.registro_id = registro_id
+
+
+# =========================
+#  Barrido de vencidos
+# =========================
+def barrer_vencidos(db: Session) -> int:
+    """Libera apartados vencidos, avisa al feed de capacidad y purga los viejos."""
+    exam_ids = db.execute(
+        update(PlacementHold)
+        .where(PlacementHold.released_at.is_(None), PlacementHold.expires_at <= func.now())
+        .values(released_at=func.now())
+        .returning(PlacementHold.exam_id)
+    ).scalars().all()
+    placement_capacity.notificar(db, exam_ids)
+    db.execute(
+        delete(PlacementHold).where(
+            PlacementHold.released_at < func.now() - timedelta(days=PLACEMENT_HOLD_RETENTION_DAYS)
+        )
+    )
+    db.commit()
+    return len(exam_ids)
+
+
+class _Sweeper(threading.Thread):
+    def __init__(self):
+        super().__init__(name="placement-hold-sweeper", daemon=True)
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(PLACEMENT_HOLD_SWEEP_SECONDS):
+            db = SessionLocal()
+            try:
+                n = barrer_vencidos(db)
+                if n:
+                    logger.info("Apartados vencidos liberados: %s", n)
+            except Exception:
+                db.rollback()
+                logger.exception("Barrido de apartados falló")
+            finally:
+                db.close()
+
+
+_sweeper: Optional[_Sweeper] = None
+_sweeper_lock = threading.Lock()
+
+
+def start() -> None:
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is None or not _sweeper.is_alive():
+            _sweeper = _Sweeper()
+            _sweeper.start()
+
+
+def shutdown() -> None:
+    global _sweeper
+    with _sweeper_lock:
+        if _sweeper is not None:
+            _sweeper.stop()
+            _sweeper = None
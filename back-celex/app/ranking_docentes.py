@@ -0,0 +1,195 @@
+# app/ranking_docentes.py
+"""
+Ranking de docentes precalculado (vista materializada `mv_docente_ranking`).
+
+Una fila por (docente, anio, idioma) con grupos, suma y número de respuestas
+numéricas de encuesta. El ranking agrega esas pocas filas en lugar de unir
+Ciclo ⨝ SurveyResponse ⨝ SurveyAnswer sobre todo el histórico en cada request.
+Se guardan suma y conteo (no el promedio) para poder re-agregar por docente
+sin errores de promedio de promedios.
+
+Refresco (REFRESH ... CONCURRENTLY, no bloquea lecturas):
+  - `marcar_cambio()` tras guardar una encuesta → refresco en RANKING_DEBOUNCE_SECONDS
+    (las respuestas de un grupo llegan en ráfaga y se juntan en un solo refresco);
+  - además, cada RANKING_REFRESH_SECONDS para cubrir cambios de ciclos/docentes.
+Con varios workers sólo uno refresca a la vez (advisory lock).
+Si la vista no existe (p.ej. falló la creación), el dashboard calcula en vivo.
+"""
+import logging
+import os
+import threading
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.orm import Session
+
+from .ciclo_filtros import idioma_de
+from .database import engine
+
+logger = logging.getLogger("celex.ranking_docentes")
+
+RANKING_MV = "mv_docente_ranking"
+RANKING_REFRESH_SECONDS = int(os.getenv("RANKING_REFRESH_SECONDS", "900"))
+RANKING_DEBOUNCE_SECONDS = int(os.getenv("RANKING_DEBOUNCE_SECONDS", "30"))
+
+_ADVISORY_KEY = 0x524B444F  # 'RKDO'
+
+# anio = ciclos.anio (mismo criterio que ciclo_filtros.filtro_anio); 0 si no tiene
+RANKING_MV_SQL = (
+    f"CREATE MATERIALIZED VIEW IF NOT EXISTS {RANKING_MV} AS "
+    "SELECT c.docente_id, "
+    "coalesce(c.anio, 0) AS anio, "
+    "lower(c.idioma::text) AS idioma, "
+    "count(*)::int AS grupos, "
+    "coalesce(sum(a.suma), 0)::bigint AS suma, "
+    "coalesce(sum(a.n), 0)::bigint AS n "
+    "FROM ciclos c "
+    "LEFT JOIN ("
+    "SELECT r.ciclo_id, sum(sa.value_int) AS suma, count(sa.value_int) AS n "
+    "FROM survey_responses r JOIN survey_answers sa ON sa.response_id = r.id "
+    "GROUP BY r.ciclo_id"
+    ") a ON a.ciclo_id = c.id "
+    "WHERE c.docente_id IS NOT NULL "
+    "GROUP BY 1, 2, 3"
+)
+
+UPGRADES: List[Tuple[str, str]] = [
+    (RANKING_MV, RANKING_MV_SQL),
+    # Único sin WHERE: requisito de REFRESH ... CONCURRENTLY
+    (
+        "uq_mv_docente_ranking",
+        f"CREATE UNIQUE INDEX IF NOT EXISTS uq_mv_docente_ranking ON {RANKING_MV} (docente_id, anio, idioma)",
+    ),
+    # Filtro por anio/idioma con lectura sólo de índice
+    (
+        "ix_mv_docente_ranking_filtro",
+        f"CREATE INDEX IF NOT EXISTS ix_mv_docente_ranking_filtro "
+        f"ON {RANKING_MV} (anio, idioma) INCLUDE (docente_id, grupos, suma, n)",
+    ),
+]
+
+
+# =========================
+#  Lectura
+# =========================
+_disponible = False
+_UNDEFINED_TABLE = "42P01"  # SQLSTATE de relación inexistente
+
+
+def disponible(db: Session) -> bool:
+    """¿Existe la vista? (se recuerda una vez encontrada)."""
+    global _disponible
+    if not _disponible:
+        _disponible = db.execute(text("SELECT to_regclass(:n) IS NOT NULL"), {"n": RANKING_MV}).scalar() or False
+    return _disponible
+
+
+def ranking(db: Session, anio: Optional[int], idioma: Optional[str]) -> Optional[List[Tuple[int, str, float, int]]]:
+    """
+    [(docente_id, nombre, promedio_pct, grupos)] de docentes con al menos una respuesta,
+    sin ordenar. promedio_pct = promedio (1..5) / 5 * 100.
+    None si la vista dejó de existir (p.ej. otro worker la recreó al arrancar): el
+    llamador calcula en vivo y `disponible()` vuelve a consultar la próxima vez.
+    """
+    global _disponible
+    filtros = []
+    params: dict = {}
+    if anio:
+        filtros.append("m.anio = :anio")
+        params["anio"] = int(anio)
+    if idioma:
+        # Misma normalización que el resto de los filtros ('Inglés' → ingles)
+        member = idioma_de(idioma)
+        if member is None:
+            return []
+        filtros.append("m.idioma = :idioma")
+        params["idioma"] = member.value
+    where = ("WHERE " + " AND ".join(filtros)) if filtros else ""
+    try:
+        rows = db.execute(
+            text(
+                "SELECT m.docente_id, "
+                "trim(concat(coalesce(trim(u.first_name), ''), ' ', coalesce(trim(u.last_name), ''))) AS nombre, "
+                "sum(m.suma)::float8 / sum(m.n) / 5.0 * 100.0 AS pct, "
+                "sum(m.grupos)::int AS grupos "
+                f"FROM {RANKING_MV} m JOIN users u ON u.id = m.docente_id "
+                f"{where} "
+                "GROUP BY m.docente_id, u.first_name, u.last_name "
+                "HAVING sum(m.n) > 0"
+            ),
+            params,
+        ).all()
+    except ProgrammingError as e:
+        if getattr(e.orig, "pgcode", None) != _UNDEFINED_TABLE:
+            raise
+        db.rollback()
+        _disponible = False
+        return None
+    return [(int(r.docente_id), r.nombre or "Docente", float(r.pct or 0.0), int(r.grupos or 0)) for r in rows]
+
+
+# =========================
+#  Refresco
+# =========================
+def refrescar() -> bool:
+    """REFRESH CONCURRENTLY si ningún otro proceso lo está haciendo. True si refrescó."""
+    with engine.begin() as conn:
+        if not conn.execute(text("SELECT pg_try_advisory_xact_lock(:k)"), {"k": _ADVISORY_KEY}).scalar():
+            return False
+        conn.execute(text(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {RANKING_MV}"))
+    return True
+
+
+_cambio = threading.Event()
+
+
+def marcar_cambio() -> None:
+    """Llamar después del commit de una encuesta; el refresco se agenda con debounce."""
+    _cambio.set()
+
+
+class _Refrescador(threading.Thread):
+    def __init__(self):
+        super().__init__(name="ranking-docentes-refresh", daemon=True)
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        _cambio.set()
+
+    def run(self) -> None:
+        while not self._stop_event.is_set():
+            if _cambio.wait(RANKING_REFRESH_SECONDS):
+                # Junta la ráfaga de encuestas de un mismo grupo en un solo refresco
+                if self._stop_event.wait(RANKING_DEBOUNCE_SECONDS):
+                    return
+            _cambio.clear()
+            if self._stop_event.is_set():
+                return
+            try:
+                refrescar()
+            except Exception:
+                logger.exception("Refresco de %s falló", RANKING_MV)
+
+
+_refrescador: Optional[_Refrescador] = None
+_refrescador_lock = threading.Lock()
+
+
+def start() -> None:
+    global _refrescador
+    if engine.dialect.name != "postgresql":
+        return
+    with _refrescador_lock:
+        if _refrescador is None or not _refrescador.is_alive():
+            _refrescador = _Refrescador()
+            _refrescador.start()
+
+
+def shutdown() -> None:
+    global _refrescador
+    with _refrescador_lock:
+        if _refrescador is not None:
+            _refrescador.stop()
+            _refrescador = None
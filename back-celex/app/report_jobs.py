@@ -0,0 +1,333 @@
+# app/report_jobs.py
+"""
+Ejecución de reportes pesados fuera del request.
+
+- El router crea la fila en `report_jobs` y llama a `enqueue(job_id)`.
+- Un ProcessPoolExecutor (contexto spawn: cada proceso crea su propio engine)
+  ejecuta `run_report_job`, que reutiliza los generadores de filas de
+  coordinacion_reportes / coordinacion_dashboard y escribe el archivo en disco.
+- El progreso y la cancelación viajan por la propia tabla `report_jobs`.
+- Mientras corre, un hilo del worker actualiza `heartbeat_at`. Un RUNNING sin
+  latido por REPORT_JOBS_STALE_SECONDS quedó huérfano (worker muerto por OOM,
+  kill, reinicio): `marcar_huerfanos` lo pasa a FAILED para que deje de contar
+  contra el límite por usuario y se pueda cancelar/eliminar.
+- Al arrancar, `recuperar()` marca los huérfanos y vuelve a encolar los QUEUED
+  (el shutdown cancela los pendientes). Encolar dos veces no duplica: el worker
+  toma el job con un UPDATE condicionado a QUEUED.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy import func
+
+from .database import SessionLocal
+from .export_utils import CSV_MIME, XLSX_MIME, iter_csv, write_xlsx
+from .models import ReportJob, ReportJobStatus
+from .routers.coordinacion_dashboard import preguntas_agg
+from .routers.coordinacion_reportes import (
+    INSCRITOS_HEADER, PAGOS_HEADER, ENCUESTA_RESPUESTAS_HEADER,
+    _inscritos_query, _inscritos_filas,
+    _pagos_query, _pagos_filas,
+    _encuesta_respuestas_query, _encuesta_respuestas_filas,
+)
+
+logger = logging.getLogger("celex.report_jobs")
+
+REPORT_JOBS_DIR = os.path.abspath(os.getenv("REPORT_JOBS_DIR", "uploads/reportes"))
+REPORT_JOBS_WORKERS = int(os.getenv("REPORT_JOBS_WORKERS", "2"))
+REPORT_JOBS_MAX_ACTIVE_PER_USER = int(os.getenv("REPORT_JOBS_MAX_ACTIVE_PER_USER", "2"))
+REPORT_JOBS_HEARTBEAT_SECONDS = int(os.getenv("REPORT_JOBS_HEARTBEAT_SECONDS", "15"))
+REPORT_JOBS_STALE_SECONDS = int(os.getenv("REPORT_JOBS_STALE_SECONDS", "120"))
+
+# Cada cuántas filas se reporta avance y se revisa si pidieron cancelar
+_PROGRESS_EVERY = 1000
+
+ACTIVE_STATES = (ReportJobStatus.QUEUED, ReportJobStatus.RUNNING)
+
+ERROR_HUERFANO = "El proceso del reporte se interrumpió (reinicio o falla del servidor); vuelve a generarlo"
+
+
+# =========================
+#  Huérfanos
+# =========================
+def condicion_huerfano():
+    """RUNNING cuyo worker dejó de latir."""
+    limite = func.now() - timedelta(seconds=REPORT_JOBS_STALE_SECONDS)
+    return (ReportJob.status == ReportJobStatus.RUNNING) & (
+        func.coalesce(ReportJob.heartbeat_at, ReportJob.started_at, ReportJob.created_at) < limite
+    )
+
+
+def marcar_huerfanos(db, owner_id: Optional[int] = None, job_id: Optional[int] = None) -> int:
+    """Huérfanos → FAILED. No hace commit. Regresa cuántos marcó."""
+    q = db.query(ReportJob).filter(condicion_huerfano())
+    if owner_id is not None:
+        q = q.filter(ReportJob.owner_id == owner_id)
+    if job_id is not None:
+        q = q.filter(ReportJob.id == job_id)
+    return q.update(
+        {
+            ReportJob.status: ReportJobStatus.FAILED,
+            ReportJob.error: ERROR_HUERFANO,
+            ReportJob.finished_at: func.now(),
+        },
+        synchronize_session=False,
+    )
+
+
+def recuperar() -> None:
+    """Arranque: marca huérfanos y re-encola lo que quedó en cola."""
+    db = SessionLocal()
+    try:
+        n = marcar_huerfanos(db)
+        db.commit()
+        if n:
+            logger.warning("REPORT JOBS: %s huérfano(s) marcados como fallidos", n)
+        pendientes = [
+            r[0] for r in db.query(ReportJob.id)
+            .filter(ReportJob.status == ReportJobStatus.QUEUED)
+            .order_by(ReportJob.id)
+            .all()
+        ]
+    except Exception:
+        db.rollback()
+        logger.exception("REPORT JOBS: no se pudo recuperar la cola")
+        return
+    finally:
+        db.close()
+    for job_id in pendientes:
+        try:
+            enqueue(job_id)
+        except Exception:
+            logger.exception("REPORT JOBS: no se pudo re-encolar id=%s", job_id)
+
+
+# =========================
+#  Catálogo de reportes
+# =========================
+def _encuesta_preguntas_filas(db, ciclo_id=None, anio=None, idioma=None):
+    out = preguntas_agg(
+        cicloId=ciclo_id,
+        anio=anio,
+        idioma=idioma,
+        allCiclos=ciclo_id is None,
+        db=db,
+        current=None,
+    )
+    for r in out.preguntas:
+        yield (r.category_name, r.id, r.texto, r.promedio_pct, r.respuestas)
+
+
+# tipo -> encabezado, hoja XLSX, generador de filas (db, **params) y conteo para el progreso
+REPORTES = {
+    "inscritos": {
+        "header": INSCRITOS_HEADER,
+        "hoja": "Inscritos",
+        "filas": lambda db, p: _inscritos_filas(db, p.get("ciclo_id"), p.get("anio")),
+        "total": lambda db, p: _inscritos_query(db, p.get("ciclo_id"), p.get("anio")).order_by(None).count(),
+    },
+    "pagos": {
+        "header": PAGOS_HEADER,
+        "hoja": "Pagos",
+        "filas": lambda db, p: _pagos_filas(db, p.get("ciclo_id"), p.get("anio")),
+        "total": lambda db, p: _pagos_query(db, p.get("ciclo_id"), p.get("anio")).order_by(None).count(),
+    },
+    "encuesta_respuestas": {
+        "header": ENCUESTA_RESPUESTAS_HEADER,
+        "hoja": "Respuestas",
+        "filas": lambda db, p: _encuesta_respuestas_filas(db, p.get("ciclo_id"), p.get("anio")),
+        "total": lambda db, p: _encuesta_respuestas_query(db, p.get("ciclo_id"), p.get("anio")).order_by(None).count(),
+    },
+    "encuesta_preguntas": {
+        "header": ["categoria", "pregunta_id", "pregunta", "promedio_pct", "respuestas"],
+        "hoja": "Preguntas",
+        "filas": lambda db, p: _encuesta_preguntas_filas(db, p.get("ciclo_id"), p.get("anio"), p.get("idioma")),
+        "total": None,
+    },
+}
+
+
+# =========================
+#  Worker
+# =========================
+class _Cancelado(Exception):
+    pass
+
+
+def _con_progreso(db, job_id: int, filas, total):
+    """Pasa las filas tal cual; cada _PROGRESS_EVERY actualiza avance y revisa cancelación."""
+    n = 0
+    for row in filas:
+        yield row
+        n += 1
+        if n % _PROGRESS_EVERY == 0:
+            cancel = db.query(ReportJob.cancel_requested).filter(ReportJob.id == job_id).scalar()
+            if cancel:
+                raise _Cancelado()
+            pct = min(99, int(n * 100 / total)) if total else 0
+            db.query(ReportJob).filter(ReportJob.id == job_id).update(
+                {ReportJob.rows_done: n, ReportJob.progress: pct}, synchronize_session=False
+            )
+            db.commit()
+    db.query(ReportJob).filter(ReportJob.id == job_id).update(
+        {ReportJob.rows_done: n}, synchronize_session=False
+    )
+    db.commit()
+
+
+class _Latido(threading.Thread):
+    """Actualiza heartbeat_at del job mientras el worker vive (sesión propia)."""
+
+    def __init__(self, job_id: int):
+        super().__init__(name=f"report-job-latido-{job_id}", daemon=True)
+        self.job_id = job_id
+        self._stop_event = threading.Event()
+
+    def stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self) -> None:
+        while not self._stop_event.wait(REPORT_JOBS_HEARTBEAT_SECONDS):
+            db = SessionLocal()
+            try:
+                db.query(ReportJob).filter(
+                    ReportJob.id == self.job_id, ReportJob.status == ReportJobStatus.RUNNING
+                ).update({ReportJob.heartbeat_at: func.now()}, synchronize_session=False)
+                db.commit()
+            except Exception:
+                db.rollback()
+                logger.exception("REPORT JOB latido falló: id=%s", self.job_id)
+            finally:
+                db.close()
+
+
+def _finish(db, job_id: int, values: dict) -> None:
+    values[ReportJob.finished_at] = func.now()
+    db.query(ReportJob).filter(ReportJob.id == job_id).update(values, synchronize_session=False)
+    db.commit()
+
+
+def run_report_job(job_id: int) -> None:
+    """
+    Punto de entrada del proceso worker. Usa dos sesiones: una para leer datos
+    (cursor del lado del servidor abierto todo el tiempo) y otra para estado/progreso.
+    """
+    db = SessionLocal()
+    tmp_path = None
+    latido = None
+    try:
+        claimed = (
+            db.query(ReportJob)
+            .filter(ReportJob.id == job_id, ReportJob.status == ReportJobStatus.QUEUED)
+            .update(
+                {
+                    ReportJob.status: ReportJobStatus.RUNNING,
+                    ReportJob.started_at: func.now(),
+                    ReportJob.heartbeat_at: func.now(),
+                },
+                synchronize_session=False,
+            )
+        )
+        db.commit()
+        if not claimed:
+            return  # cancelado antes de empezar (o ya lo tomó otro worker)
+        latido = _Latido(job_id)
+        latido.start()
+
+        job = db.get(ReportJob, job_id)
+        spec = REPORTES[job.tipo]
+        params = dict(job.params or {})
+        formato = job.formato
+
+        os.makedirs(REPORT_JOBS_DIR, exist_ok=True)
+        final_path = os.path.join(REPORT_JOBS_DIR, f"{job_id}_{job.tipo}.{formato}")
+        tmp_path = final_path + ".part"
+
+        data_db = SessionLocal()
+        try:
+            total = spec["total"](data_db, params) if spec["total"] else None
+            db.query(ReportJob).filter(ReportJob.id == job_id).update(
+                {ReportJob.rows_total: total}, synchronize_session=False
+            )
+            db.commit()
+
+            filas = _con_progreso(db, job_id, spec["filas"](data_db, params), total)
+            with open(tmp_path, "wb") as fh:
+                if formato == "xlsx":
+                    write_xlsx(fh, spec["header"], filas, spec["hoja"])
+                else:
+                    for chunk in iter_csv(spec["header"], filas):
+                        fh.write(chunk)
+        finally:
+            data_db.close()
+
+        os.replace(tmp_path, final_path)
+        tmp_path = None
+        _finish(db, job_id, {
+            ReportJob.status: ReportJobStatus.DONE,
+            ReportJob.progress: 100,
+            ReportJob.artifact_path: final_path,
+            ReportJob.artifact_mime: XLSX_MIME if formato == "xlsx" else CSV_MIME,
+            ReportJob.artifact_size: os.path.getsize(final_path),
+        })
+        logger.info("REPORT JOB OK: id=%s path=%s", job_id, final_path)
+    except _Cancelado:
+        db.rollback()
+        _finish(db, job_id, {ReportJob.status: ReportJobStatus.CANCELLED})
+        logger.info("REPORT JOB cancelado: id=%s", job_id)
+    except Exception as e:
+        logger.exception("REPORT JOB falló: id=%s", job_id)
+        db.rollback()
+        _finish(db, job_id, {ReportJob.status: ReportJobStatus.FAILED, ReportJob.error: str(e)[:2000]})
+    finally:
+        if latido is not None:
+            latido.stop()
+        if tmp_path and os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        db.close()
+
+
+# =========================
+#  Pool de procesos
+# =========================
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=REPORT_JOBS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def enqueue(job_id: int) -> None:
+    global _pool
+    try:
+        _get_pool().submit(run_report_job, job_id)
+    except BrokenProcessPool:
+        # Un worker murió (OOM, kill): se recrea el pool y se reintenta una vez
+        with _pool_lock:
+            _pool = None
+        _get_pool().submit(run_report_job, job_id)
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
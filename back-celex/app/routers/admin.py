@@ -1,12 +1,13 @@
 # app/routers/admin.py
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Path
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 import secrets, string
 from pydantic import BaseModel, EmailStr, field_validator
 
 from ..auth import get_db, require_superuser, get_password_hash
 from ..models import User, UserRole
+from ..search import filtro_personas
+from ..pagination import TotalMode, listing_total, page_with_cursor, total_pages
 from ..schemas import UserOut, CoordinatorListResponse, ToggleActiveRequest
 from ..email_utils import send_email
 
@@ -167,38 +168,40 @@ def list_coordinators(
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
     q: str | None = Query(None, description="Búsqueda por nombre, email o CURP"),
+    cursor: str | None = Query(None, description="next_cursor de la respuesta anterior (ignora page)"),
+    total_mode: TotalMode = Query("exact", alias="total", description="exact | estimate | none"),
 ):
     """
     Lista coordinadores con paginación.
     - page: número de página (1-based)
     - page_size: tamaño de página (1..100)
-    - q: texto de búsqueda (nombre, apellido, email, curp)
-    Orden: más recientes primero (created_at DESC)
+    - q: texto de búsqueda (nombre, apellido, email, curp, boleta; sin importar acentos)
+    Orden: mejor coincidencia primero si hay q; luego más recientes (created_at DESC)
+    - cursor: paginación keyset; cada respuesta trae next_cursor
     """
     base = db.query(User).filter(User.role == UserRole.coordinator)
 
-    if q:
-        like = f"%{q.strip()}%"
-        base = base.filter(
-            or_(
-                User.first_name.ilike(like),
-                User.last_name.ilike(like),
-                User.email.ilike(like),
-                User.curp.ilike(like),
-            )
-        )
-
-    total = base.count()
-    pages = (total + page_size - 1) // page_size if total else 1
-    if page > pages and total > 0:
+    cond, rank = filtro_personas(db, q)
+    if cond is not None:
+        base = base.filter(cond)
+
+    cache_key = ("coordinators", q) if cursor else None
+    total = listing_total(db, base, total_mode, cache_key, table="users", filtered=True)
+    pages = total_pages(total, page_size)
+    if pages is not None and page > pages and total > 0:
         page = pages  # ajusta si te piden una página más allá del final
 
-    items = (
-        base.order_by(User.created_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
+    # llave keyset: (similitud,) created_at, id — todas DESC
+    keys = [User.created_at, User.id]
+    if rank is not None:
+        keys.insert(0, rank)
+        base = base.add_columns(rank.label("score"))
+
+    rows, next_cursor = page_with_cursor(
+        base, keys, page_size, cursor, offset=(page - 1) * page_size,
+        key=(lambda r: [r.score, r.User.created_at, r.User.id]) if rank is not None else None,
     )
+    items = [r.User for r in rows] if rank is not None else rows
 
     return CoordinatorListResponse(
         items=items,
@@ -206,6 +209,7 @@ def list_coordinators(
         page=page,
         page_size=page_size,
         pages=pages,
+        next_cursor=next_cursor,
     )
 
 
@@ -6,6 +6,8 @@ from datetime import date, datetime, timezone
 
 from ..database import get_db
 from ..auth import get_current_user
+from .. import ranking_docentes
+from ..docente_snapshot import invalidar_overview
 from ..models import (
     User, Inscripcion, Ciclo,
     SurveyCategory, SurveyQuestion, SurveyResponse, SurveyAnswer
@@ -213,4 +215,6 @@ def submit_survey(
         db.add(ans)
 
     db.commit()
+    ranking_docentes.marcar_cambio()
+    invalidar_overview(ciclo_id=insc.ciclo_id)
     return {"ok": True}
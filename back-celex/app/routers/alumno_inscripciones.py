@@ -6,13 +6,18 @@ from uuid import uuid4
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, status, Request, UploadFile, Query, Response
-from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session, lazyload, joinedload
 from sqlalchemy import func
 from sqlalchemy.exc import IntegrityError
 
 from ..database import get_db
 from ..auth import get_current_user
+from ..inscripcion_utils import actualizar_ultima_inscripcion
+from ..historial import invalidar_historial, recalcular_resumen
+from ..docente_snapshot import invalidar_overview
+from ..file_serving import servir_archivo
+from ..idempotency import idempotente
+from .. import lista_espera, upload_variants
 from ..models import Ciclo, UserRole as ModelUserRole, InscripcionTipo
 from .. import models as models_mod  # resolver Inscripcion en runtime
 from ..schemas import (
@@ -90,9 +95,10 @@ def _check_no_duplicado(db: Session, Inscripcion, ciclo_id: int, alumno_id: int)
         raise HTTPException(status_code=400, detail="Ya tienes una inscripción activa en este ciclo")
 
 
-def _check_cupo(db: Session, Inscripcion, ciclo: Ciclo):
+def _check_cupo(db: Session, Inscripcion, ciclo: Ciclo, alumno_id: int):
     """
-    Verifica el cupo contando únicamente inscripciones activas.
+    Verifica el cupo contando inscripciones activas y los lugares ofrecidos a
+    otros alumnos de la lista de espera (el propio no cuenta: es su lugar).
     """
     estados_activos = ("registrada", "preinscrita", "confirmada")
     inscritos = (
@@ -104,7 +110,8 @@ def _check_cupo(db: Session, Inscripcion, ciclo: Ciclo):
         .scalar()
         or 0
     )
-    lugares_disponibles = max(0, (ciclo.cupo_total or 0) - inscritos)
+    ofrecidos = lista_espera.admitidos_vigentes(db, ciclo.id, excluir_alumno_id=alumno_id)
+    lugares_disponibles = max(0, (ciclo.cupo_total or 0) - inscritos - ofrecidos)
     if lugares_disponibles <= 0:
         raise HTTPException(status_code=409, detail="No hay lugares disponibles")
 
@@ -249,6 +256,7 @@ async def _save_upload(file: UploadFile, env_dir_key: str, default_dir: str, max
     finally:
         await file.close()
 
+    upload_variants.encolar(full_path)
     return full_path, file.content_type, size
 
 
@@ -300,7 +308,20 @@ async def crear_inscripcion(
 
     Idempotente: si ya existe una inscripción **activa** para (ciclo, alumno),
     responde 200 con { already_exists: true, id, status }.
+
+    Encabezado opcional `Idempotency-Key`: un reintento con la misma llave
+    devuelve la respuesta original sin volver a leer ni guardar archivos.
     """
+    return await idempotente(
+        request, db, user.id, "inscripciones",
+        lambda: _crear_inscripcion(request, db, user, response),
+        response=response,
+        status_code=status.HTTP_201_CREATED,
+        campos=("ciclo_id", "tipo"),
+    )
+
+
+async def _crear_inscripcion(request: Request, db: Session, user, response: Response | None):
     Inscripcion = _get_inscripcion_model()
     if Inscripcion is None:
         raise HTTPException(
@@ -340,7 +361,7 @@ async def crear_inscripcion(
                 "status": existente.status,
             }
 
-        _check_cupo(db, Inscripcion, ciclo)
+        _check_cupo(db, Inscripcion, ciclo, user.id)
 
         ins = Inscripcion(
             ciclo_id=ciclo_id,
@@ -351,7 +372,13 @@ async def crear_inscripcion(
         )
         db.add(ins)
         try:
+            db.flush()
+            actualizar_ultima_inscripcion(db, [user.id])
+            lista_espera.cerrar_espera(db, user.id, ciclo_id=ciclo_id)
+            recalcular_resumen(db, inscripcion_ids=[ins.id])
             db.commit()
+            invalidar_historial(alumno_id=user.id)
+            invalidar_overview(ciclo_id=ciclo_id)
         except IntegrityError:
             db.rollback()
             # Otra transacción pudo crearla: devuelve la existente
@@ -402,7 +429,7 @@ async def crear_inscripcion(
                 "status": existente.status,
             }
 
-        _check_cupo(db, Inscripcion, ciclo)
+        _check_cupo(db, Inscripcion, ciclo, user.id)
 
         # ===== Rama EXENCIÓN =====
         if raw_tipo == "exencion":
@@ -429,7 +456,13 @@ async def crear_inscripcion(
             )
             db.add(ins)
             try:
+                db.flush()
+                actualizar_ultima_inscripcion(db, [user.id])
+                lista_espera.cerrar_espera(db, user.id, ciclo_id=ciclo_id)
+                recalcular_resumen(db, inscripcion_ids=[ins.id])
                 db.commit()
+                invalidar_historial(alumno_id=user.id)
+                invalidar_overview(ciclo_id=ciclo_id)
             except IntegrityError:
                 db.rollback()
                 # limpieza si falló por conflicto
@@ -522,6 +555,7 @@ async def crear_inscripcion(
                     out.write(chunk)
         finally:
             await file.close()
+        upload_variants.encolar(full_path)
 
         # Exigir y guardar comprobante de estudios si es IPN
         file_est: UploadFile | None = form.get("comprobante_estudios")  # type: ignore
@@ -557,7 +591,13 @@ async def crear_inscripcion(
         )
         db.add(ins)
         try:
-            db.commit()  # respeta los CHECKs de BD
+            db.flush()  # respeta los CHECKs de BD
+            actualizar_ultima_inscripcion(db, [user.id])
+            lista_espera.cerrar_espera(db, user.id, ciclo_id=ciclo_id)
+            recalcular_resumen(db, inscripcion_ids=[ins.id])
+            db.commit()
+            invalidar_historial(alumno_id=user.id)
+            invalidar_overview(ciclo_id=ciclo_id)
         except IntegrityError:
             db.rollback()
             # limpieza de archivos en caso de fallo
@@ -593,6 +633,7 @@ async def crear_inscripcion(
 @router.get("/{inscripcion_id}/archivo")
 def descargar_archivo_inscripcion(
     inscripcion_id: int,
+    request: Request,
     tipo: str = Query(..., pattern="^(comprobante|estudios|exencion)$"),
     db: Session = Depends(get_db),
     user=Depends(require_student),
@@ -623,8 +664,7 @@ def descargar_archivo_inscripcion(
     if not path or not os.path.exists(path):
         raise HTTPException(status_code=404, detail="Archivo no disponible")
 
-    filename = os.path.basename(path)
-    return FileResponse(path, media_type=mime, filename=filename)
+    return servir_archivo(request, path, media_type=mime)
 
 
 # ==========================
@@ -739,6 +779,13 @@ def cancelar_inscripcion(inscripcion_id: int, db: Session = Depends(get_db), use
     if not ins:
         raise HTTPException(status_code=404, detail="Inscripción no encontrada")
 
+    ciclo_id = ins.ciclo_id
     db.delete(ins)
+    db.flush()
+    actualizar_ultima_inscripcion(db, [user.id])
     db.commit()
+    invalidar_historial(alumno_id=user.id)
+    invalidar_overview(ciclo_id=ciclo_id)
+    # Se liberó un lugar: el promotor admite al siguiente de la lista de espera
+    lista_espera.despertar(ciclo_id=ciclo_id)
     return
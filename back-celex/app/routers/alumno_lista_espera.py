@@ -0,0 +1,174 @@
+# app/routers/alumno_lista_espera.py
+from datetime import datetime
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from pydantic import BaseModel, ConfigDict, model_validator
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..models import Ciclo, Inscripcion, ListaEspera, ListaEsperaStatus, PlacementExam, PlacementRegistro
+from .. import lista_espera, placement_capacity, placement_holds
+from .alumno_inscripciones import require_student, _check_ventana_inscripcion
+
+router = APIRouter(prefix="/alumno/lista-espera", tags=["alumno-lista-espera"])
+
+
+# ------------------------------
+# Schemas
+# ------------------------------
+class ListaEsperaIn(BaseModel):
+    ciclo_id: Optional[int] = None
+    exam_id: Optional[int] = None
+
+    @model_validator(mode="after")
+    def _un_destino(self):
+        if (self.ciclo_id is None) == (self.exam_id is None):
+            raise ValueError("Indica ciclo_id o exam_id (solo uno)")
+        return self
+
+
+class ListaEsperaOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    ciclo_id: Optional[int] = None
+    exam_id: Optional[int] = None
+    status: ListaEsperaStatus
+    posicion: Optional[int] = None          # 1 = siguiente; None si ya no espera
+    admitida_hasta: Optional[datetime] = None
+    created_at: datetime
+
+
+# ------------------------------
+# Helpers
+# ------------------------------
+def _to_out(db: Session, e: ListaEspera) -> ListaEsperaOut:
+    out = ListaEsperaOut.model_validate(e)
+    out.posicion = lista_espera.posicion(db, e)
+    return out
+
+
+def _get_entry(db: Session, entry_id: int, alumno_id: int) -> ListaEspera:
+    e = db.query(ListaEspera).filter(ListaEspera.id == entry_id, ListaEspera.alumno_id == alumno_id).first()
+    if not e:
+        raise HTTPException(status_code=404, detail="Turno no encontrado")
+    return e
+
+
+def _validar_ciclo(db: Session, ciclo_id: int, alumno_id: int) -> None:
+    ciclo = db.query(Ciclo).filter(Ciclo.id == ciclo_id).first()
+    if not ciclo:
+        raise HTTPException(status_code=404, detail="Ciclo no encontrado")
+    _check_ventana_inscripcion(ciclo)
+    ya = (
+        db.query(Inscripcion.id)
+        .filter(
+            Inscripcion.ciclo_id == ciclo_id,
+            Inscripcion.alumno_id == alumno_id,
+            Inscripcion.status.in_(lista_espera.INSC_ACTIVAS),
+        )
+        .first()
+    )
+    if ya:
+        raise HTTPException(status_code=409, detail="Ya tienes una inscripción activa en este ciclo")
+    if lista_espera.lugares_libres_ciclo(db, ciclo, alumno_id) > 0:
+        raise HTTPException(status_code=409, detail="Aún hay lugares disponibles: inscríbete directamente")
+
+
+def _validar_examen(db: Session, exam_id: int, alumno_id: int) -> None:
+    exam = db.get(PlacementExam, exam_id)
+    if not exam or not bool(exam.activo):
+        raise HTTPException(status_code=404, detail="Examen no disponible")
+    ya = (
+        db.query(PlacementRegistro.id)
+        .filter(
+            PlacementRegistro.exam_id == exam_id,
+            PlacementRegistro.alumno_id == alumno_id,
+            PlacementRegistro.status.in_(placement_capacity.ACTIVE_REG_STATUSES),
+        )
+        .first()
+    )
+    if ya:
+        raise HTTPException(status_code=409, detail="Ya tienes un registro activo para este examen")
+    if placement_holds.lugares_libres(db, exam, alumno_id) > 0:
+        raise HTTPException(status_code=409, detail="Aún hay lugares disponibles: regístrate directamente")
+
+
+# ------------------------------
+# Endpoints
+# ------------------------------
+@router.post("", response_model=ListaEsperaOut, status_code=201)
+def formarse(
+    payload: ListaEsperaIn,
+    response: Response,
+    db: Session = Depends(get_db),
+    user=Depends(require_student),
+):
+    """
+    Se forma en la lista de espera de un ciclo o examen lleno.
+    Idempotente: si ya tiene turno abierto responde 200 con ese turno.
+    """
+    existente = lista_espera.turno_abierto(db, user.id, payload.ciclo_id, payload.exam_id)
+    if existente:
+        response.status_code = status.HTTP_200_OK
+        return _to_out(db, existente)
+
+    if payload.ciclo_id is not None:
+        _validar_ciclo(db, payload.ciclo_id, user.id)
+    else:
+        _validar_examen(db, payload.exam_id, user.id)
+
+    e = ListaEspera(alumno_id=user.id, ciclo_id=payload.ciclo_id, exam_id=payload.exam_id)
+    db.add(e)
+    try:
+        db.commit()
+    except IntegrityError:
+        # Doble clic: otra petición ya creó el turno
+        db.rollback()
+        existente = lista_espera.turno_abierto(db, user.id, payload.ciclo_id, payload.exam_id)
+        if not existente:
+            raise
+        response.status_code = status.HTTP_200_OK
+        return _to_out(db, existente)
+    db.refresh(e)
+    return _to_out(db, e)
+
+
+@router.get("", response_model=List[ListaEsperaOut])
+def mis_turnos(db: Session = Depends(get_db), user=Depends(require_student)):
+    rows = (
+        db.query(ListaEspera)
+        .filter(ListaEspera.alumno_id == user.id, ListaEspera.status.in_(lista_espera.ABIERTAS))
+        .order_by(ListaEspera.created_at.asc())
+        .all()
+    )
+    return [_to_out(db, e) for e in rows]
+
+
+@router.get("/{entry_id}", response_model=ListaEsperaOut)
+def posicion_turno(entry_id: int, db: Session = Depends(get_db), user=Depends(require_student)):
+    """Consulta barata de posición (un conteo sobre índice) para refrescar en el cliente."""
+    return _to_out(db, _get_entry(db, entry_id, user.id))
+
+
+@router.delete("/{entry_id}", status_code=204)
+def salir_de_lista(entry_id: int, db: Session = Depends(get_db), user=Depends(require_student)):
+    e = _get_entry(db, entry_id, user.id)
+    if e.status not in lista_espera.ABIERTAS:
+        return Response(status_code=204)
+
+    liberaba_lugar = e.status == ListaEsperaStatus.ADMITIDA
+    e.status = ListaEsperaStatus.CANCELADA
+    e.cerrada_at = func.now()
+    db.flush()  # soltar() no libera el apartado mientras el turno siga ADMITIDA
+    # En exámenes la admisión es un PlacementHold: se suelta junto con el turno
+    if liberaba_lugar and e.exam_id is not None and placement_holds.soltar(db, e.exam_id, user.id):
+        placement_capacity.notificar(db, [e.exam_id])
+    db.commit()
+
+    if liberaba_lugar:
+        lista_espera.despertar(ciclo_id=e.ciclo_id, exam_id=e.exam_id)
+    return Response(status_code=204)
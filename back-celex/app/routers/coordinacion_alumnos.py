@@ -1,14 +1,17 @@
 # app/routers/coordinacion_alumnos.py
-from typing import List, Optional, Tuple, Dict
+from typing import List, Optional
 from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, func, case, desc
+from sqlalchemy import desc, func, literal
 from datetime import date
 
 from ..database import get_db
 from ..auth import require_coordinator_or_admin
-from ..models import User, Inscripcion, Ciclo, Evaluacion
-from .. import models_asistencia as ma  # AsistenciaSesion (ciclo_id), AsistenciaRegistro (sesion_id, inscripcion_id, estado)
+from ..models import User, Inscripcion, Ciclo, Evaluacion, AlumnoUltimaInscripcion, InscripcionSummary
+from ..search import filtro_personas
+from ..ciclo_filtros import filtrar_ciclos
+from ..pagination import TotalMode, listing_total, page_with_cursor, total_pages
+from ..historial import historial_cache, historial_filas, historial_query
 
 # ------------------------------
 # Router
@@ -65,10 +68,11 @@ class AlumnoFullOut(BaseModel):
 
 class AlumnosListResponse(BaseModel):
     items: List[AlumnoFullOut]
-    total: int
+    total: Optional[int] = None
     page: int
     page_size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None
 
 
 class HistorialAsistenciaSummary(BaseModel):
@@ -278,41 +282,29 @@ def listar_alumnos(
     page: int = Query(1, ge=1),
     page_size: int = Query(25, ge=1, le=200),
     unique_alumno: bool = Query(True, description="Si True, pagina por alumnos únicos (no por inscripciones)"),
+    cursor: Optional[str] = Query(None, description="next_cursor de la respuesta anterior (ignora page)"),
+    total_mode: TotalMode = Query("exact", alias="total", description="exact | estimate | none"),
     db: Session = Depends(get_db),
 ):
     """
     Lista alumnos. Si unique_alumno=True (default), devuelve alumnos únicos (1 fila por User),
     eligiendo su inscripción más reciente que cumpla los filtros.
+    Paginación por page/page_size o por cursor (next_cursor); total=none evita el conteo.
     """
     # --- base join con todos los filtros compartidos ---
     start_col = _ciclo_start_col()
+    # búsqueda por trigramas sin acentos (ILIKE si la BD no tiene pg_trgm/unaccent)
+    cond, rank = filtro_personas(db, q)
 
     def apply_filters(qry):
-        if idioma:
-            try:
-                qry = qry.filter(or_(Ciclo.idioma == idioma, func.lower(Ciclo.idioma) == idioma.lower()))
-            except Exception:
-                qry = qry.filter(Ciclo.idioma == idioma)
-
-        if anio:
-            conds = [func.substr(Ciclo.codigo, 1, 4) == str(anio)]
-            if start_col is not None:
-                conds.append(func.extract("year", start_col) == anio)
-            qry = qry.filter(or_(*conds))
-
-        if q:
-            pat = f"%{q.strip()}%"
-            qry = qry.filter(
-                or_(
-                    User.first_name.ilike(pat),
-                    User.last_name.ilike(pat),
-                    User.email.ilike(pat),
-                    User.curp.ilike(pat),
-                    User.boleta.ilike(pat),
-                )
-            )
+        qry = filtrar_ciclos(qry, anio, idioma)
+
+        if cond is not None:
+            qry = qry.filter(cond)
         return qry
 
+    cache_key = ("alumnos", unique_alumno, q, anio, idioma) if cursor else None
+
     if not unique_alumno:
         # --------- MODO CLÁSICO: una fila por inscripción ----------
         qry = (
@@ -322,23 +314,67 @@ def listar_alumnos(
         )
         qry = apply_filters(qry)
 
-        # orden
-        order_cols = [User.last_name.asc(), User.first_name.asc()]
-        if start_col is not None:
-            order_cols.extend([desc(start_col), desc(Ciclo.codigo)])
-        else:
-            order_cols.append(desc(Ciclo.codigo))
-        qry = qry.order_by(*order_cols)
-
-        total = qry.count()
-        pages = max(1, (total + page_size - 1) // page_size)
-        page = min(page, pages)
-        rows = qry.offset((page - 1) * page_size).limit(page_size).all()
+        total = listing_total(db, qry, total_mode, cache_key,
+                              table="inscripciones", filtered=bool(q or anio or idioma))
+        pages = total_pages(total, page_size)
+        if pages is not None:
+            page = min(page, pages)
+
+        # orden (= llave keyset; Inscripcion.id desempata)
+        start = start_col if start_col is not None else Ciclo.codigo
+        keys = [User.last_name, User.first_name, start, Ciclo.codigo, Inscripcion.id]
+        dirs = [False, False, True, True, True]
+        if rank is not None:
+            keys.insert(0, rank)
+            dirs.insert(0, True)
+            qry = qry.add_columns(rank.label("score"))
+
+        def _key(r):
+            vals = [r.User.last_name, r.User.first_name, getattr(r.Ciclo, start.key), r.Ciclo.codigo, r.Inscripcion.id]
+            return ([r.score] + vals) if rank is not None else vals
+
+        rows, next_cursor = page_with_cursor(
+            qry, keys, page_size, cursor, desc=dirs, key=_key, offset=(page - 1) * page_size,
+        )
 
-        items = [_to_full_out(u=user, ins=ins) for (ins, user, _ciclo) in rows]
-        return AlumnosListResponse(items=items, total=total, page=page, page_size=page_size, pages=pages)
+        items = [_to_full_out(u=r.User, ins=r.Inscripcion) for r in rows]
+        return AlumnosListResponse(items=items, total=total, page=page, page_size=page_size, pages=pages,
+                                   next_cursor=next_cursor)
 
     # --------- MODO ÚNICO POR ALUMNO (RECOMENDADO) ----------
+    if not (idioma or anio):
+        # Sin filtros de ciclo: la inscripción elegida es la más reciente del alumno, que ya
+        # está precalculada en alumno_ultima_inscripcion → un join indexado por página.
+        qry = (
+            db.query(Inscripcion, User)
+            .select_from(AlumnoUltimaInscripcion)
+            .join(User, User.id == AlumnoUltimaInscripcion.alumno_id)
+            .join(Inscripcion, Inscripcion.id == AlumnoUltimaInscripcion.inscripcion_id)
+        )
+        if cond is not None:
+            qry = qry.filter(cond)
+
+        total = listing_total(db, qry, total_mode, cache_key,
+                              table="alumno_ultima_inscripcion", filtered=cond is not None)
+        pages = total_pages(total, page_size)
+        if pages is not None:
+            page = min(page, pages)
+
+        keys, dirs = [User.id], [False]
+        if rank is not None:
+            keys, dirs = [rank, User.id], [True, False]
+            qry = qry.add_columns(rank.label("score"))
+
+        rows, next_cursor = page_with_cursor(
+            qry, keys, page_size, cursor, desc=dirs, offset=(page - 1) * page_size,
+            key=(lambda r: [r.score, r.User.id]) if rank is not None else (lambda r: [r.User.id]),
+        )
+        items = [_to_full_out(u=r.User, ins=r.Inscripcion) for r in rows]
+        return AlumnosListResponse(items=items, total=total, page=page, page_size=page_size, pages=pages,
+                                   next_cursor=next_cursor)
+
+    # Con idioma/anio la inscripción elegida es la más reciente *que cumpla los filtros*,
+    # que no es necesariamente la del puntero: se calcula con row_number().
     # row_number() sobre Inscripcion, particionando por alumno y ordenando por inscripcion más reciente
     rn = func.row_number().over(
         partition_by=User.id,
@@ -350,6 +386,7 @@ def listar_alumnos(
             Inscripcion.id.label("ins_id"),
             User.id.label("user_id"),
             Ciclo.id.label("ciclo_id"),
+            (rank if rank is not None else literal(0)).label("rank"),
             rn,
         )
         .join(User, User.id == Inscripcion.alumno_id)
@@ -358,30 +395,36 @@ def listar_alumnos(
     base = apply_filters(base).subquery()
 
     # total de alumnos únicos con los mismos filtros
-    total = db.query(func.count(func.distinct(base.c.user_id))).scalar() or 0
-    pages = max(1, (total + page_size - 1) // page_size)
-    page = min(page, pages)
+    total = listing_total(db, db.query(base.c.user_id).distinct(), total_mode, cache_key)
+    pages = total_pages(total, page_size)
+    if pages is not None:
+        page = min(page, pages)
 
-    # seleccionar sólo rn=1 (la inscripción elegida para cada alumno) y paginar
-    sub = (
-        db.query(base.c.ins_id, base.c.user_id, base.c.ciclo_id)
+    # seleccionar sólo rn=1 (la inscripción elegida para cada alumno) y paginar:
+    # mejor coincidencia, luego orden estable por alumno
+    elegidas = (
+        db.query(base.c.ins_id, base.c.user_id, base.c.ciclo_id, base.c.rank)
         .filter(base.c.rn == 1)
-        .order_by(base.c.user_id.asc())  # orden estable por alumno
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-        .subquery()
     )
-
-    # traer objetos completos para construir el output
-    rows = (
-        db.query(Inscripcion, User, Ciclo)
-        .join(sub, sub.c.ins_id == Inscripcion.id)
-        .join(User, User.id == sub.c.user_id)
-        .join(Ciclo, Ciclo.id == sub.c.ciclo_id)
-        .all()
+    elegidas, next_cursor = page_with_cursor(
+        elegidas, [base.c.rank, base.c.user_id], page_size, cursor,
+        desc=[True, False], offset=(page - 1) * page_size,
     )
 
-    items = [_to_full_out(u=user, ins=ins) for (ins, user, _ciclo) in rows]
+    # traer objetos completos para construir el output (en el orden de la página)
+    ins_ids = [r.ins_id for r in elegidas]
+    por_id = {
+        ins.id: (ins, user)
+        for (ins, user, _ciclo) in (
+            db.query(Inscripcion, User, Ciclo)
+            .join(User, User.id == Inscripcion.alumno_id)
+            .join(Ciclo, Ciclo.id == Inscripcion.ciclo_id)
+            .filter(Inscripcion.id.in_(ins_ids))
+            .all()
+        )
+    } if ins_ids else {}
+
+    items = [_to_full_out(u=por_id[i][1], ins=por_id[i][0]) for i in ins_ids if i in por_id]
 
     return AlumnosListResponse(
         items=items,
@@ -389,8 +432,23 @@ def listar_alumnos(
         page=page,
         page_size=page_size,
         pages=pages,
+        next_cursor=next_cursor,
+    )
+
+def _evaluacion_detalle(ev: Evaluacion, res: InscripcionSummary) -> EvaluacionDetalle:
+    """Detalle por bloques; subtotales y promedio vienen del resumen de la inscripción."""
+    return EvaluacionDetalle(
+        medio_examen=ev.medio_examen,
+        medio_continua=ev.medio_continua,
+        final_examen=ev.final_examen,
+        final_continua=ev.final_continua,
+        final_tarea=ev.final_tarea,
+        subtotal_medio=res.medio_subtotal or 0,
+        subtotal_final=res.final_subtotal or 0,
+        promedio_final=float(res.promedio or 0),
     )
 
+
 # ------------------------------
 # GET /coordinacion/alumnos/{alumno_id}/historial
 # ------------------------------
@@ -414,31 +472,22 @@ def historial_alumno(
       - Asistencia: resumen por inscripción (porcentaje ponderado)
       - Docente: id, nombre, email
     """
-    # Base: Inscripcion join Ciclo
-    q = (
-        db.query(Inscripcion, Ciclo)
-        .join(Ciclo, Ciclo.id == Inscripcion.ciclo_id)
-        .filter(Inscripcion.alumno_id == alumno_id)
-    )
+    cache_key = (alumno_id, (idioma or "").lower(), anio, (estado or "").strip().lower())
+    cached = historial_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Inscripción + ciclo + evaluación + resumen (inscripcion_summary) + docente: sólo lectura de filas
+    q = historial_query(db, alumno_id)
 
     # Estado (case-insensitive)
     if estado:
         q = q.filter(func.lower(Inscripcion.status) == estado.strip().lower())
 
-    # Idioma (case-insensitive)
-    if idioma:
-        try:
-            q = q.filter(or_(Ciclo.idioma == idioma, func.lower(Ciclo.idioma) == idioma.lower()))
-        except Exception:
-            q = q.filter(Ciclo.idioma == idioma)
+    # Idioma y año (Ciclo.anio, ver ciclo_filtros)
+    q = filtrar_ciclos(q, anio, idioma.strip() if idioma else None)
 
-    # Año (por columna de inicio si existe, o prefijo del código)
     start_col = _ciclo_start_col()
-    if anio:
-        conds = [func.substr(Ciclo.codigo, 1, 4) == str(anio)]
-        if start_col is not None:
-            conds.append(func.extract('year', start_col) == anio)
-        q = q.filter(or_(*conds))
 
     # Orden
     if start_col is not None:
@@ -446,190 +495,31 @@ def historial_alumno(
     else:
         q = q.order_by(desc(Ciclo.codigo))
 
-    base_rows = q.all()
-    if not base_rows:
-        return HistorialAlumnoResponse(alumno_id=alumno_id, total=0, items=[])
-
-    ins_ids = [ins.id for (ins, _c) in base_rows]
-    ciclo_ids = [c.id for (_ins, c) in base_rows]
-
-    # --- Evaluaciones por inscripción (promedio simple si existe en tu modelo) ---
-    eval_map: Dict[int, Optional[float]] = {}
-    try:
-        if ins_ids:
-            eval_rows = (
-                db.query(Evaluacion.inscripcion_id, Evaluacion.calificacion)
-                .filter(Evaluacion.inscripcion_id.in_(ins_ids))
-                .all()
-            )
-            for iid, cal in eval_rows:
-                eval_map[iid] = cal
-    except Exception:
-        eval_map = {}
-
-    # --- Evaluación DETALLADA por bloques (toma la última por inscripción) ---
-    eval_det_map: Dict[int, EvaluacionDetalle] = {}
-
-    def _clamp_val(v, maxv):
-        try:
-            n = int(round(float(v)))
-        except Exception:
-            return None
-        return max(0, min(maxv, n))
-
-    try:
-        if ins_ids:
-            rows = (
-                db.query(Evaluacion)
-                .filter(Evaluacion.inscripcion_id.in_(ins_ids))
-                .order_by(Evaluacion.inscripcion_id.asc(), Evaluacion.id.desc())
-                .all()
-            )
-            seen: set[int] = set()
-            for ev in rows:
-                iid = int(getattr(ev, "inscripcion_id"))
-                if iid in seen:
-                    continue
-                seen.add(iid)
-
-                me = _clamp_val(getattr(ev, "medio_examen", None), 80)
-                mc = _clamp_val(getattr(ev, "medio_continua", None), 20)
-                fe = _clamp_val(getattr(ev, "final_examen", None), 60)
-                fc = _clamp_val(getattr(ev, "final_continua", None), 20)
-                ft = _clamp_val(getattr(ev, "final_tarea", None), 20)
-
-                subtotal_medio = (me or 0) + (mc or 0)
-                subtotal_final = (fe or 0) + (fc or 0) + (ft or 0)
-                promedio_final = round((subtotal_medio + subtotal_final) / 2.0, 2)
-
-                eval_det_map[iid] = EvaluacionDetalle(
-                    medio_examen=me,
-                    medio_continua=mc,
-                    final_examen=fe,
-                    final_continua=fc,
-                    final_tarea=ft,
-                    subtotal_medio=subtotal_medio,
-                    subtotal_final=subtotal_final,
-                    promedio_final=promedio_final,
-                )
-    except Exception:
-        eval_det_map = {}
-
-    # --- Asistencia por inscripción (robusto: denominador = total de sesiones del ciclo) ---
-    asis_map: Dict[int, HistorialAsistenciaSummary] = {}
-    try:
-        if ins_ids:
-            AR = ma.AsistenciaRegistro
-            AS = ma.AsistenciaSesion
-
-            PESO_RETARDO = 0.5  # presente=1, justificado=1, retardo=0.5, ausente=0
-
-            # 1) mapa inscripcion_id -> ciclo_id
-            ins_to_ciclo: Dict[int, int] = {ins.id: c.id for (ins, c) in base_rows}
-
-            # 2) total de sesiones por ciclo (denominador consistente)
-            tot_rows = (
-                db.query(AS.ciclo_id, func.count(AS.id))
-                .filter(AS.ciclo_id.in_(ciclo_ids))
-                .group_by(AS.ciclo_id)
-                .all()
-            )
-            tot_por_ciclo: Dict[int, int] = {cid: int(cnt) for (cid, cnt) in tot_rows}
-
-            # 3) sumar presentes / retardos / justificados por inscripción
-            presentes = func.sum(case((AR.estado == "presente", 1), else_=0)).label("presentes")
-            retardos = func.sum(case((AR.estado == "retardo", 1), else_=0)).label("retardos")
-            justificados = func.sum(case((AR.estado == "justificado", 1), else_=0)).label("justificados")
-
-            sum_rows = (
-                db.query(
-                    AR.inscripcion_id,
-                    presentes,
-                    retardos,
-                    justificados,
-                )
-                .join(AS, AS.id == AR.sesion_id)
-                .filter(AR.inscripcion_id.in_(ins_ids))
-                .group_by(AR.inscripcion_id)
-                .all()
-            )
-
-            sums: Dict[int, Tuple[int, int, int]] = {
-                int(iid): (int(p or 0), int(r or 0), int(j or 0))
-                for (iid, p, r, j) in sum_rows
-            }
-
-            # 4) armar respuesta por inscripción usando el denominador del ciclo
-            for iid in ins_ids:
-                ciclo_id = ins_to_ciclo.get(iid)
-                total_ses = int(tot_por_ciclo.get(ciclo_id, 0))
-
-                p, r, j = sums.get(iid, (0, 0, 0))
-                a = max(total_ses - (p + r + j), 0)
-
-                ponderados = p + j + (PESO_RETARDO * r)
-                pct = round((ponderados * 100.0 / total_ses), 2) if total_ses else 0.0
-
-                asis_map[iid] = HistorialAsistenciaSummary(
-                    presentes=p,
-                    ausentes=a,
-                    retardos=r,
-                    justificados=j,
-                    total_sesiones=total_ses,
-                    porcentaje_asistencia=pct,
-                )
-    except Exception:
-        asis_map = {}
-
-    # --- Docente por ciclo (FK directa y fallback a tabla intermedia si existe) ---
-    docente_info_map: Dict[int, Tuple[Optional[int], Optional[str], Optional[str]]] = {}
-    try:
-        if hasattr(Ciclo, "docente_id"):
-            rows_doc = (
-                db.query(Ciclo.id, User.id, User.first_name, User.last_name, User.email)
-                .outerjoin(User, User.id == getattr(Ciclo, "docente_id"))
-                .filter(Ciclo.id.in_(ciclo_ids))
-                .all()
-            )
-            for cid, uid, fn, ln, em in rows_doc:
-                nom = f"{fn or ''} {ln or ''}".strip() or None
-                docente_info_map[cid] = (uid, nom, em)
-    except Exception:
-        pass
-
-    if not docente_info_map:
-        try:
-            from ..models import CicloDocente as _CicloDocente  # opcional
-            if hasattr(_CicloDocente, "docente_id"):
-                rows_doc2 = (
-                    db.query(_CicloDocente.ciclo_id, User.id, User.first_name, User.last_name, User.email, _CicloDocente.id)
-                    .join(User, User.id == _CicloDocente.docente_id)
-                    .filter(_CicloDocente.ciclo_id.in_(ciclo_ids))
-                    .order_by(_CicloDocente.ciclo_id.asc(), _CicloDocente.id.desc())
-                    .all()
-                )
-                for cid, uid, fn, ln, em, _cdid in rows_doc2:
-                    if cid in docente_info_map:
-                        continue
-                    nom = f"{fn or ''} {ln or ''}".strip() or None
-                    docente_info_map[cid] = (uid, nom, em)
-        except Exception:
-            pass
+    base_rows = historial_filas(db, q)
 
     # --- Construcción de respuesta ---
     items: List[HistorialCicloItem] = []
-    for ins, c in base_rows:
-        asistencia = asis_map.get(ins.id, HistorialAsistenciaSummary())
-        calificacion = eval_map.get(ins.id)
+    for row in base_rows:
+        ins, c, ev, res = row.Inscripcion, row.Ciclo, row.Evaluacion, row.InscripcionSummary
+
+        # denominador: sesiones del ciclo; retardo pondera 0.5 (ver historial.PESO_RETARDO)
+        total_ses = res.sesiones_ciclo
+        p, r, j = res.presentes, res.retardos, res.justificados
+        asistencia = HistorialAsistenciaSummary(
+            presentes=p,
+            ausentes=max(total_ses - (p + r + j), 0),
+            retardos=r,
+            justificados=j,
+            total_sesiones=total_ses,
+            porcentaje_asistencia=float(res.asistencia_pct_ponderada),
+        )
 
-        # detalle por bloques y fallback de calificacion si estaba vacía
-        ev_det = eval_det_map.get(ins.id)
-        if calificacion is None and ev_det:
-            calificacion = ev_det.promedio_final
+        ev_det = _evaluacion_detalle(ev, res) if ev is not None else None
+        calificacion = ev_det.promedio_final if ev_det else None
 
-        doc_id, doc_nom, doc_email = (None, None, None)
-        if c.id in docente_info_map:
-            doc_id, doc_nom, doc_email = docente_info_map[c.id]
+        doc_id = row.doc_id
+        doc_nom = (f"{row.doc_first_name or ''} {row.doc_last_name or ''}".strip() or None) if doc_id else None
+        doc_email = row.doc_email if doc_id else None
 
         items.append(
             HistorialCicloItem(
@@ -663,8 +553,10 @@ def historial_alumno(
     # Orden final por fecha_inicio desc (si hay), luego código desc
     items.sort(key=lambda it: (it.fecha_inicio or "", it.ciclo_codigo or ""), reverse=True)
 
-    return HistorialAlumnoResponse(
+    out = HistorialAlumnoResponse(
         alumno_id=alumno_id,
         total=len(items),
         items=items,
     )
+    historial_cache.put(cache_key, out, alumno_id, {row.Ciclo.id for row in base_rows})
+    return out
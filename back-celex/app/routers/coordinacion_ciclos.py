@@ -7,6 +7,10 @@ import os
 
 # Auth / DB
 from ..auth import get_db, require_coordinator_or_admin, get_current_user
+from ..pagination import TotalMode, listing_total, page_with_cursor, total_pages
+from ..historial import invalidar_historial
+from ..docente_snapshot import invalidar_overview
+from .. import lista_espera
 
 # Modelos
 from ..models import (
@@ -194,6 +198,8 @@ def list_ciclos(
     docente_id: Optional[int] = Query(None, description="Filtrar por docente asignado"),
     page: int = Query(1, ge=1),
     page_size: int = Query(10, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="next_cursor de la respuesta anterior (ignora page)"),
+    total_mode: TotalMode = Query("exact", alias="total", description="exact | estimate | none"),
 ):
     base = db.query(Ciclo).options(joinedload(Ciclo.docente))
 
@@ -213,16 +219,15 @@ def list_ciclos(
     if docente_id is not None:
         base = base.filter(Ciclo.docente_id == docente_id)
 
-    total = base.count()
-    pages = (total + page_size - 1) // page_size if total else 1
-    if page > pages and total > 0:
+    filtered = any(v is not None for v in (q, idioma, modalidad, turno, nivel, docente_id))
+    cache_key = ("ciclos", q, idioma, modalidad, turno, nivel, docente_id) if cursor else None
+    total = listing_total(db, base, total_mode, cache_key, table="ciclos", filtered=filtered)
+    pages = total_pages(total, page_size)
+    if pages is not None and page > pages and total > 0:
         page = pages
 
-    items = (
-        base.order_by(Ciclo.created_at.desc())
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
+    items, next_cursor = page_with_cursor(
+        base, [Ciclo.created_at, Ciclo.id], page_size, cursor, offset=(page - 1) * page_size,
     )
     return CicloListResponse(
         items=[_to_out(x) for x in items],
@@ -230,6 +235,7 @@ def list_ciclos(
         page=page,
         page_size=page_size,
         pages=pages,
+        next_cursor=next_cursor,
     )
 
 
@@ -297,6 +303,7 @@ def create_ciclo(payload: CicloCreate, db: Session = Depends(get_db)):
 
     db.add(m)
     db.commit()
+    invalidar_overview(docente_id=m.docente_id)  # nuevo grupo del docente
     db.refresh(m)
     return _to_out(m)
 
@@ -372,6 +379,10 @@ def update_ciclo(ciclo_id: int, payload: CicloUpdate, db: Session = Depends(get_
         m.notas = payload.notas.strip() or None
 
     db.commit()
+    invalidar_historial(ciclo_id=m.id)  # fechas, horario o docente del historial
+    invalidar_overview(docente_id=m.docente_id, ciclo_id=m.id)  # fechas o cambio de docente
+    if payload.cupo_total is not None:
+        lista_espera.despertar(ciclo_id=m.id)  # más cupo: admite a la lista de espera
     # eager load docente para salida consistente
     db.refresh(m)
     m = (
@@ -409,6 +420,7 @@ def delete_ciclo(ciclo_id: int, db: Session = Depends(get_db)):
     try:
         db.delete(m)
         db.commit()
+        invalidar_overview(ciclo_id=ciclo_id)
     except IntegrityError:
         db.rollback()
         raise HTTPException(
@@ -3,13 +3,17 @@ from __future__ import annotations
 
 from typing import List, Optional, Dict, Any, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from pydantic import BaseModel
-from sqlalchemy import func, literal, or_, case, cast, String
+from sqlalchemy import func, literal, or_, case, cast, Float, String
 from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..auth import get_current_user
+from ..pagination import page_with_cursor
+from ..search import comentario_match
+from ..ciclo_filtros import filtrar_ciclos
+from .. import ranking_docentes as ranking_mv
 from ..models import (
     User,
     UserRole,
@@ -131,12 +135,7 @@ class MontosOut(BaseModel):
 #     Helpers / Common
 # =========================
 def _flt_ciclos_q(db: Session, anio: Optional[int], idioma: Optional[str]):
-    q = db.query(Ciclo)
-    if anio:
-        q = q.filter(Ciclo.codigo.ilike(f"{anio}-%"))
-    if idioma:
-        q = q.filter(or_(Ciclo.idioma == idioma, Ciclo.idioma.ilike(str(idioma))))
-    return q
+    return filtrar_ciclos(db.query(Ciclo), anio, idioma)
 
 
 def _docente_nombre_expr():
@@ -146,7 +145,8 @@ def _docente_nombre_expr():
 
 
 def _promedio_pct_heuristica(sum_vals, count_vals):
-    return case((count_vals > 0, (sum_vals / count_vals) / 5.0 * 100.0), else_=literal(0.0))
+    # sum/count son bigint: sin el cast la división trunca (mismo cálculo que mv_docente_ranking)
+    return case((count_vals > 0, (cast(sum_vals, Float) / count_vals) / 5.0 * 100.0), else_=literal(0.0))
 
 
 # =========================
@@ -734,19 +734,8 @@ def preguntas_agg(
 # ======================================
 # 4) Ranking de docentes (top/bottom)
 # ======================================
-@router.get("/reportes/ranking-docentes", response_model=RankingOut)
-def ranking_docentes(
-    limitTop: int = Query(5, ge=1, le=50),
-    limitBottom: int = Query(5, ge=1, le=50),
-    anio: Optional[int] = Query(None),
-    idioma: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
-    current: User = Depends(require_coordinator_or_admin),
-):
-    """
-    Se mantiene GLOBAL (sin cicloId), tal como pediste.
-    Filtra por anio/idioma si se envían.
-    """
+def _ranking_en_vivo(db: Session, anio: Optional[int], idioma: Optional[str]) -> List[Tuple[int, str, float, int]]:
+    """[(docente_id, nombre, promedio_pct, grupos)] calculado sobre el histórico (respaldo sin la vista)."""
     ciclos_ids_q = _flt_ciclos_q(db, anio, idioma).with_entities(Ciclo.id).subquery()
 
     rows = (
@@ -791,6 +780,27 @@ def ranking_docentes(
                 int(grupos_map.get(int(r.doc_id), 0)),
             )
         )
+    return parsed
+
+
+@router.get("/reportes/ranking-docentes", response_model=RankingOut)
+def ranking_docentes(
+    limitTop: int = Query(5, ge=1, le=50),
+    limitBottom: int = Query(5, ge=1, le=50),
+    anio: Optional[int] = Query(None),
+    idioma: Optional[str] = Query(None),
+    db: Session = Depends(get_db),
+    current: User = Depends(require_coordinator_or_admin),
+):
+    """
+    Se mantiene GLOBAL (sin cicloId), tal como pediste.
+    Filtra por anio/idioma si se envían.
+    Lee de la vista materializada mv_docente_ranking (ver app/ranking_docentes.py);
+    si no existe, calcula en vivo.
+    """
+    parsed = ranking_mv.ranking(db, anio, idioma) if ranking_mv.disponible(db) else None
+    if parsed is None:
+        parsed = _ranking_en_vivo(db, anio, idioma)
     parsed.sort(key=lambda t: t[2], reverse=True)
     top = parsed[:limitTop]
     bottom = list(reversed(parsed[-limitBottom:])) if parsed else []
@@ -805,17 +815,21 @@ def ranking_docentes(
 # ======================================
 @router.get("/encuestas/comentarios", response_model=List[ComentarioOut])
 def comentarios_recientes(
+    response: Response,
     cicloId: Optional[int] = Query(None),
     anio: Optional[int] = Query(None),
     idioma: Optional[str] = Query(None),
     limit: int = Query(20, ge=1, le=200),
     q: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Valor del header X-Next-Cursor de la página anterior"),
     db: Session = Depends(get_db),
     current: User = Depends(require_coordinator_or_admin),
 ):
     """
     Ahora acepta cicloId para que el frontend pueda filtrar comentarios al seleccionar un ciclo.
     Por defecto agrega todos los ciclos (con anio/idioma).
+    `q` busca en el comentario (full-text, índice GIN), la pregunta y el código del ciclo.
+    La siguiente página se pide con ?cursor=<X-Next-Cursor>.
     """
     base = (
         db.query(
@@ -823,6 +837,7 @@ def comentarios_recientes(
             SurveyResponse.ciclo_id.label("ciclo_id"),
             SurveyAnswer.value_text.label("texto"),
             SurveyResponse.created_at.label("created_at"),
+            SurveyAnswer.created_at.label("answer_created_at"),
             SurveyQuestion.text.label("pregunta"),
             Ciclo.docente_id.label("docente_id"),
             Ciclo.codigo.label("ciclo"),
@@ -836,22 +851,25 @@ def comentarios_recientes(
     if cicloId is not None:
         base = base.filter(Ciclo.id == cicloId)
     else:
-        if anio:
-            base = base.filter(Ciclo.codigo.ilike(f"{anio}-%"))
-        if idioma:
-            base = base.filter(or_(Ciclo.idioma == idioma, Ciclo.idioma.ilike(str(idioma))))
+        base = filtrar_ciclos(base, anio, idioma)
 
     if q:
         like = f"%{q.strip().lower()}%"
-        base = base.filter(
-            or_(
-                func.lower(SurveyAnswer.value_text).like(like),
-                func.lower(SurveyQuestion.text).like(like),
-                func.lower(Ciclo.codigo).like(like),
-            )
-        )
-
-    rows = base.order_by(SurveyResponse.created_at.desc()).limit(limit).all()
+        conds = [
+            func.lower(SurveyQuestion.text).like(like),
+            func.lower(Ciclo.codigo).like(like),
+        ]
+        texto_match = comentario_match(q)
+        # Sin palabras (p. ej. '¿?') no hay tsquery: el comentario se busca con LIKE como antes
+        conds.append(texto_match if texto_match is not None else func.lower(SurveyAnswer.value_text).like(like))
+        base = base.filter(or_(*conds))
+
+    rows, next_cursor = page_with_cursor(
+        base, [SurveyAnswer.created_at, SurveyAnswer.id], limit, cursor,
+        key=lambda r: [r.answer_created_at, r.id],
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     doc_ids = [int(r.docente_id) for r in rows if r.docente_id is not None]
     nombres = {}
     if doc_ids:
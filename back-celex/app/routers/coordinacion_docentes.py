@@ -2,11 +2,11 @@
 from typing import Optional, List, Literal, Union
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Path
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
 from pydantic import BaseModel, EmailStr, Field, field_validator
 
 from ..auth import get_db, require_coordinator_or_admin, get_password_hash
 from ..models import User, UserRole
+from ..search import filtro_personas
 from ..email_utils import send_email
 
 import secrets, string
@@ -72,18 +72,11 @@ def list_docentes(
 ):
     base = db.query(User).filter(User.role == UserRole.teacher)
 
-    if q:
-        like = f"%{q.strip()}%"
-        base = base.filter(
-            or_(
-                User.first_name.ilike(like),
-                User.last_name.ilike(like),
-                User.email.ilike(like),
-                User.curp.ilike(like),
-            )
-        )
+    cond, rank = filtro_personas(db, q)
+    if cond is not None:
+        base = base.filter(cond)
 
-    base = base.order_by(User.created_at.desc())
+    base = base.order_by(*([rank.desc()] if rank is not None else []), User.created_at.desc())
 
     if not page or not page_size:
         users = base.all()
@@ -1,14 +1,21 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session, joinedload
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import BaseModel
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session, joinedload, noload
+from datetime import datetime, timedelta
 import os
 
-from fastapi.responses import FileResponse
 
 from .. import models, schemas
 from ..database import get_db
 from ..auth import get_current_user
+from ..pagination import TotalMode, listing_total, page_with_cursor
+from ..historial import invalidar_historial
+from ..docente_snapshot import invalidar_overview
+from ..file_serving import servir_archivo
+from .. import lista_espera, upload_variants
 from ..config import settings  # 👈 para resolver rutas relativas con UPLOAD_DIR / MEDIA_ROOT
 
 router = APIRouter(
@@ -99,10 +106,13 @@ def _to_inscripcion_out(r: models.Inscripcion) -> schemas.InscripcionOut:
 # --------------------------
 @router.get("", response_model=List[schemas.InscripcionOut])
 def list_inscripciones(
+    response: Response,
     status: Optional[str] = Query(None, description="Filtrar por status"),
     ciclo_id: Optional[int] = Query(None, description="Filtrar por ciclo"),
     skip: int = Query(0, ge=0),
     limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = Query(None, description="Valor del header X-Next-Cursor de la página anterior (ignora skip)"),
+    total_mode: TotalMode = Query("none", alias="total", description="none | exact | estimate (header X-Total-Count)"),
     db: Session = Depends(get_db),
     _: models.User = Depends(require_coordinator),
 ):
@@ -112,16 +122,154 @@ def list_inscripciones(
             joinedload(models.Inscripcion.alumno),
             joinedload(models.Inscripcion.ciclo).joinedload(models.Ciclo.docente),
         )
-        .order_by(models.Inscripcion.created_at.desc())
     )
     if status:
         q = q.filter(models.Inscripcion.status == status)
     if ciclo_id:
         q = q.filter(models.Inscripcion.ciclo_id == ciclo_id)
 
-    rows = q.offset(skip).limit(limit).all()
+    rows, next_cursor = page_with_cursor(
+        q, [models.Inscripcion.created_at, models.Inscripcion.id], limit, cursor, offset=skip,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    total = listing_total(
+        db, q.options(noload("*")), total_mode, ("inscripciones", status, ciclo_id),
+        table="inscripciones", filtered=bool(status or ciclo_id),
+    )
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
     return [_to_inscripcion_out(r) for r in rows]
 
+# --------------------------
+# Cola de revisión (coordinación)
+# --------------------------
+REVISION_CLAIM_MINUTES = int(os.getenv("REVISION_CLAIM_MINUTES", "10"))
+
+# (tipo del endpoint /archivo, columna con la ruta)
+_ARCHIVOS_REVISION = (
+    ("comprobante", "comprobante_path"),
+    ("estudios", "comprobante_estudios_path"),
+    ("exencion", "comprobante_exencion_path"),
+)
+
+
+class ArchivoRevisionOut(BaseModel):
+    tipo: str
+    original: str
+    preview: str
+    thumb: str
+
+
+class RevisionItemOut(BaseModel):
+    inscripcion: schemas.InscripcionOut
+    claim_hasta: datetime
+    archivos: List[ArchivoRevisionOut] = []
+
+
+def _archivos_revision(r: models.Inscripcion) -> List[ArchivoRevisionOut]:
+    out = []
+    for tipo, attr in _ARCHIVOS_REVISION:
+        if getattr(r, attr, None):
+            url = f"{router.prefix}/{r.id}/archivo?tipo={tipo}"
+            out.append(ArchivoRevisionOut(
+                tipo=tipo, original=url, preview=f"{url}&variant=preview", thumb=f"{url}&variant=thumb",
+            ))
+    return out
+
+
+def _pendientes_query(db: Session, coordinador_id: int, status: str, ciclo_id: Optional[int]):
+    """Pendientes de validar que no tiene apartadas (vigentes) otro coordinador."""
+    I, C = models.Inscripcion, models.RevisionClaim
+    ajena = (
+        db.query(C.inscripcion_id)
+        .filter(C.inscripcion_id == I.id, C.hasta > func.now(), C.coordinador_id != coordinador_id)
+        .exists()
+    )
+    q = db.query(I).filter(I.validated_at.is_(None), I.status == status, ~ajena)
+    if ciclo_id:
+        q = q.filter(I.ciclo_id == ciclo_id)
+    return q.order_by(I.created_at.asc(), I.id.asc())
+
+
+@router.post("/cola-revision", response_model=List[RevisionItemOut])
+def cola_revision(
+    ciclo_id: Optional[int] = Query(None, description="Filtrar por ciclo"),
+    status: str = Query("preinscrita", description="Status a revisar"),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+    user: models.User = Depends(require_coordinator),
+):
+    """
+    Aparta por REVISION_CLAIM_MINUTES y devuelve las siguientes `limit` inscripciones
+    pendientes (orden de llegada) con las URLs de sus archivos, saltando las que otro
+    coordinador tiene apartadas. Volver a llamar renueva los apartados propios.
+    El apartado es suave: validar no lo exige, sólo lo libera.
+    Además se encolan las variantes (preview/thumb) de este lote y del siguiente.
+    """
+    I, C = models.Inscripcion, models.RevisionClaim
+    rows = (
+        _pendientes_query(db, user.id, status, ciclo_id)
+        .options(
+            joinedload(I.alumno),
+            joinedload(I.ciclo).joinedload(models.Ciclo.docente),
+        )
+        .limit(limit)
+        # Dos coordinadores pidiendo a la vez se reparten filas distintas
+        .with_for_update(of=I, skip_locked=True)
+        .all()
+    )
+    if not rows:
+        db.rollback()
+        return []
+
+    ids = [r.id for r in rows]
+    hasta = func.now() + timedelta(minutes=REVISION_CLAIM_MINUTES)
+    stmt = pg_insert(C).values([{"inscripcion_id": i, "coordinador_id": user.id, "hasta": hasta} for i in ids])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[C.inscripcion_id],
+        set_={"coordinador_id": stmt.excluded.coordinador_id, "hasta": stmt.excluded.hasta},
+    ).returning(C.inscripcion_id, C.hasta)
+    claims = dict(db.execute(stmt).all())
+
+    out = [
+        RevisionItemOut(
+            inscripcion=_to_inscripcion_out(r),
+            claim_hasta=claims[r.id],
+            archivos=_archivos_revision(r),
+        )
+        for r in rows
+    ]
+    rutas = [getattr(r, attr, None) for r in rows for _, attr in _ARCHIVOS_REVISION]
+    db.commit()
+
+    # Siguiente lote (sin apartar): que sus archivos ya estén listos cuando llegue el revisor
+    siguientes = (
+        _pendientes_query(db, user.id, status, ciclo_id)
+        .filter(~I.id.in_(ids))
+        .with_entities(*[getattr(I, attr) for _, attr in _ARCHIVOS_REVISION])
+        .limit(limit)
+        .all()
+    )
+    for ruta in rutas + [p for fila in siguientes for p in fila]:
+        upload_variants.encolar(ruta)
+    return out
+
+
+@router.delete("/cola-revision", status_code=204)
+def soltar_revision(
+    inscripcion_id: Optional[int] = Query(None, description="Sólo esta; si se omite, todas las mías"),
+    db: Session = Depends(get_db),
+    user: models.User = Depends(require_coordinator),
+):
+    q = db.query(models.RevisionClaim).filter(models.RevisionClaim.coordinador_id == user.id)
+    if inscripcion_id:
+        q = q.filter(models.RevisionClaim.inscripcion_id == inscripcion_id)
+    q.delete(synchronize_session=False)
+    db.commit()
+    return Response(status_code=204)
+
+
 # --------------------------
 # Validar inscripción
 # --------------------------
@@ -186,7 +334,15 @@ def validate_inscripcion(
     if hasattr(insc, "validated_at"):
         insc.validated_at = datetime.utcnow()
 
+    # Ya revisada: sale de la cola de quien la tuviera apartada
+    db.query(models.RevisionClaim).filter(models.RevisionClaim.inscripcion_id == insc.id).delete(
+        synchronize_session=False
+    )
     db.commit()
+    invalidar_historial(alumno_id=insc.alumno_id)
+    invalidar_overview(ciclo_id=insc.ciclo_id)
+    if payload.action == "REJECT":
+        lista_espera.despertar(ciclo_id=insc.ciclo_id)
     db.refresh(insc)
     return _to_inscripcion_out(insc)
 
@@ -196,7 +352,9 @@ def validate_inscripcion(
 @router.get("/{inscripcion_id}/archivo")
 def download_comprobante_coord(
     inscripcion_id: int,
+    request: Request,
     tipo: str = Query(..., pattern="^(comprobante|estudios|exencion)$"),
+    variant: str = Query("original", pattern=upload_variants.VARIANTE_PATTERN),
     db: Session = Depends(get_db),
     _: models.User = Depends(require_coordinator),
 ):
@@ -233,12 +391,9 @@ def download_comprobante_coord(
         else:
             raise HTTPException(status_code=404, detail=f"Archivo no disponible: {file_path}")
 
-    if not mime:
-        guessed, _ = mimetypes.guess_type(file_path)
-        mime = guessed or "application/octet-stream"
-
-    filename = os.path.basename(file_path)
-    return FileResponse(file_path, media_type=mime, filename=filename)
+    # thumb/preview si ya están generadas; si no, el original (y se encolan)
+    file_path, mime, filename = upload_variants.resolver(file_path, variant, mime)
+    return servir_archivo(request, file_path, media_type=mime, filename=filename)
 
 
 
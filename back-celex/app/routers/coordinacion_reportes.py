@@ -1,12 +1,16 @@
 # app/routers/coordinacion_reportes.py
 # app/routers/coordinacion_reportes.py
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Literal
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session, aliased
 from sqlalchemy import or_, func, literal, extract
 
-from ..database import get_db
+from ..database import get_db, SessionLocal
 from ..auth import require_coordinator_or_admin
+from ..export_utils import tabular_response
+from ..pagination import count_cache, page_with_cursor
+from ..search import comentario_match
+from ..ciclo_filtros import filtrar_ciclos, filtro_anio
 # 👇 Asegura estos imports (incluye PlacementExam y PlacementRegistro)
 from ..models import Ciclo, Inscripcion, User, PlacementExam, PlacementRegistro
 router = APIRouter(prefix="/coordinacion", tags=["Coordinación - Reportes"])
@@ -72,28 +76,16 @@ def listar_ciclos(
     idioma: Optional[str] = Query(None, description="ingles|frances|aleman|..."),
     db: Session = Depends(get_db),
 ):
-    q = db.query(Ciclo)
-    if idioma:
-        # Ciclo.idioma puede ser Enum o string; comparamos por su representación
-        q = q.filter(or_(Ciclo.idioma == idioma, Ciclo.idioma.ilike(idioma)))
-    if anio:
-        # Tus códigos suelen empezar con 'YYYY-...'
-        like = f"{anio}-%"
-        q = q.filter(Ciclo.codigo.ilike(like))
+    q = filtrar_ciclos(db.query(Ciclo), anio, idioma)
 
     q = q.order_by(Ciclo.codigo.desc()).limit(200)
     ciclos = q.all()
 
     out: List[CicloLite] = []
     for c in ciclos:
-        # Intenta extraer año del prefijo del código
-        year = None
-        try:
-            pref = str(getattr(c, "codigo", "")).split("-", 1)[0]
-            year = int(pref)
-        except Exception:
-            pass
-        out.append(CicloLite(id=c.id, codigo=c.codigo, idioma=str(getattr(c, "idioma", None) or ""), anio=year))
+        out.append(CicloLite(
+            id=c.id, codigo=c.codigo, idioma=str(getattr(c, "idioma", None) or ""), anio=getattr(c, "anio", None)
+        ))
     return out
 
 
@@ -113,16 +105,11 @@ def listar_grupos(
 # Reporte: Alumnos Inscritos
 # ==============================
 
-@router.get("/reportes/inscritos", response_model=ReporteInscritos, dependencies=[Depends(require_coordinator_or_admin)])
-def reporte_inscritos(
-    cicloId: int = Query(...),
-    grupoId: Optional[str] = Query(None),  # reservado para futuro
-    db: Session = Depends(get_db),
-):
-    ciclo = db.query(Ciclo).filter(Ciclo.id == cicloId).first()
-    if not ciclo:
-        raise HTTPException(status_code=404, detail="Ciclo no encontrado")
-
+def _inscritos_query(db: Session, ciclo_id: Optional[int] = None, anio: Optional[int] = None):
+    """
+    Inscripcion ⨝ User (⨝ Ciclo) ordenado por "Apellidos, Nombres".
+    Sin ciclo_id: todos los ciclos (opcionalmente de un año), agrupados por código de ciclo.
+    """
     # Columnas calculadas para mostrar y ordenar: "Apellidos, Nombres"
     apellidos = func.coalesce(func.trim(User.last_name), "")
     nombres = func.coalesce(func.trim(User.first_name), "")
@@ -132,9 +119,9 @@ def reporte_inscritos(
     apellidos_ord = func.lower(apellidos)
     nombres_ord  = func.lower(nombres)
 
-    # Join Inscripcion + User
-    inscs = (
+    q = (
         db.query(
+            Ciclo.codigo.label("ciclo_codigo"),
             Inscripcion.id.label("inscripcion_id"),
             User.boleta.label("boleta"),
             alumno_fmt,  # <- "Apellidos, Nombres"
@@ -143,10 +130,62 @@ def reporte_inscritos(
             Inscripcion.status.label("estado"),
         )
         .join(User, User.id == Inscripcion.alumno_id)
-        .filter(Inscripcion.ciclo_id == cicloId)
-        .order_by(apellidos_ord.asc(), nombres_ord.asc(), Inscripcion.id.asc())
-        .all()
+        .join(Ciclo, Ciclo.id == Inscripcion.ciclo_id)
     )
+    if ciclo_id is not None:
+        q = q.filter(Inscripcion.ciclo_id == ciclo_id)
+    elif anio:
+        q = q.filter(filtro_anio(anio))
+    return q.order_by(Ciclo.codigo.asc(), apellidos_ord.asc(), nombres_ord.asc(), Inscripcion.id.asc())
+
+
+def _en_sesion(filas, *args):
+    """
+    Consume un generador de filas `filas(db, *args)` en su propia sesión:
+    el StreamingResponse sigue leyendo después de que la sesión del request se cerró.
+    """
+    db = SessionLocal()
+    try:
+        yield from filas(db, *args)
+    finally:
+        db.close()
+
+
+INSCRITOS_HEADER = ["ciclo", "inscripcion_id", "boleta", "alumno", "email", "fecha_inscripcion", "estado"]
+
+
+def _inscritos_filas(db: Session, ciclo_id: Optional[int] = None, anio: Optional[int] = None):
+    """Filas de exportación leídas con cursor del lado del servidor (yield_per)."""
+    for r in _inscritos_query(db, ciclo_id, anio).yield_per(1000):
+        yield (r.ciclo_codigo, r.inscripcion_id, r.boleta, r.nombre or "", r.email, r.fecha_inscripcion, r.estado)
+
+
+def _exportar_inscritos(formato: str, ciclo_id: Optional[int], anio: Optional[int]):
+    rows = _en_sesion(_inscritos_filas, ciclo_id, anio)
+    nombre = f"inscritos_{ciclo_id}" if ciclo_id is not None else f"inscritos_{anio or 'todos'}"
+    return tabular_response(formato, nombre, INSCRITOS_HEADER, rows, sheet_title="Inscritos")
+
+
+@router.get("/reportes/inscritos", response_model=ReporteInscritos, dependencies=[Depends(require_coordinator_or_admin)])
+def reporte_inscritos(
+    cicloId: Optional[int] = Query(None, description="Requerido en JSON; en csv/xlsx, si se omite exporta todos los ciclos"),
+    grupoId: Optional[str] = Query(None),  # reservado para futuro
+    formato: Literal["json", "csv", "xlsx"] = Query("json", alias="format"),
+    anio: Optional[int] = Query(None, description="Sólo exportación de todos los ciclos: filtra por año"),
+    db: Session = Depends(get_db),
+):
+    if cicloId is None and formato == "json":
+        raise HTTPException(status_code=422, detail="cicloId es requerido")
+
+    if cicloId is not None:
+        ciclo = db.query(Ciclo).filter(Ciclo.id == cicloId).first()
+        if not ciclo:
+            raise HTTPException(status_code=404, detail="Ciclo no encontrado")
+
+    if formato != "json":
+        return _exportar_inscritos(formato, cicloId, anio)
+
+    inscs = _inscritos_query(db, cicloId).all()
 
     alumnos: List[AlumnoInscrito] = []
     for r in inscs:
@@ -181,16 +220,7 @@ def reporte_inscritos(
 # Reporte: Pagos (por ciclo)
 # ==============================
 
-@router.get("/reportes/pagos", response_model=ReportePagos, dependencies=[Depends(require_coordinator_or_admin)])
-def reporte_pagos(
-    cicloId: int = Query(...),
-    grupoId: Optional[str] = Query(None),
-    db: Session = Depends(get_db),
-):
-    ciclo = db.query(Ciclo).filter(Ciclo.id == cicloId).first()
-    if not ciclo:
-        raise HTTPException(status_code=404, detail="Ciclo no encontrado")
-
+def _pagos_query(db: Session, ciclo_id: Optional[int] = None, anio: Optional[int] = None):
     apellidos = func.coalesce(func.trim(User.last_name), "")
     nombres   = func.coalesce(func.trim(User.first_name), "")
     alumno_fmt = func.concat(apellidos, literal(", "), nombres).label("alumno")
@@ -198,8 +228,9 @@ def reporte_pagos(
     apellidos_ord = func.lower(apellidos)
     nombres_ord   = func.lower(nombres)
 
-    rows = (
+    q = (
         db.query(
+            Ciclo.codigo.label("ciclo_codigo"),
             Inscripcion.id.label("inscripcion_id"),
             alumno_fmt,
             User.email.label("email"),
@@ -212,29 +243,79 @@ def reporte_pagos(
             Inscripcion.rechazo_motivo.label("rechazo_motivo"),
         )
         .join(User, User.id == Inscripcion.alumno_id)
-        .filter(Inscripcion.ciclo_id == cicloId)
-        .order_by(apellidos_ord.asc(), nombres_ord.asc(), Inscripcion.id.asc())
-        .all()
+        .join(Ciclo, Ciclo.id == Inscripcion.ciclo_id)
     )
+    if ciclo_id is not None:
+        q = q.filter(Inscripcion.ciclo_id == ciclo_id)
+    elif anio:
+        q = q.filter(filtro_anio(anio))
+    return q.order_by(Ciclo.codigo.asc(), apellidos_ord.asc(), nombres_ord.asc(), Inscripcion.id.asc())
+
+
+def _coerce_tipo(v) -> str:
+    val = getattr(v, "value", v)
+    if val is None:
+        val = "pago"
+    return str(val).lower().strip()
+
+
+def _pago_status(r) -> str:
+    if r.validated_by_id:
+        return "validado"
+    if r.rechazo_motivo:
+        return "rechazado"
+    return "pendiente"
 
-    def coerce_tipo(v) -> str:
-        val = getattr(v, "value", v)
-        if val is None:
-            val = "pago"
-        return str(val).lower().strip()
+
+PAGOS_HEADER = [
+    "ciclo", "inscripcion_id", "alumno", "email", "referencia", "tipo", "status",
+    "importe_centavos", "importe_mxn", "fecha_pago", "validated_at",
+]
+
+
+def _pagos_filas(db: Session, ciclo_id: Optional[int] = None, anio: Optional[int] = None):
+    for r in _pagos_query(db, ciclo_id, anio).yield_per(1000):
+        importe = int(r.importe_centavos or 0)
+        yield (
+            r.ciclo_codigo, r.inscripcion_id, r.alumno or "", r.email, r.referencia,
+            _coerce_tipo(r.tipo), _pago_status(r), importe, round(importe / 100.0, 2),
+            r.fecha_pago, r.validated_at,
+        )
+
+
+def _exportar_pagos(formato: str, ciclo_id: Optional[int], anio: Optional[int]):
+    rows = _en_sesion(_pagos_filas, ciclo_id, anio)
+    nombre = f"pagos_{ciclo_id}" if ciclo_id is not None else f"pagos_{anio or 'todos'}"
+    return tabular_response(formato, nombre, PAGOS_HEADER, rows, sheet_title="Pagos")
+
+
+@router.get("/reportes/pagos", response_model=ReportePagos, dependencies=[Depends(require_coordinator_or_admin)])
+def reporte_pagos(
+    cicloId: Optional[int] = Query(None, description="Requerido en JSON; en csv/xlsx, si se omite exporta todos los ciclos"),
+    grupoId: Optional[str] = Query(None),
+    formato: Literal["json", "csv", "xlsx"] = Query("json", alias="format"),
+    anio: Optional[int] = Query(None, description="Sólo exportación de todos los ciclos: filtra por año"),
+    db: Session = Depends(get_db),
+):
+    if cicloId is None and formato == "json":
+        raise HTTPException(status_code=422, detail="cicloId es requerido")
+
+    if cicloId is not None:
+        ciclo = db.query(Ciclo).filter(Ciclo.id == cicloId).first()
+        if not ciclo:
+            raise HTTPException(status_code=404, detail="Ciclo no encontrado")
+
+    if formato != "json":
+        return _exportar_pagos(formato, cicloId, anio)
+
+    rows = _pagos_query(db, cicloId).all()
 
     out_rows: List[PagoRow] = []
     total_validado = 0
 
     for r in rows:
-        if r.validated_by_id:
-            status = "validado"
-        elif r.rechazo_motivo:
-            status = "rechazado"
-        else:
-            status = "pendiente"
-
-        tipo = coerce_tipo(r.tipo)
+        status = _pago_status(r)
+        tipo = _coerce_tipo(r.tipo)
         importe = int(r.importe_centavos or 0)
 
         if status == "validado" and tipo == "pago":
@@ -580,6 +661,49 @@ def reporte_encuesta(
     )
 
 
+# Respuestas individuales de encuesta (exportación masiva, ver report_jobs)
+ENCUESTA_RESPUESTAS_HEADER = [
+    "ciclo", "idioma", "docente_id", "response_id", "fecha", "categoria", "pregunta", "tipo",
+    "valor_int", "valor_bool", "valor_texto",
+]
+
+
+def _encuesta_respuestas_query(db: Session, ciclo_id: Optional[int] = None, anio: Optional[int] = None):
+    from ..models import SurveyQuestion, SurveyResponse, SurveyAnswer, SurveyCategory
+
+    q = (
+        db.query(
+            Ciclo.codigo.label("ciclo_codigo"),
+            Ciclo.idioma.label("idioma"),
+            Ciclo.docente_id.label("docente_id"),
+            SurveyResponse.id.label("response_id"),
+            SurveyResponse.created_at.label("fecha"),
+            SurveyCategory.name.label("categoria"),
+            SurveyQuestion.text.label("pregunta"),
+            SurveyQuestion.type.label("tipo"),
+            SurveyAnswer.value_int,
+            SurveyAnswer.value_bool,
+            SurveyAnswer.value_text,
+        )
+        .join(SurveyResponse, SurveyResponse.id == SurveyAnswer.response_id)
+        .join(SurveyQuestion, SurveyQuestion.id == SurveyAnswer.question_id)
+        .outerjoin(SurveyCategory, SurveyCategory.id == SurveyQuestion.category_id)
+        .join(Ciclo, Ciclo.id == SurveyResponse.ciclo_id)
+    )
+    if ciclo_id is not None:
+        q = q.filter(SurveyResponse.ciclo_id == ciclo_id)
+    elif anio:
+        q = q.filter(filtro_anio(anio))
+    return q.order_by(Ciclo.codigo.asc(), SurveyResponse.id.asc(), SurveyQuestion.order.asc(), SurveyAnswer.id.asc())
+
+
+def _encuesta_respuestas_filas(db: Session, ciclo_id: Optional[int] = None, anio: Optional[int] = None):
+    for r in _encuesta_respuestas_query(db, ciclo_id, anio).yield_per(1000):
+        yield (
+            r.ciclo_codigo, r.idioma, r.docente_id, r.response_id, r.fecha, r.categoria, r.pregunta, r.tipo,
+            r.value_int, r.value_bool, r.value_text,
+        )
+
 
 # ==============================
 # Desempeño Docente (serie por ciclos)
@@ -917,6 +1041,7 @@ class ComentariosEncuestaResponse(BaseModel):
     ciclo: Dict[str, Any]
     total: int
     items: List[EncuestaComentarioItem]
+    next_cursor: Optional[str] = None  # pasar como ?cursor= para la siguiente página
 
 
 @router.get(
@@ -930,7 +1055,8 @@ def reporte_encuesta_comentarios(
     includeGeneral: bool = Query(False, description="Intentar incluir comentarios 'legacy' si la columna existe"),
     onlyCommentLike: bool = Query(True, description="Limitar a preguntas open_text típicas de comentarios/sugerencias"),
     limit: int = Query(100, ge=1, le=1000),
-    offset: int = Query(0, ge=0),
+    offset: int = Query(0, ge=0, description="Legado; preferir cursor"),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
     db: Session = Depends(get_db),
 ):
     """
@@ -941,6 +1067,9 @@ def reporte_encuesta_comentarios(
       - Opcionalmente intenta incluir comentarios 'legacy' (SurveyResponse.comments)
         SOLO si la columna existe en el modelo/tabla.
       - Formato 100% compatible con el front: { id, pregunta_id, pregunta_texto, texto, created_at, alumno{...} }
+      - `q` busca en el comentario con full-text (índice GIN en español, por prefijo)
+        y con ILIKE en pregunta/alumno/email.
+      - Paginación por cursor (created_at, id); `total` sale de un conteo cacheado.
     """
     from ..models import SurveyResponse, SurveyAnswer, SurveyQuestion, User
 
@@ -970,8 +1099,11 @@ def reporte_encuesta_comentarios(
             )
         )
 
+    # `origen` distingue las dos fuentes del UNION: los ids de SurveyAnswer y de SurveyResponse
+    # salen de secuencias distintas y pueden repetirse, así que va en la llave del cursor antes del id
     open_q = (
         db.query(
+            literal(0).label("origen"),
             SurveyAnswer.id.label("id"),
             SurveyQuestion.id.label("pregunta_id"),
             SurveyQuestion.text.label("pregunta_texto"),
@@ -989,6 +1121,24 @@ def reporte_encuesta_comentarios(
         .filter(*open_filters)
     )
 
+    # ----------- Búsqueda libre (q) -----------
+    like = f"%{q.strip()}%" if q else None
+    nombre_fmt = func.concat(
+        func.coalesce(func.trim(User.last_name), ""),
+        literal(", "),
+        func.coalesce(func.trim(User.first_name), ""),
+    )
+    if q:
+        conds = [
+            SurveyQuestion.text.ilike(like),
+            nombre_fmt.ilike(like),
+            func.coalesce(User.email, literal("")).ilike(like),
+        ]
+        texto_match = comentario_match(q)
+        if texto_match is not None:
+            conds.append(texto_match)
+        open_q = open_q.filter(or_(*conds))
+
     # ----------- Opcional: comentarios "legacy" SOLO si la columna existe -----------
     has_general_col = (
         includeGeneral
@@ -999,6 +1149,7 @@ def reporte_encuesta_comentarios(
     if has_general_col:
         general_q = (
             db.query(
+                literal(1).label("origen"),
                 SurveyResponse.id.label("id"),
                 literal(None).label("pregunta_id"),
                 literal(None).label("pregunta_texto"),
@@ -1016,40 +1167,38 @@ def reporte_encuesta_comentarios(
                 func.length(func.btrim(SurveyResponse.comments)) > 0,
             )
         )
+        if q:
+            general_q = general_q.filter(
+                or_(
+                    SurveyResponse.comments.ilike(like),
+                    nombre_fmt.ilike(like),
+                    func.coalesce(User.email, literal("")).ilike(like),
+                )
+            )
         combined = open_q.union_all(general_q)
     else:
         combined = open_q
 
     sub = combined.subquery()
-
-    # ----------- Búsqueda libre (q) -----------
     qry = db.query(sub)
-    if q:
-        like = f"%{q.strip()}%"
-        nombre_fmt = func.concat(
-            func.coalesce(func.trim(sub.c.last_name), ""),
-            literal(", "),
-            func.coalesce(func.trim(sub.c.first_name), ""),
-        )
-        qry = qry.filter(
-            or_(
-                sub.c.texto.ilike(like),
-                func.coalesce(sub.c.pregunta_texto, literal("")).ilike(like),
-                nombre_fmt.ilike(like),
-                func.coalesce(sub.c.email, literal("")).ilike(like),
-            )
-        )
-
-    # ----------- Total, orden y paginación -----------
-    total = db.query(func.count()).select_from(qry.subquery()).scalar() or 0
 
-    rows = (
-        qry.order_by(sub.c.created_at.desc().nullslast(), sub.c.id.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
+    # ----------- Total (cacheado), orden y paginación -----------
+    total = count_cache.get_or_compute(
+        ("coord_encuesta_comentarios", cicloId, q, includeGeneral, onlyCommentLike),
+        lambda: db.query(func.count()).select_from(sub).scalar(),
     )
 
+    if offset and not cursor:
+        rows = (
+            qry.order_by(sub.c.created_at.desc().nullslast(), sub.c.origen.desc(), sub.c.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        next_cursor = None
+    else:
+        rows, next_cursor = page_with_cursor(qry, [sub.c.created_at, sub.c.origen, sub.c.id], limit, cursor)
+
     # ----------- Construcción de ítems (shape del front) -----------
     items: List[EncuestaComentarioItem] = []
     for r in rows:
@@ -1082,6 +1231,7 @@ def reporte_encuesta_comentarios(
         ciclo={"id": ciclo.id, "codigo": getattr(ciclo, "codigo", "")},
         total=int(total),
         items=items,
+        next_cursor=next_cursor,
     )
 
 
@@ -0,0 +1,192 @@
+# app/routers/coordinacion_reportes_jobs.py
+import os
+from datetime import datetime
+from typing import List, Optional, Literal
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from pydantic import BaseModel, ConfigDict, Field
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from ..database import get_db
+from ..auth import require_coordinator_or_admin
+from ..models import User, UserRole, ReportJob, ReportJobStatus
+from .. import report_jobs
+from ..file_serving import servir_archivo
+
+router = APIRouter(prefix="/coordinacion/reportes/jobs", tags=["Coordinación - Reportes en segundo plano"])
+
+
+# ------------------------------
+# Schemas
+# ------------------------------
+class ReportJobIn(BaseModel):
+    tipo: Literal["inscritos", "pagos", "encuesta_respuestas", "encuesta_preguntas"]
+    formato: Literal["csv", "xlsx"] = "csv"
+    ciclo_id: Optional[int] = None
+    anio: Optional[int] = Field(None, ge=2000, le=2100)
+    idioma: Optional[str] = None
+
+
+class ReportJobOut(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    tipo: str
+    formato: str
+    params: dict
+    status: ReportJobStatus
+    progress: int
+    rows_done: int
+    rows_total: Optional[int] = None
+    cancel_requested: bool
+    error: Optional[str] = None
+    artifact_size: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+
+# ------------------------------
+# Helpers
+# ------------------------------
+def _get_job(db: Session, job_id: int, user: User) -> ReportJob:
+    job = db.query(ReportJob).filter(ReportJob.id == job_id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+    if user.role != UserRole.superuser and job.owner_id != user.id:
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+    return job
+
+
+# ------------------------------
+# Endpoints
+# ------------------------------
+@router.post("", response_model=ReportJobOut, status_code=202)
+def crear_report_job(
+    payload: ReportJobIn,
+    db: Session = Depends(get_db),
+    current: User = Depends(require_coordinator_or_admin),
+):
+    # Jobs cuyo worker murió no deben contar contra el límite
+    if report_jobs.marcar_huerfanos(db, owner_id=current.id):
+        db.commit()
+    activos = (
+        db.query(ReportJob)
+        .filter(ReportJob.owner_id == current.id, ReportJob.status.in_(report_jobs.ACTIVE_STATES))
+        .count()
+    )
+    if activos >= report_jobs.REPORT_JOBS_MAX_ACTIVE_PER_USER:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Ya tienes {activos} reportes en proceso; espera a que terminen o cancela alguno",
+        )
+
+    params = payload.model_dump(include={"ciclo_id", "anio", "idioma"}, exclude_none=True)
+    job = ReportJob(
+        owner_id=current.id,
+        tipo=payload.tipo,
+        formato=payload.formato,
+        params=params,
+        status=ReportJobStatus.QUEUED,
+        progress=0,
+        rows_done=0,
+        cancel_requested=False,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    report_jobs.enqueue(job.id)
+    return job
+
+
+@router.get("", response_model=List[ReportJobOut])
+def listar_report_jobs(
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current: User = Depends(require_coordinator_or_admin),
+):
+    return (
+        db.query(ReportJob)
+        .filter(ReportJob.owner_id == current.id)
+        .order_by(ReportJob.id.desc())
+        .limit(limit)
+        .all()
+    )
+
+
+@router.get("/{job_id}", response_model=ReportJobOut)
+def estado_report_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current: User = Depends(require_coordinator_or_admin),
+):
+    return _get_job(db, job_id, current)
+
+
+@router.post("/{job_id}/cancel", response_model=ReportJobOut)
+def cancelar_report_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current: User = Depends(require_coordinator_or_admin),
+):
+    job = _get_job(db, job_id, current)
+    if job.status not in report_jobs.ACTIVE_STATES:
+        raise HTTPException(status_code=409, detail="El reporte ya terminó")
+
+    # En cola, o en ejecución con el worker muerto (sin latido): se cancela aquí mismo.
+    # En ejecución: el worker ve la marca en su siguiente chequeo de progreso.
+    db.query(ReportJob).filter(
+        ReportJob.id == job_id,
+        or_(ReportJob.status == ReportJobStatus.QUEUED, report_jobs.condicion_huerfano()),
+    ).update(
+        {ReportJob.status: ReportJobStatus.CANCELLED, ReportJob.finished_at: func.now()},
+        synchronize_session=False,
+    )
+    job.cancel_requested = True
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+@router.get("/{job_id}/download")
+def descargar_report_job(
+    job_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current: User = Depends(require_coordinator_or_admin),
+):
+    job = _get_job(db, job_id, current)
+    if job.status != ReportJobStatus.DONE:
+        raise HTTPException(status_code=409, detail="El reporte aún no está listo")
+    if not job.artifact_path or not os.path.exists(job.artifact_path):
+        raise HTTPException(status_code=410, detail="El archivo del reporte ya no está disponible")
+
+    return servir_archivo(
+        request,
+        job.artifact_path,
+        media_type=job.artifact_mime or "application/octet-stream",
+        filename=f"reporte_{job.tipo}_{job.id}.{job.formato}",
+    )
+
+
+@router.delete("/{job_id}", status_code=204)
+def eliminar_report_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current: User = Depends(require_coordinator_or_admin),
+):
+    job = _get_job(db, job_id, current)
+    if job.status == ReportJobStatus.RUNNING and report_jobs.marcar_huerfanos(db, job_id=job_id):
+        db.commit()
+        db.refresh(job)
+    if job.status in report_jobs.ACTIVE_STATES:
+        raise HTTPException(status_code=409, detail="Cancela el reporte antes de eliminarlo")
+    if job.artifact_path and os.path.exists(job.artifact_path):
+        try:
+            os.remove(job.artifact_path)
+        except OSError:
+            pass
+    db.delete(job)
+    db.commit()
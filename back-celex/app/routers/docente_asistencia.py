@@ -12,6 +12,7 @@ from ..database import get_db
 from ..auth import get_current_user
 from ..models import Ciclo, User, UserRole, Inscripcion
 from ..models_asistencia import AsistenciaSesion, AsistenciaRegistro, AsistenciaEstado
+from ..historial import invalidar_historial, recalcular_resumen
 
 router = APIRouter(prefix="/docente/asistencia", tags=["Docente - Asistencia"])
 
@@ -140,7 +141,9 @@ def generar_sesiones(
         stmt = stmt.on_conflict_do_nothing(index_elements=["ciclo_id", "fecha"])
         try:
             db.execute(stmt)
+            recalcular_resumen(db, ciclo_id=ciclo.id)  # cambia el total de sesiones
             db.commit()
+            invalidar_historial(ciclo_id=ciclo.id)
         except IntegrityError:
             logger.exception("ERROR insertando sesiones (ignorable si duplicado): ciclo_id=%s", ciclo.id)
             db.rollback()
@@ -232,7 +235,10 @@ def registros_por_sesion(
             )
     if to_create:
         db.add_all(to_create)
+        db.flush()
+        recalcular_resumen(db, inscripcion_ids=[r.inscripcion_id for r in to_create])
         db.commit()
+        invalidar_historial(ciclo_id=sesion.ciclo_id)
         logger.info("REGISTROS creados (faltantes): sesion_id=%s n=%s", sesion_id, len(to_create))
 
     registros = (
@@ -318,7 +324,10 @@ def marcar_asistencia_lote(
 
     if to_create:
         db.add_all(to_create)
+    db.flush()
+    recalcular_resumen(db, inscripcion_ids=[it.inscripcion_id for it in items])
     db.commit()
+    invalidar_historial(ciclo_id=sesion.ciclo_id)
     logger.info("MARCAR lote OK: sesion_id=%s creados=%s total_items=%s", sesion_id, len(to_create), len(items))
 
     return registros_por_sesion(sesion_id, db=db, current_user=current_user)
@@ -376,7 +385,9 @@ def matriz_ciclo(
         stmt = stmt.on_conflict_do_nothing(index_elements=["ciclo_id", "fecha"])
         try:
             db.execute(stmt)
+            recalcular_resumen(db, ciclo_id=ciclo.id)
             db.commit()
+            invalidar_historial(ciclo_id=ciclo.id)
         except IntegrityError:
             logger.exception("ERROR insertando sesiones (matriz, duplicados esperados): ciclo_id=%s", ciclo.id)
             db.rollback()
@@ -416,7 +427,9 @@ def matriz_ciclo(
                     })
         if reg_vals:
             db.bulk_insert_mappings(AsistenciaRegistro, reg_vals)
+            recalcular_resumen(db, ciclo_id=ciclo.id)
             db.commit()
+            invalidar_historial(ciclo_id=ciclo.id)
             logger.info("MATRIZ registros completados: ciclo_id=%s añadidos=%s", ciclo.id, len(reg_vals))
 
     registros = (
@@ -511,7 +524,10 @@ def marcar_matriz(
 
         if to_create:
             db.add_all(to_create)
+        db.flush()
+        recalcular_resumen(db, inscripcion_ids=[it.inscripcion_id for it in payload.items])
         db.commit()
+        invalidar_historial(ciclo_id=ciclo.id)
         logger.info("MATRIZ marcar OK: ciclo_id=%s creados=%s total_items=%s", ciclo_id, len(to_create), len(payload.items))
 
     return matriz_ciclo(ciclo_id, db=db, current_user=current_user)
@@ -7,6 +7,8 @@ from sqlalchemy import func, literal
 from ..database import get_db
 from ..auth import get_current_user
 from ..models import User, UserRole, Ciclo
+from .. import encuesta_series
+from ..ciclo_filtros import filtrar_ciclos
 
 router = APIRouter(prefix="/docente/encuestas", tags=["Docente - Encuestas"])
 
@@ -60,7 +62,7 @@ def serie_por_pregunta(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
     docenteId: Optional[int] = Query(None, description="Si no se envía, usa el docente en sesión"),
-    anio: Optional[int] = Query(None, description="Filtro opcional por año (prefijo del código del ciclo)"),
+    anio: Optional[int] = Query(None, description="Filtro opcional por año del ciclo"),
     idioma: Optional[str] = Query(None, description="Filtro opcional por idioma: ingles|frances|..."),
     soloProfesor: bool = Query(False, description="Si True, solo ciclos donde el docente está asignado (por defecto ya se filtra así)"),
 ):
@@ -92,14 +94,10 @@ def serie_por_pregunta(
         raise HTTPException(status_code=404, detail="Docente no encontrado")
 
     # ---- Importes locales para evitar import circular
-    from ..models import SurveyQuestion, SurveyResponse, SurveyAnswer
+    from ..models import SurveyQuestion
 
     # ---- Ciclos donde el docente está asignado
-    q_ciclos = db.query(Ciclo).filter(Ciclo.docente_id == target_docente_id)
-    if idioma:
-        q_ciclos = q_ciclos.filter(func.lower(func.cast(Ciclo.idioma, str)).ilike(func.lower(idioma)))
-    if anio:
-        q_ciclos = q_ciclos.filter(Ciclo.codigo.ilike(f"{anio}-%"))
+    q_ciclos = filtrar_ciclos(db.query(Ciclo).filter(Ciclo.docente_id == target_docente_id), anio, idioma)
 
     ciclos = q_ciclos.order_by(Ciclo.codigo.asc()).all()
     if not ciclos:
@@ -125,103 +123,25 @@ def serie_por_pregunta(
             series=[]
         )
 
-    # ---- Para cada pregunta, construir serie (ciclo → porcentaje)
+    # ---- Una sola consulta agrupada (pregunta, ciclo, valor) y pivote en memoria
+    tipos = {q.id: (q.type or "").strip() for q in preguntas}
+    qids = [qid for qid, t in tipos.items() if t in encuesta_series.TIPOS_SERIE]
+    pct = encuesta_series.pct_por_pregunta_ciclo(encuesta_series.conteos(db, ciclo_ids, qids), tipos)
+
     series: List[SerieLinea] = []
     for q in preguntas:
-        q_type = (q.type or "").strip()
-        label = (q.text or f"Pregunta {q.id}").strip()
-
-        puntos: List[SeriePunto] = []
-
-        if q_type == "likert_1_5":
-            # Para cada ciclo, promedio (1..5) → % (0..100)
-            for ciclo_id in ciclo_ids:
-                rows = (
-                    db.query(SurveyAnswer.value_int.label("v"), func.count().label("n"))
-                    .join(SurveyResponse, SurveyResponse.id == SurveyAnswer.response_id)
-                    .filter(
-                        SurveyResponse.ciclo_id == ciclo_id,
-                        SurveyAnswer.question_id == q.id,
-                        SurveyAnswer.value_int.isnot(None),
-                    )
-                    .group_by(SurveyAnswer.value_int)
-                    .all()
-                )
-                total = 0
-                suma = 0
-                for r in rows:
-                    val = int(r.v or 0)
-                    n = int(r.n or 0)
-                    if 1 <= val <= 5 and n > 0:
-                        total += n
-                        suma += val * n
-                if total > 0:
-                    prom = suma / total  # 1..5
-                    pct = round((prom / 5.0) * 100.0, 1)
-                    puntos.append(SeriePunto(x=codigo_by_id[ciclo_id], y=pct))
-
-        elif q_type == "scale_0_10":
-            for ciclo_id in ciclo_ids:
-                rows = (
-                    db.query(SurveyAnswer.value_int.label("v"), func.count().label("n"))
-                    .join(SurveyResponse, SurveyResponse.id == SurveyAnswer.response_id)
-                    .filter(
-                        SurveyResponse.ciclo_id == ciclo_id,
-                        SurveyAnswer.question_id == q.id,
-                        SurveyAnswer.value_int.isnot(None),
-                    )
-                    .group_by(SurveyAnswer.value_int)
-                    .all()
-                )
-                total = 0
-                suma = 0
-                for r in rows:
-                    val = int(r.v or 0)
-                    n = int(r.n or 0)
-                    if 0 <= val <= 10 and n > 0:
-                        total += n
-                        suma += val * n
-                if total > 0:
-                    prom = suma / total  # 0..10
-                    pct = round((prom / 10.0) * 100.0, 1)
-                    puntos.append(SeriePunto(x=codigo_by_id[ciclo_id], y=pct))
-
-        elif q_type == "yes_no":
-            # % de "Sí" (value_bool=True)
-            for ciclo_id in ciclo_ids:
-                rows = (
-                    db.query(SurveyAnswer.value_bool.label("v"), func.count().label("n"))
-                    .join(SurveyResponse, SurveyResponse.id == SurveyAnswer.response_id)
-                    .filter(
-                        SurveyResponse.ciclo_id == ciclo_id,
-                        SurveyAnswer.question_id == q.id,
-                        SurveyAnswer.value_bool.isnot(None),
-                    )
-                    .group_by(SurveyAnswer.value_bool)
-                    .all()
-                )
-                total = 0
-                si = 0
-                for r in rows:
-                    n = int(r.n or 0)
-                    total += n
-                    if r.v is True:
-                        si += n
-                if total > 0:
-                    pct = round((si / total) * 100.0, 1)
-                    puntos.append(SeriePunto(x=codigo_by_id[ciclo_id], y=pct))
-
-        else:
-            # open_text u otros: no son numéricos → se omiten en la serie
-            pass
-
+        # open_text u otros: no son numéricos → no tienen puntos
+        puntos = [
+            SeriePunto(x=codigo_by_id[cid], y=pct[(q.id, cid)])
+            for cid in ciclo_ids
+            if (q.id, cid) in pct
+        ]
         if puntos:
-            serie = SerieLinea(
+            series.append(SerieLinea(
                 id=str(q.id),
-                label=label,
+                label=(q.text or f"Pregunta {q.id}").strip(),
                 data=sorted(puntos, key=lambda p: p.x)  # por código de ciclo asc
-            )
-            series.append(serie)
+            ))
 
     # Respuesta
     return SeriePorPreguntaResp(
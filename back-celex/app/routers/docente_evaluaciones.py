@@ -1,11 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import csv
+import os
+from uuid import uuid4
+
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi.responses import FileResponse
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from typing import Optional
 
 from ..database import get_db
 from ..auth import get_current_user  # ya la usas en otros routers
 from ..models import User, UserRole, Ciclo, Inscripcion, Evaluacion
-from ..schemas import EvaluacionUpsertIn, EvaluacionOut, EvaluacionListOut
+from ..historial import invalidar_historial, recalcular_resumen
+from ..docente_snapshot import invalidar_overview
+from ..import_utils import iter_filas, norm_header, norm_id
+from ..schemas import (
+    EvaluacionUpsertIn, EvaluacionOut, EvaluacionListOut, EvaluacionBatchIn,
+    EvaluacionImportOut, EvaluacionImportErrorOut,
+)
 
 router = APIRouter(prefix="/docente/evaluaciones", tags=["Docente - Evaluaciones"])
 
@@ -34,6 +47,75 @@ def require_docente_del_ciclo_o_superuser(
             detail="No tienes permisos para evaluar este curso",
         )
 
+def _valores_evaluacion(p: EvaluacionUpsertIn, inscripcion_id: int, ciclo_id: int, user_id: int) -> dict:
+    """Fila lista para INSERT en `evaluaciones` (rangos acotados y derivados calculados)."""
+    subtotal_medio, subtotal_final, promedio_final = calcular_subtotales_y_promedio(p)
+    return {
+        "inscripcion_id": inscripcion_id,
+        "ciclo_id": ciclo_id,
+        "medio_examen": clamp(p.medio_examen, 0, 80),
+        "medio_continua": clamp(p.medio_continua, 0, 20),
+        "final_examen": clamp(p.final_examen, 0, 60),
+        "final_continua": clamp(p.final_continua, 0, 20),
+        "final_tarea": clamp(p.final_tarea, 0, 20),
+        "subtotal_medio": subtotal_medio,
+        "subtotal_final": subtotal_final,
+        "promedio_final": promedio_final,
+        "updated_by_id": user_id,
+    }
+
+def _upsert_evaluaciones(db: Session, valores: list[dict], chunk: int = 1000) -> list:
+    """
+    INSERT ... ON CONFLICT (inscripcion_id) DO UPDATE ... RETURNING por bloques.
+    No hace commit: lo decide quien llama.
+    """
+    tabla = Evaluacion.__table__
+    out = []
+    for i in range(0, len(valores), chunk):
+        stmt = pg_insert(tabla).values(valores[i:i + chunk])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[tabla.c.inscripcion_id],
+            set_={
+                "medio_examen": stmt.excluded.medio_examen,
+                "medio_continua": stmt.excluded.medio_continua,
+                "final_examen": stmt.excluded.final_examen,
+                "final_continua": stmt.excluded.final_continua,
+                "final_tarea": stmt.excluded.final_tarea,
+                "subtotal_medio": stmt.excluded.subtotal_medio,
+                "subtotal_final": stmt.excluded.subtotal_final,
+                "promedio_final": stmt.excluded.promedio_final,
+                "updated_by_id": stmt.excluded.updated_by_id,
+                "updated_at": func.now(),
+            },
+        ).returning(
+            tabla.c.inscripcion_id,
+            tabla.c.ciclo_id,
+            tabla.c.medio_examen,
+            tabla.c.medio_continua,
+            tabla.c.final_examen,
+            tabla.c.final_continua,
+            tabla.c.final_tarea,
+            tabla.c.subtotal_medio,
+            tabla.c.subtotal_final,
+            tabla.c.promedio_final,
+        )
+        out.extend(db.execute(stmt).all())
+    return out
+
+def _row_to_out(r) -> EvaluacionOut:
+    return EvaluacionOut(
+        inscripcion_id=r.inscripcion_id,
+        ciclo_id=r.ciclo_id,
+        medio_examen=r.medio_examen,
+        medio_continua=r.medio_continua,
+        final_examen=r.final_examen,
+        final_continua=r.final_continua,
+        final_tarea=r.final_tarea,
+        subtotal_medio=r.subtotal_medio,
+        subtotal_final=r.subtotal_final,
+        promedio_final=float(r.promedio_final),
+    )
+
 @router.post("/ciclos/{ciclo_id}/alumnos/{inscripcion_id}", response_model=EvaluacionOut)
 def upsert_evaluacion(
     ciclo_id: int,
@@ -80,7 +162,11 @@ def upsert_evaluacion(
     ev.promedio_final = promedio_final
     ev.updated_by_id  = current_user.id
 
+    db.flush()
+    recalcular_resumen(db, inscripcion_ids=[inscripcion_id])
     db.commit()
+    invalidar_historial(ciclo_id=ciclo_id)
+    invalidar_overview(ciclo_id=ciclo_id)
     db.refresh(ev)
 
     return EvaluacionOut(
@@ -96,6 +182,56 @@ def upsert_evaluacion(
         promedio_final=float(ev.promedio_final),
     )
 
+@router.put("/ciclos/{ciclo_id}", response_model=EvaluacionListOut)
+def upsert_evaluaciones_grupo(
+    ciclo_id: int,
+    payload: EvaluacionBatchIn,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Guarda las calificaciones de todo el grupo en una sola petición:
+    valida pertenencia con una consulta y hace el upsert con un solo INSERT ... ON CONFLICT.
+    """
+    ciclo = db.query(Ciclo).filter(Ciclo.id == ciclo_id).first()
+    if not ciclo:
+        raise HTTPException(status_code=404, detail="Ciclo no encontrado")
+
+    require_docente_del_ciclo_o_superuser(db, current_user, ciclo)
+
+    if not payload.items:
+        return EvaluacionListOut(items=[])
+
+    ids = [it.inscripcion_id for it in payload.items]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=400, detail="Hay inscripciones repetidas en la captura")
+
+    # 1) Pertenencia: una sola consulta para todo el lote
+    validas = {
+        row[0]
+        for row in db.query(Inscripcion.id)
+        .filter(Inscripcion.ciclo_id == ciclo_id, Inscripcion.id.in_(ids))
+        .all()
+    }
+    faltantes = [i for i in ids if i not in validas]
+    if faltantes:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Inscripciones no encontradas en este ciclo: {faltantes}",
+        )
+
+    # 2) Cálculos en memoria
+    valores = [_valores_evaluacion(it, it.inscripcion_id, ciclo_id, current_user.id) for it in payload.items]
+
+    # 3) Upsert en un solo statement
+    rows = _upsert_evaluaciones(db, valores)
+    recalcular_resumen(db, inscripcion_ids=[v["inscripcion_id"] for v in valores])
+    db.commit()
+    invalidar_historial(ciclo_id=ciclo_id)
+    invalidar_overview(ciclo_id=ciclo_id)
+
+    return EvaluacionListOut(items=[_row_to_out(r) for r in rows])
+
 @router.get("/ciclos/{ciclo_id}", response_model=EvaluacionListOut)
 def list_evaluaciones_por_ciclo(
     ciclo_id: int,
@@ -129,3 +265,208 @@ def list_evaluaciones_por_ciclo(
         for r in rows
     ]
     return EvaluacionListOut(items=items)
+
+
+# ==========================
+# Importación CSV/XLSX
+# ==========================
+# Mismos límites que los CheckConstraint ck_eval_* de Evaluacion
+RANGOS_EVAL = {
+    "medio_examen": 80,
+    "medio_continua": 20,
+    "final_examen": 60,
+    "final_continua": 20,
+    "final_tarea": 20,
+}
+# Columnas aceptadas para identificar al alumno (en orden de preferencia)
+COLUMNAS_ID = ("inscripcion_id", "boleta", "curp", "email")
+
+IMPORT_MAX_MB = 10
+IMPORT_REPORTS_DIR = os.path.abspath(os.getenv("IMPORT_REPORTS_DIR", "uploads/reportes_importacion"))
+
+
+def _parse_calif(v, campo: str) -> Optional[int]:
+    """Convierte una celda a entero validando el rango del campo. Celda vacía → None."""
+    if v is None or (isinstance(v, str) and not v.strip()):
+        return None
+    try:
+        f = float(str(v).strip().replace(",", "."))
+    except ValueError:
+        raise ValueError(f"{campo}: '{v}' no es un número")
+    if not f.is_integer():
+        raise ValueError(f"{campo}: '{v}' debe ser entero")
+    n = int(f)
+    if n < 0 or n > RANGOS_EVAL[campo]:
+        raise ValueError(f"{campo}: {n} fuera de rango (0..{RANGOS_EVAL[campo]})")
+    return n
+
+
+def _lookup_inscripciones(db: Session, ciclo_id: int) -> tuple[dict, dict]:
+    """
+    Una sola consulta: inscripciones del ciclo + datos del alumno + evaluación existente.
+    Regresa (lookup por identificador, evaluación actual por inscripcion_id).
+    """
+    rows = (
+        db.query(
+            Inscripcion.id,
+            User.boleta,
+            User.curp,
+            User.email,
+            Evaluacion.medio_examen,
+            Evaluacion.medio_continua,
+            Evaluacion.final_examen,
+            Evaluacion.final_continua,
+            Evaluacion.final_tarea,
+        )
+        .join(User, User.id == Inscripcion.alumno_id)
+        .outerjoin(Evaluacion, Evaluacion.inscripcion_id == Inscripcion.id)
+        .filter(Inscripcion.ciclo_id == ciclo_id)
+        .all()
+    )
+    lookup: dict = {}
+    actuales: dict = {}
+    for r in rows:
+        lookup[("inscripcion_id", str(r.id))] = r.id
+        if r.boleta:
+            lookup[("boleta", r.boleta.strip())] = r.id
+        if r.curp:
+            lookup[("curp", r.curp.strip().upper())] = r.id
+        if r.email:
+            lookup[("email", r.email.strip().lower())] = r.id
+        actuales[r.id] = {campo: getattr(r, campo) for campo in RANGOS_EVAL}
+    return lookup, actuales
+
+
+def _guardar_reporte(ciclo_id: int, filas: list[tuple]) -> str:
+    os.makedirs(IMPORT_REPORTS_DIR, exist_ok=True)
+    reporte_id = uuid4().hex
+    path = os.path.join(IMPORT_REPORTS_DIR, f"{ciclo_id}_{reporte_id}.csv")
+    with open(path, "w", encoding="utf-8-sig", newline="") as fh:
+        w = csv.writer(fh)
+        w.writerow(["fila", "identificador", "estado", "motivo"])
+        w.writerows(filas)
+    return reporte_id
+
+
+@router.post("/ciclos/{ciclo_id}/importar", response_model=EvaluacionImportOut)
+def importar_evaluaciones(
+    ciclo_id: int,
+    archivo: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    """
+    Importa calificaciones desde CSV/XLSX.
+    - Encabezados: una columna de identificación (inscripcion_id | boleta | curp | email)
+      y cualquiera de medio_examen, medio_continua, final_examen, final_continua, final_tarea.
+    - Las columnas ausentes conservan el valor ya capturado; una celda vacía lo borra.
+    - Las filas inválidas no detienen la importación: se listan en el reporte descargable.
+    """
+    ciclo = db.query(Ciclo).filter(Ciclo.id == ciclo_id).first()
+    if not ciclo:
+        raise HTTPException(status_code=404, detail="Ciclo no encontrado")
+
+    require_docente_del_ciclo_o_superuser(db, current_user, ciclo)
+
+    archivo.file.seek(0, os.SEEK_END)
+    if archivo.file.tell() > IMPORT_MAX_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"El archivo excede {IMPORT_MAX_MB}MB")
+    archivo.file.seek(0)
+
+    filas = iter_filas(archivo)
+    encabezado = next(filas, None)
+    if not encabezado:
+        raise HTTPException(status_code=400, detail="El archivo está vacío")
+
+    headers = [norm_header(h) for h in encabezado]
+    col_id = next((c for c in COLUMNAS_ID if c in headers), None)
+    if col_id is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Falta columna de identificación (inscripcion_id, boleta, curp o email)",
+        )
+    idx_id = headers.index(col_id)
+    idx_calif = {campo: headers.index(campo) for campo in RANGOS_EVAL if campo in headers}
+    if not idx_calif:
+        raise HTTPException(status_code=400, detail="No se encontró ninguna columna de calificación")
+
+    lookup, actuales = _lookup_inscripciones(db, ciclo_id)
+
+    valores: list[dict] = []
+    vistos: dict[int, int] = {}
+    reporte: list[tuple] = []
+    errores: list[EvaluacionImportErrorOut] = []
+    total = 0
+
+    for n, row in enumerate(filas, start=2):
+        if not row or all(c is None or str(c).strip() == "" for c in row):
+            continue
+        total += 1
+        ident_raw = row[idx_id] if idx_id < len(row) else None
+        ident = norm_id(col_id, ident_raw) if ident_raw not in (None, "") else ""
+
+        def _error(motivo: str):
+            errores.append(EvaluacionImportErrorOut(fila=n, identificador=ident or None, motivo=motivo))
+            reporte.append((n, ident, "error", motivo))
+
+        insc_id = lookup.get((col_id, ident))
+        if not ident:
+            _error(f"Sin {col_id}")
+            continue
+        if insc_id is None:
+            _error("No corresponde a ninguna inscripción de este ciclo")
+            continue
+        if insc_id in vistos:
+            _error(f"Alumno repetido (ya aparece en la fila {vistos[insc_id]})")
+            continue
+
+        datos = dict(actuales.get(insc_id) or {})
+        try:
+            for campo, idx in idx_calif.items():
+                datos[campo] = _parse_calif(row[idx] if idx < len(row) else None, campo)
+        except ValueError as e:
+            _error(str(e))
+            continue
+
+        vistos[insc_id] = n
+        valores.append(_valores_evaluacion(EvaluacionUpsertIn(**datos), insc_id, ciclo_id, current_user.id))
+        reporte.append((n, ident, "ok", ""))
+
+    if valores:
+        _upsert_evaluaciones(db, valores)
+        recalcular_resumen(db, inscripcion_ids=[v["inscripcion_id"] for v in valores])
+        db.commit()
+        invalidar_historial(ciclo_id=ciclo_id)
+        invalidar_overview(ciclo_id=ciclo_id)
+
+    reporte_id = _guardar_reporte(ciclo_id, reporte) if errores else None
+
+    return EvaluacionImportOut(
+        total_filas=total,
+        aplicadas=len(valores),
+        con_error=len(errores),
+        errores=errores,
+        reporte_id=reporte_id,
+    )
+
+
+@router.get("/ciclos/{ciclo_id}/importar/reportes/{reporte_id}")
+def descargar_reporte_importacion(
+    ciclo_id: int,
+    reporte_id: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+):
+    ciclo = db.query(Ciclo).filter(Ciclo.id == ciclo_id).first()
+    if not ciclo:
+        raise HTTPException(status_code=404, detail="Ciclo no encontrado")
+
+    require_docente_del_ciclo_o_superuser(db, current_user, ciclo)
+
+    if not reporte_id.isalnum():
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+    path = os.path.join(IMPORT_REPORTS_DIR, f"{ciclo_id}_{reporte_id}.csv")
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Reporte no encontrado")
+
+    return FileResponse(path, media_type="text/csv", filename=f"reporte_importacion_{ciclo_id}.csv")
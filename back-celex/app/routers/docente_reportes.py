@@ -8,6 +8,10 @@ from sqlalchemy.orm import Session
 
 from ..database import get_db
 from ..auth import get_current_user
+from ..pagination import count_cache, page_with_cursor
+from ..search import comentario_match
+from .. import encuesta_series
+from ..ciclo_filtros import filtrar_ciclos
 from ..models import (
     User,
     UserRole,
@@ -84,6 +88,7 @@ class ComentariosResponse(BaseModel):
     ciclo: Dict[str, Any] | None = None
     total: int
     items: List[ComentarioOut]
+    next_cursor: Optional[str] = None
 
 
 class SeriePunto(BaseModel):
@@ -121,30 +126,17 @@ def listar_ciclos_asignados(
     db: Session = Depends(get_db),
     current: User = Depends(require_teacher_or_admin),
 ):
-    q = db.query(Ciclo).filter(Ciclo.docente_id == current.id)
-
-    if idioma:
-        # Coincidencia exacta o case-insensitive
-        q = q.filter(or_(Ciclo.idioma == idioma, Ciclo.idioma.ilike(idioma)))
-
-    if anio:
-        like = f"{anio}-%"  # códigos 'YYYY-...'
-        q = q.filter(Ciclo.codigo.ilike(like))
+    q = filtrar_ciclos(db.query(Ciclo).filter(Ciclo.docente_id == current.id), anio, idioma)
 
     ciclos = q.order_by(Ciclo.codigo.desc()).limit(200).all()
 
     out: List[CicloLite] = []
     for c in ciclos:
-        try:
-            pref = str(c.codigo).split("-", 1)[0]
-            anio_int = int(pref) if pref.isdigit() else None
-        except Exception:
-            anio_int = None
         out.append(CicloLite(
             id=c.id,
             codigo=c.codigo,
             idioma=str(getattr(c, "idioma", "") or ""),
-            anio=anio_int
+            anio=getattr(c, "anio", None)
         ))
     return out
 
@@ -322,6 +314,7 @@ def encuesta_comentarios_docente(
     q: Optional[str] = Query(None, description="Texto a buscar"),
     limit: int = Query(300, ge=1, le=1000),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None, description="next_cursor de la página anterior"),
     db: Session = Depends(get_db),
     current: User = Depends(require_teacher_or_admin),
 ):
@@ -339,6 +332,7 @@ def encuesta_comentarios_docente(
             SurveyQuestion.text.label("pregunta_texto"),
             SurveyAnswer.value_text.label("texto"),
             SurveyResponse.created_at.label("created_at"),
+            SurveyAnswer.created_at.label("answer_created_at"),
             User.first_name.label("first_name"),
             User.last_name.label("last_name"),
             User.email.label("email"),
@@ -366,23 +360,34 @@ def encuesta_comentarios_docente(
 
     if q:
         like = f"%{q.strip().lower()}%"
-        qbase = qbase.filter(
-            or_(
-                func.lower(SurveyAnswer.value_text).like(like),
-                func.lower(SurveyQuestion.text).like(like),
-                func.lower(User.first_name).like(like),
-                func.lower(User.last_name).like(like),
-                func.lower(User.email).like(like),
-            )
-        )
-
-    total = qbase.count()
-    rows = (
-        qbase.order_by(SurveyResponse.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
+        conds = [
+            func.lower(SurveyQuestion.text).like(like),
+            func.lower(User.first_name).like(like),
+            func.lower(User.last_name).like(like),
+            func.lower(User.email).like(like),
+        ]
+        texto_match = comentario_match(q)
+        if texto_match is not None:
+            conds.append(texto_match)
+        qbase = qbase.filter(or_(*conds))
+
+    total = count_cache.get_or_compute(
+        ("docente_encuesta_comentarios", cicloId, q, onlyCommentLike),
+        qbase.count,
     )
+    if offset and not cursor:
+        rows = (
+            qbase.order_by(SurveyAnswer.created_at.desc(), SurveyAnswer.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+        next_cursor = None
+    else:
+        rows, next_cursor = page_with_cursor(
+            qbase, [SurveyAnswer.created_at, SurveyAnswer.id], limit, cursor,
+            key=lambda r: [r.answer_created_at, r.id],
+        )
 
     items: List[ComentarioOut] = []
     for r in rows:
@@ -400,6 +405,7 @@ def encuesta_comentarios_docente(
         ciclo={"id": ciclo.id, "codigo": ciclo.codigo},
         total=total,
         items=items,
+        next_cursor=next_cursor,
     )
 
 
@@ -419,26 +425,17 @@ def serie_docente(
         .all()
     )
 
+    # Promedio global (mezcla 1..5 y 0..10). Para precisión por escala,
+    # habría que computar ponderado por tipo/pregunta.
+    # Una sola consulta agrupada para todos los ciclos (antes: una por ciclo).
+    prom_por_ciclo = encuesta_series.promedio_crudo_por_ciclo(
+        encuesta_series.conteos(db, [c.id for c in ciclos])
+    )
     puntos: List[SeriePunto] = []
     for c in ciclos:
-        # Promedio global (mezcla 1..5 y 0..10). Para precisión por escala,
-        # habría que computar ponderado por tipo/pregunta.
-        agg = (
-            db.query(
-                func.sum(SurveyAnswer.value_int).label("suma"),
-                func.count(SurveyAnswer.value_int).label("n"),
-            )
-            .join(SurveyResponse, SurveyResponse.id == SurveyAnswer.response_id)
-            .filter(
-                SurveyResponse.ciclo_id == c.id,
-                SurveyAnswer.value_int.isnot(None),
-            )
-            .first()
-        )
-        n = int(getattr(agg, "n", 0) or 0)
-        if n <= 0:
+        if c.id not in prom_por_ciclo:
             continue
-        prom = float(getattr(agg, "suma", 0) or 0) / n  # promedio crudo
+        prom, _n = prom_por_ciclo[c.id]  # promedio crudo
         pct = round((prom / 5.0) * 100.0, 1)  # heurística rápida (domina 1..5)
         puntos.append(SeriePunto(ciclo_id=c.id, ciclo_codigo=c.codigo, promedio_pct=pct, fecha=None))
 
@@ -646,11 +643,7 @@ def kpi_global_docente(
     if cicloId is not None:
         ciclos_q = ciclos_q.filter(Ciclo.id == cicloId)
     else:
-        if anio is not None:
-            ciclos_q = ciclos_q.filter(Ciclo.codigo.ilike(f"{anio}-%"))
-        if idioma:
-            # igualamos en lower para evitar problemas de mayúsculas
-            ciclos_q = ciclos_q.filter(func.lower(func.coalesce(Ciclo.idioma, "")) == func.lower(idioma))
+        ciclos_q = filtrar_ciclos(ciclos_q, anio, idioma)
 
     ciclos = ciclos_q.all()
     if not ciclos:
@@ -15,12 +15,14 @@ from fastapi import (
     UploadFile,
     Response,
 )
-from fastapi.responses import FileResponse
 from sqlalchemy import or_, func, and_
 from sqlalchemy.orm import Session, joinedload
 
 from ..database import get_db
+from .. import lista_espera, placement_capacity, placement_holds, upload_variants
 from ..auth import get_current_user
+from ..file_serving import servir_archivo
+from ..idempotency import idempotente
 from ..models import (
     PlacementExam,
     User,
@@ -92,6 +94,7 @@ async def _save_upload(file: UploadFile | None, env_dir_key: str, default_dir: s
     except Exception:
         pass
 
+    upload_variants.encolar(full_path)
     return full_path, (file.content_type or "application/octet-stream"), size
 
 
@@ -179,6 +182,25 @@ def _ocupados_for_exam(db: Session, exam_id: int) -> int:
     )
 
 
+def _reservar_lugar(db: Session, exam_id: int, alumno_id: int, upload_path: str | None):
+    """
+    Revalida cupo con el examen bloqueado (placement_holds.reservar_lugar).
+    Si ya no hay lugar, borra el comprobante recién subido antes de responder 409.
+    """
+    try:
+        hold = placement_holds.reservar_lugar(db, exam_id, alumno_id)
+    except HTTPException:
+        if upload_path and os.path.exists(upload_path):
+            try:
+                os.remove(upload_path)
+            except Exception:
+                pass
+        raise
+    # Si venía de la lista de espera, su turno queda cerrado con este registro
+    lista_espera.cerrar_espera(db, alumno_id, exam_id=exam_id)
+    return hold
+
+
 def _serialize_exam_with_disponibles(exam: PlacementExam, ocupados: int):
     disponibles = max(0, (exam.cupo_total or 0) - (ocupados or 0))
     # incluye insc_inicio/insc_fin y objeto inscripcion {from,to} para compat
@@ -372,6 +394,7 @@ def my_registros(
 @router.get("/registros/{registro_id}/comprobante")
 def download_comprobante(
     registro_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     user: User = Depends(require_student),
 ):
@@ -383,13 +406,7 @@ def download_comprobante(
     if not reg.comprobante_path or not os.path.exists(reg.comprobante_path):
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
 
-    filename = os.path.basename(reg.comprobante_path)
-    media_type = reg.comprobante_mime or "application/octet-stream"
-    return FileResponse(
-        reg.comprobante_path,
-        media_type=media_type,
-        filename=filename,
-    )
+    return servir_archivo(request, reg.comprobante_path, media_type=reg.comprobante_mime)
 
 
 @router.delete("/registros/{registro_id}", status_code=204)
@@ -408,7 +425,39 @@ def cancel_registro(
 
     reg.status = PlacementRegistroStatus.CANCELADA
     db.add(reg)
+    placement_capacity.notificar(db, [reg.exam_id])
     db.commit()
+    lista_espera.despertar(exam_id=reg.exam_id)
+    return Response(status_code=204)
+
+
+@router.post("/{exam_id}/hold", status_code=201)
+def take_hold(
+    exam_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_student),
+):
+    """
+    Aparta un lugar mientras el alumno llena el formulario (o renueva su apartado).
+    El lugar se libera solo al vencer; el registro lo convierte.
+    """
+    hold = placement_holds.tomar_hold(db, exam_id, user.id)
+    return {
+        "id": hold.id,
+        "exam_id": hold.exam_id,
+        "expires_at": hold.expires_at,
+        "minutos": placement_holds.PLACEMENT_HOLD_MINUTES,
+    }
+
+
+@router.delete("/{exam_id}/hold", status_code=204)
+def release_hold(
+    exam_id: int,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_student),
+):
+    if placement_holds.liberar_hold(db, exam_id, user.id):
+        lista_espera.despertar(exam_id=exam_id)
     return Response(status_code=204)
 
 
@@ -419,16 +468,27 @@ async def create_registro(
     db: Session = Depends(get_db),
     user: User = Depends(require_student),
 ):
+    """
+    Registro al examen (multipart con comprobante de pago).
+    Encabezado opcional `Idempotency-Key`: un reintento con la misma llave
+    devuelve la respuesta original sin volver a subir el comprobante.
+    """
+    return await idempotente(
+        request, db, user.id, "placement_registro",
+        lambda: _create_registro(exam_id, request, db, user),
+        status_code=201,
+        campos=("referencia", "importe_pesos", "importe_centavos", "fecha_pago"),
+    )
+
+
+async def _create_registro(exam_id: int, request: Request, db: Session, user: User):
     # 1) Validar examen
     exam = db.get(PlacementExam, exam_id)  # type: ignore[attr-defined]
     if not exam or not bool(exam.activo):
         raise HTTPException(status_code=404, detail="Examen no disponible")
 
-    # 1.1) Bloquear sobrecupo
-    ocupados = _ocupados_for_exam(db, exam_id)
-    cupo_total = int(getattr(exam, "cupo_total", 0) or 0)
-    if ocupados >= cupo_total:
-        raise HTTPException(status_code=409, detail="No hay lugares disponibles")
+    # 1.1) Bloquear sobrecupo (sin contar el apartado propio)
+    placement_holds.verificar_lugar(db, exam, user.id)
 
     # 2) Parseo estándar (incluye guardar comprobante)
     parsed = await _parse_registro_form_and_upload(request)
@@ -450,6 +510,8 @@ async def create_registro(
         if getattr(exists, "status") in (PlacementRegistroStatus.RECHAZADA, PlacementRegistroStatus.CANCELADA):
             # Si está cancelada o rechazada, permitimos "revivir" siempre; si quieres,
             # puedes requerir action in {"reintentar","reinscribir"}.
+            hold = _reservar_lugar(db, exam_id, user.id, full_path)
+
             # Reemplazar archivo previo
             old_path = getattr(exists, "comprobante_path", None)
             if old_path and os.path.exists(old_path):
@@ -465,8 +527,10 @@ async def create_registro(
             exists.comprobante_mime = mime
             exists.comprobante_size = size
             exists.status = PlacementRegistroStatus.PREINSCRITA
+            placement_holds.convertir_hold(hold, exists.id)
 
             db.add(exists)
+            placement_capacity.notificar(db, [exam_id])
             db.commit()
             db.refresh(exists)
 
@@ -484,7 +548,8 @@ async def create_registro(
         # Legacy: mantener 409 para no romper integraciones previas en otros estados
         raise HTTPException(status_code=409, detail="Ya existe un registro para este examen")
 
-    # 4) Crear registro nuevo
+    # 4) Crear registro nuevo (cupo revalidado con el examen bloqueado)
+    hold = _reservar_lugar(db, exam_id, user.id, full_path)
     reg = PlacementRegistro(
         exam_id=exam_id,
         alumno_id=user.id,
@@ -497,6 +562,9 @@ async def create_registro(
         status=PlacementRegistroStatus.PREINSCRITA,
     )
     db.add(reg)
+    db.flush()
+    placement_holds.convertir_hold(hold, reg.id)
+    placement_capacity.notificar(db, [exam_id])
     db.commit()
     db.refresh(reg)
 
@@ -534,12 +602,10 @@ async def retry_registro(
     if not exam or not bool(exam.activo):
         raise HTTPException(status_code=404, detail="Examen no disponible")
 
-    ocupados = _ocupados_for_exam(db, reg.exam_id)
-    cupo_total = int(getattr(exam, "cupo_total", 0) or 0)
-    if ocupados >= cupo_total:
-        raise HTTPException(status_code=409, detail="No hay lugares disponibles")
+    placement_holds.verificar_lugar(db, exam, user.id)
 
     parsed = await _parse_registro_form_and_upload(request)
+    hold = _reservar_lugar(db, reg.exam_id, user.id, parsed["comprobante_path"])
 
     old_path = getattr(reg, "comprobante_path", None)
     if old_path and os.path.exists(old_path):
@@ -555,8 +621,10 @@ async def retry_registro(
     reg.comprobante_mime = parsed["comprobante_mime"]
     reg.comprobante_size = parsed["comprobante_size"]
     reg.status = PlacementRegistroStatus.PREINSCRITA
+    placement_holds.convertir_hold(hold, reg.id)
 
     db.add(reg)
+    placement_capacity.notificar(db, [reg.exam_id])
     db.commit()
     db.refresh(reg)
 
@@ -594,12 +662,10 @@ async def reinscribir_registro(
     if not exam or not bool(exam.activo):
         raise HTTPException(status_code=404, detail="Examen no disponible")
 
-    ocupados = _ocupados_for_exam(db, reg.exam_id)
-    cupo_total = int(getattr(exam, "cupo_total", 0) or 0)
-    if ocupados >= cupo_total:
-        raise HTTPException(status_code=409, detail="No hay lugares disponibles")
+    placement_holds.verificar_lugar(db, exam, user.id)
 
     parsed = await _parse_registro_form_and_upload(request)
+    hold = _reservar_lugar(db, reg.exam_id, user.id, parsed["comprobante_path"])
 
     old_path = getattr(reg, "comprobante_path", None)
     if old_path and os.path.exists(old_path):
@@ -615,8 +681,10 @@ async def reinscribir_registro(
     reg.comprobante_mime = parsed["comprobante_mime"]
     reg.comprobante_size = parsed["comprobante_size"]
     reg.status = PlacementRegistroStatus.PREINSCRITA
+    placement_holds.convertir_hold(hold, reg.id)
 
     db.add(reg)
+    placement_capacity.notificar(db, [reg.exam_id])
     db.commit()
     db.refresh(reg)
 
@@ -664,10 +732,9 @@ async def update_registro_action(
     if not exam or not bool(exam.activo):
         raise HTTPException(status_code=404, detail="Examen no disponible")
 
-    ocupados = _ocupados_for_exam(db, reg.exam_id)
-    cupo_total = int(getattr(exam, "cupo_total", 0) or 0)
-    if ocupados >= cupo_total:
-        raise HTTPException(status_code=409, detail="No hay lugares disponibles")
+    placement_holds.verificar_lugar(db, exam, user.id)
+
+    hold = _reservar_lugar(db, reg.exam_id, user.id, parsed["comprobante_path"])
 
     # Reemplaza archivo previo
     old_path = getattr(reg, "comprobante_path", None)
@@ -684,8 +751,10 @@ async def update_registro_action(
     reg.comprobante_mime = parsed["comprobante_mime"]
     reg.comprobante_size = parsed["comprobante_size"]
     reg.status = PlacementRegistroStatus.PREINSCRITA
+    placement_holds.convertir_hold(hold, reg.id)
 
     db.add(reg)
+    placement_capacity.notificar(db, [reg.exam_id])
     db.commit()
     db.refresh(reg)
 
@@ -867,7 +936,11 @@ def update_placement_exam(
         if k in valid_keys:
             setattr(exam, k, v)
 
+    if "cupo_total" in patch:
+        placement_capacity.notificar(db, [exam_id])
     db.commit()
+    if "cupo_total" in patch:
+        lista_espera.despertar(exam_id=exam_id)
     db.refresh(exam)
     return PlacementOut.model_validate(exam)
 
@@ -878,5 +951,6 @@ def delete_placement_exam(exam_id: int, db: Session = Depends(get_db)):
     if not exam:
         raise HTTPException(status_code=404, detail="Examen no encontrado")
     db.delete(exam)
+    placement_capacity.notificar(db, [exam_id])
     db.commit()
     return None
@@ -3,19 +3,22 @@ from __future__ import annotations
 
 import os
 from datetime import datetime, timezone, date   # ← añade date
-from typing import Dict
+from typing import Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from pydantic import BaseModel, Field, constr, conint  # ← añade constr, conint
-from sqlalchemy import func
+from sqlalchemy import Integer, String, Text, column, func, update, values
 from sqlalchemy.orm import Session
 
 from ..database import get_db
+from .. import lista_espera, placement_capacity, upload_variants
+from ..placement_holds import hold_vigente
+from ..file_serving import servir_archivo
 from ..auth import require_coordinator_or_admin
 from ..models import (
     User,
     PlacementExam,
+    PlacementHold,
     PlacementRegistro,
     PlacementRegistroStatus,
 )
@@ -157,7 +160,10 @@ def validate_registro_admin(
         raise HTTPException(status_code=400, detail="Acción inválida")
 
     db.add(reg)
+    placement_capacity.notificar(db, [reg.exam_id])
     db.commit()
+    if action == "REJECT":
+        lista_espera.despertar(exam_id=reg.exam_id)
     db.refresh(reg)
 
     return {
@@ -176,14 +182,123 @@ def validate_registro_admin(
     }
 
 
+# ==========================
+# Validación en lote (Coordinación)
+# ==========================
+VALIDACION_LOTE_MAX = 1000
+
+
+class ValidacionLoteItem(BaseModel):
+    registro_id: int
+    action: str = Field(..., pattern="^(APPROVE|REJECT)$")
+    motivo: str | None = None
+
+
+class ValidacionLoteIn(BaseModel):
+    items: List[ValidacionLoteItem] = Field(..., min_length=1, max_length=VALIDACION_LOTE_MAX)
+
+
+class ValidacionLoteItemOut(BaseModel):
+    registro_id: int
+    ok: bool
+    exam_id: Optional[int] = None
+    status: Optional[str] = None
+    error: Optional[str] = None
+
+
+class ValidacionLoteOut(BaseModel):
+    aplicados: int
+    con_error: int
+    items: List[ValidacionLoteItemOut]
+
+
+@router.post("/registros/validate-lote", response_model=ValidacionLoteOut)
+def validate_registros_lote(
+    payload: ValidacionLoteIn,
+    db: Session = Depends(get_db),
+    user: User = Depends(require_coordinator_or_admin),
+):
+    """
+    Aprueba/rechaza muchos registros en una sola transacción (check-in del día del examen).
+    Mismas reglas que /registros/{id}/validate; los items inválidos se reportan
+    uno por uno y no detienen el resto.
+    Todas las decisiones van en un único UPDATE ... FROM (VALUES ...) RETURNING; los avisos
+    (cupo por SSE, lista de espera) salen una vez por examen después del commit.
+    """
+    resultados: Dict[int, ValidacionLoteItemOut] = {}
+    orden: List[int] = []
+    decisiones: List[tuple] = []  # (registro_id, status, motivo)
+
+    for it in payload.items:
+        rid = it.registro_id
+        if rid in resultados:
+            orden.append(rid)
+            continue  # repetido: se reporta con el resultado del primero
+        orden.append(rid)
+        if it.action == "REJECT":
+            motivo = (it.motivo or "").strip()
+            if len(motivo) < 6:
+                resultados[rid] = ValidacionLoteItemOut(registro_id=rid, ok=False, error="Motivo requerido (≥ 6 caracteres)")
+                continue
+            decisiones.append((rid, PlacementRegistroStatus.RECHAZADA.name, motivo))
+        else:
+            decisiones.append((rid, PlacementRegistroStatus.VALIDADA.name, None))
+        resultados[rid] = ValidacionLoteItemOut(registro_id=rid, ok=False, error="Registro no encontrado")
+
+    exams: set = set()
+    exams_rechazo: set = set()
+    if decisiones:
+        v = values(
+            column("id", Integer), column("status", String), column("motivo", Text), name="v"
+        ).data(decisiones)
+        filas = db.execute(
+            update(PlacementRegistro)
+            .where(PlacementRegistro.id == v.c.id)
+            .values(
+                status=v.c.status,           # SAEnum(native_enum=False) guarda el nombre del miembro
+                validated_by_id=user.id,
+                validated_at=func.now(),
+                rechazo_motivo=v.c.motivo,   # NULL al aprobar
+                validation_notes=v.c.motivo,
+            )
+            .returning(PlacementRegistro.id, PlacementRegistro.exam_id, PlacementRegistro.status)
+            .execution_options(synchronize_session=False)
+        ).all()
+
+        for rid, exam_id, st in filas:
+            resultados[rid] = ValidacionLoteItemOut(
+                registro_id=rid,
+                ok=True,
+                exam_id=exam_id,
+                status=st.value if hasattr(st, "value") else str(st),
+            )
+            exams.add(exam_id)
+            if st == PlacementRegistroStatus.RECHAZADA:
+                exams_rechazo.add(exam_id)
+
+        if exams:
+            placement_capacity.notificar(db, sorted(exams))
+        db.commit()
+        for exam_id in sorted(exams_rechazo):
+            lista_espera.despertar(exam_id=exam_id)
+
+    items = [resultados[rid] for rid in orden]
+    aplicados = sum(r.ok for r in resultados.values())
+    return ValidacionLoteOut(aplicados=aplicados, con_error=len(resultados) - aplicados, items=items)
+
+
 @router.get("/registros/{registro_id}/comprobante-admin")
 def download_comprobante_admin(
     registro_id: int,
+    request: Request,
+    variant: str = Query("original", pattern=upload_variants.VARIANTE_PATTERN),
     db: Session = Depends(get_db),
     _: User = Depends(require_coordinator_or_admin),
 ):
     """
     Descarga el comprobante del registro/pago (coordinación).
+    `variant=thumb|preview` entrega la miniatura / vista previa si ya se generó
+    (si no, el original).
     """
     reg = db.get(PlacementRegistro, registro_id)  # type: ignore[attr-defined]
     if not reg:
@@ -192,18 +307,143 @@ def download_comprobante_admin(
     if not reg.comprobante_path or not os.path.exists(reg.comprobante_path):
         raise HTTPException(status_code=404, detail="Archivo no encontrado")
 
-    filename = os.path.basename(reg.comprobante_path)
-    media_type = reg.comprobante_mime or "application/octet-stream"
-    return FileResponse(
-        reg.comprobante_path,
-        media_type=media_type,
-        filename=filename,
+    path, media_type, filename = upload_variants.resolver(
+        reg.comprobante_path, variant, reg.comprobante_mime
     )
+    return servir_archivo(request, path, media_type=media_type, filename=filename)
+
+
+STATS_LOTE_MAX = 200
+
+
+class ExamStatsOut(BaseModel):
+    exam_id: int
+    cupo_total: int
+    ocupados: int                       # PREINSCRITA + VALIDADA
+    apartados: int                      # PlacementHold vigentes
+    disponibles: int
+    preinscritas: int
+    validadas: int
+    rechazadas: int
+    canceladas: int
+    importe_registrado_centavos: int    # pagos de registros activos
+    importe_validado_centavos: int      # pagos de registros VALIDADA
+
+
+def _stats_examenes(db: Session, *filtros) -> List[ExamStatsOut]:
+    """
+    Un solo GROUP BY (examen ⟕ registros ⟕ apartados agregados) con conteos por estatus
+    y totales de pago para los exámenes que cumplan `filtros` (a lo más STATS_LOTE_MAX + 1,
+    para que el llamador detecte si el filtro abarca más del máximo).
+    """
+    R, S = PlacementRegistro, PlacementRegistroStatus
+    holds = (
+        db.query(PlacementHold.exam_id.label("exam_id"), func.count(PlacementHold.id).label("n"))
+        .filter(hold_vigente())
+        .group_by(PlacementHold.exam_id)
+        .subquery()
+    )
+    activos = R.status.in_(ACTIVE_REG_STATUSES)
+
+    def _por_status(st):
+        return func.count(R.id).filter(R.status == st)
+
+    rows = (
+        db.query(
+            PlacementExam.id,
+            PlacementExam.cupo_total,
+            func.coalesce(holds.c.n, 0),
+            func.count(R.id).filter(activos),
+            _por_status(S.PREINSCRITA),
+            _por_status(S.VALIDADA),
+            _por_status(S.RECHAZADA),
+            _por_status(S.CANCELADA),
+            func.coalesce(func.sum(R.importe_centavos).filter(activos), 0),
+            func.coalesce(func.sum(R.importe_centavos).filter(R.status == S.VALIDADA), 0),
+        )
+        .outerjoin(R, R.exam_id == PlacementExam.id)
+        .outerjoin(holds, holds.c.exam_id == PlacementExam.id)
+        .filter(*filtros)
+        .group_by(PlacementExam.id, PlacementExam.cupo_total, holds.c.n)
+        .order_by(
+            PlacementExam.fecha.asc().nullslast(),
+            PlacementExam.hora.asc().nullslast(),
+            PlacementExam.id.asc(),
+        )
+        .limit(STATS_LOTE_MAX + 1)
+        .all()
+    )
+
+    out: List[ExamStatsOut] = []
+    for eid, cupo, apartados, ocupados, pre, val, rech, canc, imp_reg, imp_val in rows:
+        cupo = int(cupo or 0)
+        out.append(ExamStatsOut(
+            exam_id=eid,
+            cupo_total=cupo,
+            ocupados=ocupados,
+            apartados=apartados,
+            disponibles=max(0, cupo - ocupados - apartados),
+            preinscritas=pre,
+            validadas=val,
+            rechazadas=rech,
+            canceladas=canc,
+            importe_registrado_centavos=imp_reg,
+            importe_validado_centavos=imp_val,
+        ))
+    return out
 
 
 # ───────────────────────────────────────────────────────────────────────────────
 # NUEVO: Stats de cupo/ocupación para coordinación
 # ───────────────────────────────────────────────────────────────────────────────
+@router.get("/stats-admin/lote", response_model=List[ExamStatsOut])
+def stats_admin_lote(
+    ids: Optional[str] = Query(None, description="ids separados por coma"),
+    idioma: Optional[str] = None,
+    estado: Optional[str] = None,
+    fecha_from: Optional[date] = None,
+    fecha_to: Optional[date] = None,
+    db: Session = Depends(get_db),
+    _: User = Depends(require_coordinator_or_admin),
+):
+    """
+    Stats de muchos exámenes en una llamada (reemplaza un /stats-admin por tarjeta).
+    Por `ids` o por filtro (idioma/estado/rango de fecha); máximo STATS_LOTE_MAX exámenes:
+    si el filtro abarca más, 422 (no se recorta en silencio).
+    """
+    filtros = []
+    if ids is not None:
+        try:
+            lista = sorted({int(x) for x in ids.split(",") if x.strip()})
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Parámetro ids inválido")
+        if len(lista) > STATS_LOTE_MAX:
+            raise HTTPException(status_code=422, detail=f"Máximo {STATS_LOTE_MAX} exámenes por llamada")
+        if not lista:
+            return []
+        filtros.append(PlacementExam.id.in_(lista))
+    if idioma:
+        filtros.append(PlacementExam.idioma == idioma)
+    if estado:
+        filtros.append(PlacementExam.estado == estado)
+    if fecha_from and fecha_to and fecha_from > fecha_to:
+        raise HTTPException(status_code=422, detail="fecha_from debe ser ≤ fecha_to")
+    if fecha_from:
+        filtros.append(PlacementExam.fecha >= fecha_from)
+    if fecha_to:
+        filtros.append(PlacementExam.fecha <= fecha_to)
+    if not filtros:
+        raise HTTPException(status_code=422, detail="Indica ids o al menos un filtro")
+
+    stats = _stats_examenes(db, *filtros)
+    if len(stats) > STATS_LOTE_MAX:
+        raise HTTPException(
+            status_code=422,
+            detail=f"El filtro abarca más de {STATS_LOTE_MAX} exámenes; acota idioma/estado/fechas",
+        )
+    return stats
+
+
 @router.get("/{exam_id}/stats-admin")
 def stats_admin(
     exam_id: int,
@@ -213,30 +453,17 @@ def stats_admin(
     """
     Regresa { cupo_total, ocupados, disponibles } del examen.
     - ocupados: cantidad de registros en PREINSCRITA o VALIDADA
+    - disponibles: descuenta también los apartados vigentes (mismo cálculo que el lote)
     """
-    exam = db.get(PlacementExam, exam_id)  # type: ignore[attr-defined]
-    if not exam:
+    stats = _stats_examenes(db, PlacementExam.id == exam_id)
+    if not stats:
         raise HTTPException(status_code=404, detail="Examen no encontrado")
-
-    ocupados = (
-        db.query(func.count(PlacementRegistro.id))
-        .filter(
-            PlacementRegistro.exam_id == exam_id,
-            PlacementRegistro.status.in_(ACTIVE_REG_STATUSES),
-        )
-        .scalar()
-        or 0
-    )
-
-    cupo_total = getattr(exam, "cupo_total", None)
-    disponibles = None
-    if isinstance(cupo_total, int):
-        disponibles = max(0, cupo_total - int(ocupados))
+    st = stats[0]
 
     return {
-        "cupo_total": cupo_total,
-        "ocupados": int(ocupados),
-        "disponibles": disponibles,
+        "cupo_total": st.cupo_total,
+        "ocupados": st.ocupados,
+        "disponibles": st.disponibles,
     }
 
 
@@ -1,10 +1,12 @@
 # routers/placement_teacher.py
 from __future__ import annotations
 
-from typing import List, Tuple
+import os
+from typing import Iterable, List, Literal, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile, status
+from pydantic import BaseModel, Field, constr
+from sqlalchemy import Integer, String, column, func, update, values
 from sqlalchemy.orm import Session, joinedload
 
 from app.database import get_db
@@ -21,6 +23,7 @@ from app.schemas import (
     NivelIdiomaUpdate,
 )
 from app.auth import get_current_user  # ajusta si tu dependencia se llama distinto
+from app.import_utils import iter_filas, norm_header, norm_id
 
 router = APIRouter(prefix="/placement-exams", tags=["placement-teacher"])
 
@@ -219,3 +222,237 @@ def patch_registro_nivel_generico(
     me: User = Depends(require_teacher_or_admin),
 ):
     return actualizar_nivel_por_registro(registro_id, payload, db, me)
+
+
+# ───────────────────────────────────────────────────────────────────────────────
+# Niveles en lote (JSON o CSV/XLSX)
+# ───────────────────────────────────────────────────────────────────────────────
+# Columnas aceptadas para identificar el registro (en orden de preferencia)
+COLUMNAS_ID_REGISTRO = ("registro_id", "boleta", "email")
+COLUMNAS_NIVEL = ("nivel", "nivel_idioma", "nivel_asignado")
+NIVELES_IMPORT_MAX_MB = 5
+
+
+class NivelLoteItem(BaseModel):
+    registro_id: Optional[int] = None
+    boleta: Optional[str] = None
+    email: Optional[str] = None
+    nivel: constr(strip_whitespace=True, min_length=1, max_length=20)
+
+
+class NivelLoteIn(BaseModel):
+    items: List[NivelLoteItem] = Field(..., min_length=1, max_length=2000)
+
+
+class NivelLoteFilaOut(BaseModel):
+    fila: int
+    identificador: Optional[str] = None
+    registro_id: Optional[int] = None
+    estado: Literal["actualizado", "sin_cambio", "error"]
+    motivo: Optional[str] = None
+
+
+class NivelLoteOut(BaseModel):
+    total: int
+    actualizados: int
+    sin_cambio: int
+    con_error: int
+    filas: List[NivelLoteFilaOut]
+
+
+def _exam_del_docente(db: Session, exam_id: int, me: User) -> PlacementExam:
+    exam = db.query(PlacementExam).filter(PlacementExam.id == exam_id).first()
+    if not exam:
+        raise HTTPException(status_code=404, detail="Examen no encontrado")
+    if (exam.docente_id != me.id) and (me.role not in (UserRole.superuser, UserRole.coordinator)):
+        raise HTTPException(status_code=403, detail="No autorizado para modificar este examen")
+    return exam
+
+
+def _lookup_registros(db: Session, exam_id: int) -> tuple[dict, dict]:
+    """
+    Una sola consulta: registros del examen + boleta/email del alumno.
+    Regresa (lookup (columna, valor) → registro_id, {registro_id: (status, nivel actual)}).
+    Si un alumno tiene varios registros (p.ej. uno cancelado) gana el VALIDADA.
+    """
+    rows = (
+        db.query(
+            PlacementRegistro.id,
+            PlacementRegistro.status,
+            PlacementRegistro.nivel_idioma,
+            User.boleta,
+            User.email,
+        )
+        .join(User, User.id == PlacementRegistro.alumno_id)
+        .filter(PlacementRegistro.exam_id == exam_id)
+        .order_by(PlacementRegistro.created_at.asc(), PlacementRegistro.id.asc())
+        .all()
+    )
+    lookup: dict = {}
+    info: dict = {}
+    for r in rows:
+        info[r.id] = (r.status, r.nivel_idioma)
+        lookup[("registro_id", str(r.id))] = r.id
+        for llave in (
+            ("boleta", (r.boleta or "").strip()),
+            ("email", (r.email or "").strip().lower()),
+        ):
+            if not llave[1]:
+                continue
+            previo = lookup.get(llave)
+            if previo is None or info[previo][0] != PlacementRegistroStatus.VALIDADA:
+                lookup[llave] = r.id
+    return lookup, info
+
+
+def _aplicar_niveles(
+    db: Session, exam_id: int, entradas: Iterable[Tuple[int, str, str, Optional[str]]]
+) -> NivelLoteOut:
+    """
+    `entradas`: (fila, columna_id, identificador normalizado, nivel crudo).
+    Resuelve todo contra un solo prefetch y aplica los cambios con un único UPDATE ... FROM (VALUES ...).
+    Mismas reglas que el PATCH individual: sólo registros VALIDADA, nivel en mayúsculas.
+    """
+    lookup, info = _lookup_registros(db, exam_id)
+
+    filas: List[NivelLoteFilaOut] = []
+    cambios: dict[int, str] = {}
+    fila_de: dict[int, NivelLoteFilaOut] = {}
+
+    for n, col, ident, nivel_raw in entradas:
+        def _error(motivo: str, reg_id: Optional[int] = None):
+            filas.append(NivelLoteFilaOut(fila=n, identificador=ident or None, registro_id=reg_id, estado="error", motivo=motivo))
+
+        if not ident:
+            _error(f"Sin {col}")
+            continue
+        reg_id = lookup.get((col, ident))
+        if reg_id is None:
+            _error("No corresponde a ningún registro de este examen")
+            continue
+        if reg_id in fila_de:
+            _error(f"Registro repetido (ya aparece en la fila {fila_de[reg_id].fila})", reg_id)
+            continue
+        nivel = (nivel_raw or "").strip().upper()
+        if not nivel:
+            _error("Sin nivel", reg_id)
+            continue
+        if len(nivel) > 20:
+            _error("Nivel demasiado largo (máx. 20)", reg_id)
+            continue
+        estado_reg, nivel_actual = info[reg_id]
+        if estado_reg != PlacementRegistroStatus.VALIDADA:
+            nombre = getattr(estado_reg, "name", None) or str(estado_reg)
+            _error(f"Registro en estado '{nombre}'. Debe estar VALIDADA.", reg_id)
+            continue
+
+        out = NivelLoteFilaOut(fila=n, identificador=ident, registro_id=reg_id, estado="actualizado")
+        if nivel_actual == nivel:
+            out.estado = "sin_cambio"
+        else:
+            cambios[reg_id] = nivel
+        fila_de[reg_id] = out
+        filas.append(out)
+
+    if cambios:
+        v = values(column("id", Integer), column("nivel", String), name="v").data(list(cambios.items()))
+        aplicados = set(
+            db.execute(
+                update(PlacementRegistro)
+                .where(
+                    PlacementRegistro.id == v.c.id,
+                    PlacementRegistro.exam_id == exam_id,
+                    # Re-chequeo: el status pudo cambiar entre el prefetch y el UPDATE
+                    PlacementRegistro.status == PlacementRegistroStatus.VALIDADA,
+                )
+                .values(nivel_idioma=v.c.nivel)
+                .returning(PlacementRegistro.id)
+                .execution_options(synchronize_session=False)
+            ).scalars()
+        )
+        db.commit()
+        for reg_id in cambios.keys() - aplicados:
+            fila_de[reg_id].estado = "error"
+            fila_de[reg_id].motivo = "El registro dejó de estar VALIDADA"
+
+    return NivelLoteOut(
+        total=len(filas),
+        actualizados=sum(f.estado == "actualizado" for f in filas),
+        sin_cambio=sum(f.estado == "sin_cambio" for f in filas),
+        con_error=sum(f.estado == "error" for f in filas),
+        filas=filas,
+    )
+
+
+@router.post("/{exam_id}/niveles", response_model=NivelLoteOut)
+def asignar_niveles_lote(
+    exam_id: int,
+    payload: NivelLoteIn,
+    db: Session = Depends(get_db),
+    me: User = Depends(require_teacher_or_admin),
+):
+    """
+    Asigna `nivel_idioma` a muchos registros del examen en una sola solicitud.
+    Cada item se identifica por registro_id, boleta o email (en ese orden de preferencia).
+    Los items inválidos no detienen el lote: se reportan fila por fila.
+    """
+    _exam_del_docente(db, exam_id, me)
+
+    def _entradas():
+        for n, it in enumerate(payload.items, start=1):
+            col = next((c for c in COLUMNAS_ID_REGISTRO if getattr(it, c) not in (None, "")), "registro_id")
+            raw = getattr(it, col)
+            yield n, col, norm_id(col, raw) if raw not in (None, "") else "", it.nivel
+
+    return _aplicar_niveles(db, exam_id, _entradas())
+
+
+@router.post("/{exam_id}/niveles/importar", response_model=NivelLoteOut)
+def importar_niveles(
+    exam_id: int,
+    archivo: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    me: User = Depends(require_teacher_or_admin),
+):
+    """
+    Importa resultados desde CSV/XLSX.
+    - Encabezados: una columna de identificación (registro_id | boleta | email)
+      y una de nivel (nivel | nivel_idioma | nivel_asignado).
+    - `fila` en la respuesta es el número de renglón del archivo (el encabezado es la 1).
+    """
+    _exam_del_docente(db, exam_id, me)
+
+    archivo.file.seek(0, os.SEEK_END)
+    if archivo.file.tell() > NIVELES_IMPORT_MAX_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"El archivo excede {NIVELES_IMPORT_MAX_MB}MB")
+    archivo.file.seek(0)
+
+    filas = iter_filas(archivo)
+    encabezado = next(filas, None)
+    if not encabezado:
+        raise HTTPException(status_code=400, detail="El archivo está vacío")
+
+    alias = {"id": "registro_id", "id_registro": "registro_id", "registro": "registro_id"}
+    headers = [alias.get(h, h) for h in (norm_header(h) for h in encabezado)]
+    col_id = next((c for c in COLUMNAS_ID_REGISTRO if c in headers), None)
+    if col_id is None:
+        raise HTTPException(status_code=400, detail="Falta columna de identificación (registro_id, boleta o email)")
+    col_nivel = next((c for c in COLUMNAS_NIVEL if c in headers), None)
+    if col_nivel is None:
+        raise HTTPException(status_code=400, detail="Falta columna de nivel (nivel, nivel_idioma o nivel_asignado)")
+    idx_id, idx_nivel = headers.index(col_id), headers.index(col_nivel)
+
+    def _entradas():
+        for n, row in enumerate(filas, start=2):
+            if not row or all(c is None or str(c).strip() == "" for c in row):
+                continue
+            raw = row[idx_id] if idx_id < len(row) else None
+            nivel = row[idx_nivel] if idx_nivel < len(row) else None
+            yield (
+                n,
+                col_id,
+                norm_id(col_id, raw) if raw not in (None, "") else "",
+                None if nivel is None else str(nivel),
+            )
+
+    return _aplicar_niveles(db, exam_id, _entradas())
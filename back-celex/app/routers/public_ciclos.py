@@ -2,10 +2,11 @@
 from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, func
-from typing import Optional, List
+from typing import Optional
 
 from ..database import get_db
 from ..models import Ciclo
+from ..pagination import TotalMode, listing_total, page_with_cursor, total_pages
 try:
     # si tienes el modelo de inscripciones
     from ..models import Inscripcion
@@ -29,6 +30,8 @@ def list_ciclos_abiertos(
     modalidad: Optional[str] = None,
     turno: Optional[str] = None,
     nivel: Optional[str] = None,
+    cursor: Optional[str] = Query(None, description="next_cursor de la respuesta anterior (ignora page)"),
+    total_mode: TotalMode = Query("exact", alias="total", description="exact | estimate | none"),
     db: Session = Depends(get_db),
 ):
     """
@@ -76,21 +79,27 @@ def list_ciclos_abiertos(
     # Solo periodos de inscripción vigentes (hoy dentro del rango)
     query = query.filter(and_(insc_ini_col <= hoy, insc_fin_col >= hoy))
 
-    total = query.count()
-    pages = max(1, (total + page_size - 1) // page_size)
-    page = min(page, pages)
+    # El total es el mismo para todos los visitantes con los mismos filtros: con cursor se cachea
+    cache_key = ("ciclos_abiertos", hoy, q, idioma, modalidad, turno, nivel) if cursor else None
+    total = listing_total(db, query, total_mode, cache_key)
+    pages = total_pages(total, page_size)
+    if pages is not None:
+        page = min(page, pages)
 
     # ==== ORDEN PRINCIPAL: inicio de inscripción ASC (más antiguos primero)
-    # Desempate: codigo ASC (case-insensitive)
-    rows: List[Ciclo] = (
-        query.order_by(
-            insc_ini_col.asc(),
-            func.lower(getattr(Ciclo, "codigo")).asc(),
-        )
-        .offset((page - 1) * page_size)
-        .limit(page_size)
-        .all()
+    # Desempate: codigo ASC (case-insensitive), luego id para que la llave keyset sea única.
+    # La llave del cursor usa el lower() de Postgres (seleccionado), no el de Python: difieren fuera de ASCII
+    codigo_lower = func.lower(getattr(Ciclo, "codigo"))
+    filas, next_cursor = page_with_cursor(
+        query.add_columns(codigo_lower.label("codigo_lower")),
+        [insc_ini_col, codigo_lower, Ciclo.id],
+        page_size,
+        cursor,
+        desc=False,
+        key=lambda r: [getattr(r.Ciclo, insc_ini_col.key), r.codigo_lower, r.Ciclo.id],
+        offset=(page - 1) * page_size,
     )
+    rows = [r.Ciclo for r in filas]
 
     # Estados que consideramos "ocupando lugar"
     ACTIVE = {"registrada", "preinscrita", "confirmada"}
@@ -208,4 +217,4 @@ def list_ciclos_abiertos(
             "modalidad_asistencia": getattr(c, "modalidad_asistencia", None),
         })
 
-    return {"items": items, "page": page, "pages": pages, "total": total}
+    return {"items": items, "page": page, "pages": pages, "total": total, "next_cursor": next_cursor}
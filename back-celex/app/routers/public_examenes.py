@@ -1,23 +1,18 @@
 # app/routers/public_examenes.py
-from fastapi import APIRouter, Depends, Query, HTTPException, Body
+import asyncio
+import json
+
+from fastapi import APIRouter, Depends, Query, HTTPException, Body, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func, literal_column, case
+from sqlalchemy import and_, or_, func, case
 from typing import Optional, List, Dict, Any
 from datetime import date, datetime, timezone
 
 from ..database import get_db
 from ..models import PlacementExam
-
-# Modelos opcionales (capacidad / holds)
-try:
-    from ..models import PlacementRegistro  # registros/inscripciones al examen
-except Exception:
-    PlacementRegistro = None
-
-try:
-    from ..models import PlacementHold  # reservaciones temporales de asientos
-except Exception:
-    PlacementHold = None
+from .. import placement_capacity
 
 router = APIRouter(prefix="/public", tags=["public"])
 
@@ -48,91 +43,27 @@ def _int_or_0(v) -> int:
     except Exception:
         return 0
 
-# Estados que consideramos "consumen lugar" en PlacementRegistro
-ACTIVE_REG_STATES = {"pendiente", "preinscrita", "confirmada", "validada"}
-
 def _capacity_map(db: Session, exam_ids: List[int]) -> Dict[str, Any]:
     """
-    Calcula capacidad por examen y devuelve:
+    Capacidad por examen desde la ocupación en memoria (placement_capacity):
       { "<id>": { cupo_total, inscritos_count, holds_activos, cupo_restante } }
+    Sólo va a la BD por los ids que no están en memoria o ya vencieron.
     """
-    out: Dict[str, Any] = {}
     if not exam_ids:
-        return out
+        return {}
+    return placement_capacity.broadcaster.snapshot(db, exam_ids)
 
-    # Columnas tolerantes a distintos esquemas
-    total_col = _first_col(PlacementExam, ["cupo_total", "capacidad_total", "cupo", "capacidad"])
 
-    # 1) cupo_total
-    if total_col is not None:
-        rows = (
-            db.query(PlacementExam.id.label("eid"), total_col.label("total"))
-              .filter(PlacementExam.id.in_(exam_ids))
-              .all()
-        )
-        cupos = {r.eid: _int_or_0(r.total) for r in rows}
-    else:
-        cupos = {eid: 0 for eid in exam_ids}
-
-    # 2) registros que ocupan asiento
-    regs_map: Dict[int, int] = {eid: 0 for eid in exam_ids}
-    if PlacementRegistro is not None:
-        reg_exam_id_col = _first_col(PlacementRegistro, ["exam_id", "placement_exam_id", "examen_id"])
-        reg_status_col  = _first_col(PlacementRegistro, ["estado", "status", "estatus"])
-
-        if reg_exam_id_col is not None:
-            q = db.query(
-                reg_exam_id_col.label("eid"),
-                func.count(literal_column("*")).label("cnt"),
-            ).filter(reg_exam_id_col.in_(exam_ids))
-
-            if reg_status_col is not None:
-                q = q.filter(func.lower(reg_status_col).in_(ACTIVE_REG_STATES))
-
-            q = q.group_by(reg_exam_id_col)
-            for eid, cnt in q.all():
-                regs_map[int(eid)] = _int_or_0(cnt)
-
-    # 3) holds activos
-    holds_map: Dict[int, int] = {eid: 0 for eid in exam_ids}
-    if PlacementHold is not None:
-        hold_exam_id_col   = _first_col(PlacementHold, ["exam_id", "placement_exam_id", "examen_id"])
-        hold_expires_col   = _first_col(PlacementHold, ["expires_at", "expira_en"])
-        hold_released_col  = _first_col(PlacementHold, ["released", "is_released", "liberado"])
-        hold_released_at   = _first_col(PlacementHold, ["released_at", "liberado_en"])
-
-        if hold_exam_id_col is not None and hold_expires_col is not None:
-            conds = [hold_exam_id_col.in_(exam_ids), hold_expires_col > _now_utc()]
-            if hold_released_col is not None:
-                conds.append(or_(hold_released_col.is_(None), hold_released_col.is_(False)))
-            if hold_released_at is not None:
-                conds.append(hold_released_at.is_(None))
-
-            qh = (
-                db.query(
-                    hold_exam_id_col.label("eid"),
-                    func.count(literal_column("*")).label("cnt"),
-                )
-                .filter(and_(*conds))
-                .group_by(hold_exam_id_col)
-            )
-            for eid, cnt in qh.all():
-                holds_map[int(eid)] = _int_or_0(cnt)
-
-    # 4) ensamblar
-    for eid in exam_ids:
-        total = _int_or_0(cupos.get(eid, 0))
-        insc  = _int_or_0(regs_map.get(eid, 0))
-        hact  = _int_or_0(holds_map.get(eid, 0))
-        restante = max(total - insc - hact, 0)
-        out[str(eid)] = {
-            "id": eid,
-            "cupo_total": total,
-            "inscritos_count": insc,
-            "holds_activos": hact,
-            "cupo_restante": restante,
-        }
-    return out
+def _parse_ids_csv(ids: str) -> List[int]:
+    try:
+        return [int(x) for x in ids.split(",") if x.strip()]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Parámetro ids inválido")
+
+
+def _sse(event: str, data: Any, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
 
 # =============== Endpoints ===============
 
@@ -325,11 +256,60 @@ def get_placement_exams_capacity(
     db: Session = Depends(get_db),
 ):
     """Devuelve capacidad por lote. No requiere auth."""
-    try:
-        exam_ids = [int(x) for x in ids.split(",") if x.strip()]
-    except Exception:
+    return _capacity_map(db, _parse_ids_csv(ids))
+
+
+@router.get("/placement-exams/capacity/stream")
+async def stream_placement_exams_capacity(
+    request: Request,
+    ids: str = Query(..., description="CSV de IDs, p.ej. 1, 9, 8, 10"),
+):
+    """
+    Server-Sent Events con la capacidad de los exámenes pedidos. No requiere auth.
+      - event: snapshot → estado completo (al conectar y si el cliente se atrasa)
+      - event: capacity → sólo los exámenes que cambiaron
+      - comentarios ': keepalive' cada PLACEMENT_CAPACITY_KEEPALIVE segundos
+    Sustituye el polling de GET/POST /placement-exams/capacity.
+    """
+    exam_ids = _parse_ids_csv(ids)
+    if not exam_ids:
         raise HTTPException(status_code=400, detail="Parámetro ids inválido")
-    return _capacity_map(db, exam_ids)
+    if len(exam_ids) > 200:
+        raise HTTPException(status_code=400, detail="Máximo 200 exámenes por suscripción")
+
+    bc = placement_capacity.broadcaster
+    # Se suscribe antes del snapshot para no perder cambios entre ambos
+    sub = bc.suscribir(exam_ids)
+
+    async def eventos():
+        try:
+            yield "retry: 3000\n\n"
+            snap = await run_in_threadpool(placement_capacity.snapshot, exam_ids)
+            yield _sse("snapshot", snap, bc.seq)
+            while not await request.is_disconnected():
+                try:
+                    evento = await asyncio.wait_for(
+                        sub.queue.get(), timeout=placement_capacity.PLACEMENT_CAPACITY_KEEPALIVE
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if sub.resync:
+                    sub.resync = False
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    snap = await run_in_threadpool(placement_capacity.snapshot, exam_ids)
+                    yield _sse("snapshot", snap, bc.seq)
+                else:
+                    yield _sse("capacity", evento["data"], evento["seq"])
+        finally:
+            bc.desuscribir(sub)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/placement-exams/capacity")
@@ -167,10 +167,11 @@ class TokenResponse(BaseModel):
 
 class CoordinatorListResponse(BaseModel):
     items: List[UserOut]
-    total: int
+    total: Optional[int] = None   # null con total=none
     page: int
     page_size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # keyset: pásalo como ?cursor= para la siguiente página
 
 
 class ToggleActiveRequest(BaseModel):
@@ -347,10 +348,11 @@ class CicloOut(CicloBase):
 
 class CicloListResponse(BaseModel):
     items: List[CicloOut]
-    total: int
+    total: Optional[int] = None   # null con total=none
     page: int
     page_size: int
-    pages: int
+    pages: Optional[int] = None
+    next_cursor: Optional[str] = None  # keyset: pásalo como ?cursor= para la siguiente página
 
 
 # ==========================
@@ -494,6 +496,30 @@ class EvaluacionListOut(BaseModel):
     items: list[EvaluacionOut]
 
 
+# Captura de calificaciones de todo el grupo en una sola petición
+class EvaluacionBatchItemIn(EvaluacionUpsertIn):
+    inscripcion_id: int
+
+
+class EvaluacionBatchIn(BaseModel):
+    items: list[EvaluacionBatchItemIn] = Field(default_factory=list, max_length=500)
+
+
+# Importación de calificaciones desde CSV/XLSX
+class EvaluacionImportErrorOut(BaseModel):
+    fila: int
+    identificador: Optional[str] = None
+    motivo: str
+
+
+class EvaluacionImportOut(BaseModel):
+    total_filas: int
+    aplicadas: int
+    con_error: int
+    errores: list[EvaluacionImportErrorOut] = Field(default_factory=list)
+    reporte_id: Optional[str] = None  # descarga: GET .../importar/reportes/{reporte_id}
+
+
 class AlumnoHistorialItem(BaseModel):
     inscripcion_id: int
     ciclo_id: int
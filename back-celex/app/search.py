@@ -0,0 +1,130 @@
+# app/search.py
+"""
+Expresiones de búsqueda que aprovechan los índices de db_upgrades.
+
+Las expresiones deben coincidir *textualmente* con las de los índices para que
+Postgres los use; por eso se construyen sólo aquí.
+"""
+import re
+import unicodedata
+from typing import Optional
+
+from sqlalchemy import and_, cast, func, literal_column, or_, text
+from sqlalchemy.dialects.postgresql import DOUBLE_PRECISION
+from sqlalchemy.orm import Session
+
+from .models import SurveyAnswer, User
+
+FTS_CONFIG = literal_column("'spanish'")
+
+
+def _tsquery_prefijo(q: str) -> Optional[str]:
+    """'buen profe' -> 'buen:* & profe:*' (coincide por prefijo, como el ILIKE anterior)."""
+    tokens = re.findall(r"\w+", q or "", flags=re.UNICODE)
+    if not tokens:
+        return None
+    return " & ".join(f"{t}:*" for t in tokens[:8])
+
+
+def comentario_tsvector():
+    """Mismo documento que ix_survey_answers_value_text_fts."""
+    return func.to_tsvector(FTS_CONFIG, func.coalesce(SurveyAnswer.value_text, literal_column("''")))
+
+
+def comentario_match(q: str):
+    """
+    Filtro full-text sobre SurveyAnswer.value_text (o None si q no tiene palabras).
+    Usa el índice GIN ix_survey_answers_value_text_fts.
+    """
+    tsq = _tsquery_prefijo(q)
+    if tsq is None:
+        return None
+    return comentario_tsvector().op("@@")(func.to_tsquery(FTS_CONFIG, tsq))
+
+
+# ==========================================================
+# Personas (alumnos / docentes / coordinadores)
+# ==========================================================
+# Documento de búsqueda: nombre + apellidos + email + CURP + boleta, en minúsculas y sin acentos.
+# Índice: ix_users_search_trgm (GIN gin_trgm_ops) en db_upgrades, sobre esta misma expresión.
+PERSONA_DOC_SQL = (
+    "f_unaccent(lower("
+    "coalesce(first_name, '') || ' ' || coalesce(last_name, '') || ' ' || "
+    "coalesce(email, '') || ' ' || coalesce(curp, '') || ' ' || coalesce(boleta, '')"
+    "))"
+)
+
+_SEP = literal_column("' '")
+_VACIO = literal_column("''")
+
+_trgm_ok: Optional[bool] = None
+
+
+def persona_documento():
+    """Equivalente SQLAlchemy de PERSONA_DOC_SQL sobre la tabla users."""
+    partes = [User.first_name, User.last_name, User.email, User.curp, User.boleta]
+    doc = func.coalesce(partes[0], _VACIO)
+    for col in partes[1:]:
+        doc = doc.op("||")(_SEP).op("||")(func.coalesce(col, _VACIO))
+    return func.f_unaccent(func.lower(doc))
+
+
+def normaliza(q: str) -> str:
+    """Minúsculas y sin acentos (mismo criterio que unaccent para el español)."""
+    q = unicodedata.normalize("NFKD", q or "")
+    return "".join(ch for ch in q if not unicodedata.combining(ch)).lower().strip()
+
+
+def _escape_like(s: str) -> str:
+    return s.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def trgm_disponible(db: Session) -> bool:
+    """¿Existen pg_trgm y f_unaccent? (se consulta una vez por proceso)."""
+    global _trgm_ok
+    if _trgm_ok is None:
+        try:
+            _trgm_ok = bool(db.execute(text(
+                "SELECT to_regprocedure('f_unaccent(text)') IS NOT NULL "
+                "AND EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')"
+            )).scalar())
+        except Exception:
+            db.rollback()
+            _trgm_ok = False
+    return _trgm_ok
+
+
+def filtro_personas(db: Session, q: Optional[str]):
+    """
+    Búsqueda de usuarios compartida por los listados de coordinación/admin.
+    Regresa (condición, ranking) o (None, None) si q está vacío.
+
+    - Con pg_trgm: cada palabra debe aparecer (LIKE '%palabra%' sobre el documento,
+      servido por el índice trigram), sin importar acentos; el ranking es
+      word_similarity(q, documento) para ordenar los mejores primero.
+    - Sin las extensiones: ILIKE por campo como antes y sin ranking.
+    """
+    if not q or not q.strip():
+        return None, None
+
+    if not trgm_disponible(db):
+        like = f"%{q.strip()}%"
+        cond = or_(
+            User.first_name.ilike(like),
+            User.last_name.ilike(like),
+            User.email.ilike(like),
+            User.curp.ilike(like),
+            User.boleta.ilike(like),
+        )
+        return cond, None
+
+    term = normaliza(q)
+    tokens = [t for t in re.split(r"\s+", term) if t][:8]
+    if not tokens:
+        return None, None
+    doc = persona_documento()
+    conds = [doc.like(f"%{_escape_like(t)}%") for t in tokens]  # "\" es el escape por omisión de LIKE
+    # word_similarity es real (float4); en double el valor que viaja en el cursor (JSON)
+    # es exactamente el que se compara en el keyset, sin repetir ni saltar empates
+    rank = cast(func.word_similarity(term, doc), DOUBLE_PRECISION)
+    return and_(*conds), rank
@@ -0,0 +1,160 @@
+# app/upload_gc.py
+"""
+Recolector de archivos subidos huérfanos.
+
+Los comprobantes se escriben a disco antes del commit y no todos los caminos
+de error/cancelación los borran. Aquí:
+  1) una sola consulta (UNION ALL de todas las columnas `*_path` del esquema,
+     leída en streaming) arma el conjunto de nombres referenciados;
+  2) se recorren los directorios de subida con os.scandir (sin listar todo
+     en memoria);
+  3) lo no referenciado y más viejo que el periodo de gracia se borra o se
+     mueve a cuarentena.
+
+Se compara por nombre de archivo (uuid4): la BD guarda rutas absolutas,
+relativas o de otro host, y la descarga ya resuelve por basename como
+último recurso, así que cualquier coincidencia cuenta como referencia.
+"""
+import logging
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Literal, Set
+
+from sqlalchemy import String, select, union_all
+from sqlalchemy.orm import Session
+
+from .database import Base
+from . import models  # noqa: F401  (registra todas las tablas en Base.metadata)
+from .upload_variants import VARIANTES_SUBDIR, original_de
+
+logger = logging.getLogger("celex.upload_gc")
+
+GcModo = Literal["borrar", "cuarentena"]
+
+# Directorios con archivos de usuario (mismos env/default que los routers que escriben)
+UPLOAD_DIRS = {
+    "comprobantes":    os.getenv("PAYMENT_UPLOAD_DIR", "uploads/comprobantes"),
+    "estudios":        os.getenv("STUDIES_UPLOAD_DIR", "uploads/estudios"),
+    "exenciones":      os.getenv("EXENCION_UPLOAD_DIR", "uploads/exenciones"),
+    "placement_pagos": os.getenv("PLACEMENT_PAGOS_UPLOAD_DIR", "uploads/placement_pagos"),
+}
+UPLOAD_GC_GRACE_HOURS = int(os.getenv("UPLOAD_GC_GRACE_HOURS", "24"))
+UPLOAD_GC_QUARANTINE_DIR = os.getenv("UPLOAD_GC_QUARANTINE_DIR", "uploads/_cuarentena")
+
+_YIELD_PER = 5000
+
+
+@dataclass
+class GcReporte:
+    modo: str
+    dry_run: bool
+    referenciados: int = 0
+    revisados: int = 0
+    recientes: int = 0
+    huerfanos: int = 0
+    bytes_recuperados: int = 0
+    errores: int = 0
+    por_directorio: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+
+def _path_columns() -> List:
+    """Todas las columnas String cuyo nombre termina en `_path` (incluye las que se agreguen después)."""
+    cols = []
+    for table in Base.metadata.sorted_tables:
+        for col in table.columns:
+            if col.name.endswith("_path") and isinstance(col.type, String):
+                cols.append(col)
+    return cols
+
+
+def nombres_referenciados(db: Session) -> Set[str]:
+    """Basenames de todas las rutas guardadas en BD; una consulta leída por lotes."""
+    cols = _path_columns()
+    if not cols:
+        return set()
+    stmt = union_all(*[select(c.label("p")).where(c.isnot(None)) for c in cols])
+    result = db.execute(stmt.execution_options(stream_results=True, yield_per=_YIELD_PER))
+    nombres: Set[str] = set()
+    for (p,) in result:
+        base = os.path.basename(p.replace("\\", "/").rstrip("/"))
+        if base:
+            nombres.add(base)
+    return nombres
+
+
+def _archivos(root: str) -> Iterator[os.DirEntry]:
+    """Recorre `root` recursivamente con scandir (streaming)."""
+    pendientes = [root]
+    while pendientes:
+        d = pendientes.pop()
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        pendientes.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        yield entry
+        except FileNotFoundError:
+            continue
+
+
+def recolectar(
+    db: Session,
+    modo: GcModo = "cuarentena",
+    gracia_horas: int = UPLOAD_GC_GRACE_HOURS,
+    dry_run: bool = False,
+) -> GcReporte:
+    """Borra o pone en cuarentena los archivos de UPLOAD_DIRS que ninguna fila referencia."""
+    referenciados = nombres_referenciados(db)
+    rep = GcReporte(modo=modo, dry_run=dry_run, referenciados=len(referenciados))
+    limite = time.time() - gracia_horas * 3600
+    cuarentena = os.path.abspath(UPLOAD_GC_QUARANTINE_DIR)
+
+    for nombre, d in UPLOAD_DIRS.items():
+        root = os.path.abspath(d)
+        stats = {"revisados": 0, "huerfanos": 0, "bytes": 0}
+        rep.por_directorio[nombre] = stats
+        for entry in _archivos(root):
+            stats["revisados"] += 1
+            rep.revisados += 1
+            if entry.name in referenciados or entry.name.endswith(".part"):
+                continue
+            # Vistas previas/miniaturas (_variantes/): viven lo que viva su original
+            en_variantes = os.path.basename(os.path.dirname(entry.path)) == VARIANTES_SUBDIR
+            if en_variantes and original_de(entry.name) in referenciados:
+                continue
+            try:
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            # Periodo de gracia: la subida puede estar a la mitad de su transacción
+            if st.st_mtime > limite:
+                rep.recientes += 1
+                continue
+
+            stats["huerfanos"] += 1
+            rep.huerfanos += 1
+            if dry_run:
+                stats["bytes"] += st.st_size
+                rep.bytes_recuperados += st.st_size
+                continue
+            try:
+                if modo == "borrar":
+                    os.remove(entry.path)
+                else:
+                    destino = os.path.join(cuarentena, nombre, os.path.relpath(entry.path, root))
+                    os.makedirs(os.path.dirname(destino), exist_ok=True)
+                    shutil.move(entry.path, destino)
+                stats["bytes"] += st.st_size
+                rep.bytes_recuperados += st.st_size
+            except OSError:
+                rep.errores += 1
+                logger.exception("UPLOAD GC: no se pudo procesar %s", entry.path)
+
+    logger.info(
+        "UPLOAD GC %s%s: revisados=%s huérfanos=%s bytes=%s",
+        modo, " (dry-run)" if dry_run else "", rep.revisados, rep.huerfanos, rep.bytes_recuperados,
+    )
+    return rep
@@ -0,0 +1,234 @@
+# app/upload_variants.py
+"""
+Vistas previas y miniaturas de comprobantes subidos.
+
+Las fotos de celular pesan varios MB y coordinación las abre una y otra vez
+al revisar. Después de guardar el original se encola (ProcessPoolExecutor,
+contexto spawn, igual que report_jobs) la generación de:
+  - preview: imagen recomprimida (WebP, o JPEG si el Pillow no trae WebP)
+             de hasta UPLOAD_PREVIEW_PX de lado;
+  - thumb:   miniatura de hasta UPLOAD_THUMB_PX (para PDF, la primera página
+             rasterizada con PyMuPDF si está instalado).
+
+Las variantes viven junto al original en `<dir>/_variantes/<nombre>.<variante>.<ext>`:
+no hay columnas nuevas, el archivo existe o no. Si todavía no existe, la
+descarga entrega el original y vuelve a encolar (sirve también de backfill).
+Pillow y PyMuPDF son opcionales: sin ellos simplemente no hay variantes.
+"""
+import logging
+import mimetypes
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Literal, Optional, Tuple
+
+logger = logging.getLogger("celex.upload_variants")
+
+Variante = Literal["original", "preview", "thumb"]
+VARIANTE_PATTERN = "^(original|preview|thumb)$"
+
+UPLOAD_VARIANTS_WORKERS = int(os.getenv("UPLOAD_VARIANTS_WORKERS", "1"))
+UPLOAD_PREVIEW_PX = int(os.getenv("UPLOAD_PREVIEW_PX", "1600"))
+UPLOAD_THUMB_PX = int(os.getenv("UPLOAD_THUMB_PX", "320"))
+UPLOAD_VARIANTS_QUALITY = int(os.getenv("UPLOAD_VARIANTS_QUALITY", "78"))
+
+VARIANTES_SUBDIR = "_variantes"
+
+_IMAGE_EXT = {".png", ".jpg", ".jpeg", ".webp"}
+_PDF_EXT = {".pdf"}
+# Con esto basta para que coordinación lea montos/referencias en la miniatura de un PDF
+_PDF_THUMB_DPI = 72
+
+
+# =========================
+#  Rutas
+# =========================
+def _ruta_variante(original: str, variante: str, ext: str) -> str:
+    d, nombre = os.path.split(original)
+    return os.path.join(d, VARIANTES_SUBDIR, f"{nombre}.{variante}{ext}")
+
+
+def original_de(nombre_variante: str) -> Optional[str]:
+    """'abc.jpg.thumb.webp' → 'abc.jpg' (lo usa el GC de uploads para no tratarlas como huérfanas)."""
+    partes = nombre_variante.rsplit(".", 2)
+    if len(partes) != 3 or partes[1] not in ("preview", "thumb"):
+        return None
+    return partes[0]
+
+
+def variante_existente(original: str, variante: str) -> Optional[str]:
+    for ext in (".webp", ".jpg"):
+        p = _ruta_variante(original, variante, ext)
+        if os.path.exists(p):
+            return p
+    return None
+
+
+def resolver(
+    original: str, variante: Variante, mime: Optional[str] = None
+) -> Tuple[str, str, str]:
+    """
+    (ruta, mime, filename) a servir para `variante`.
+    Si la variante aún no existe (o no aplica) se entrega el original y se encola.
+    """
+    filename = os.path.basename(original)
+    if variante != "original":
+        p = variante_existente(original, variante)
+        if p:
+            ext = os.path.splitext(p)[1]
+            base = os.path.splitext(filename)[0]
+            return p, mimetypes.guess_type(p)[0] or "image/webp", f"{base}.{variante}{ext}"
+        encolar(original)
+    if not mime:
+        mime = mimetypes.guess_type(original)[0] or "application/octet-stream"
+    return original, mime, filename
+
+
+# =========================
+#  Generación (corre en el pool; sin BD)
+# =========================
+def _guardar(img, destino_sin_ext: str) -> str:
+    """Escribe WebP si el Pillow lo soporta, si no JPEG; escritura atómica vía .part."""
+    from PIL import features
+
+    ext, fmt = (".webp", "WEBP") if features.check("webp") else (".jpg", "JPEG")
+    destino = destino_sin_ext + ext
+    tmp = destino + ".part"
+    img.save(tmp, fmt, quality=UPLOAD_VARIANTS_QUALITY, optimize=True)
+    os.replace(tmp, destino)
+    return destino
+
+
+def _a_rgb(img):
+    if img.mode in ("RGBA", "LA", "P"):
+        from PIL import Image
+
+        img = img.convert("RGBA")
+        fondo = Image.new("RGB", img.size, (255, 255, 255))
+        fondo.paste(img, mask=img.getchannel("A"))
+        return fondo
+    return img.convert("RGB") if img.mode != "RGB" else img
+
+
+def _primera_pagina_pdf(path: str):
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        return None
+    from PIL import Image
+
+    with fitz.open(path) as doc:
+        if doc.page_count == 0:
+            return None
+        pix = doc.load_page(0).get_pixmap(dpi=_PDF_THUMB_DPI, alpha=False)
+        return Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+
+
+def generar_variantes(original: str) -> Dict[str, str]:
+    """Genera las variantes que falten de `original`. Regresa {variante: ruta}."""
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return {}
+
+    ext = os.path.splitext(original)[1].lower()
+    if ext not in _IMAGE_EXT and ext not in _PDF_EXT:
+        return {}
+    if not os.path.exists(original):
+        return {}  # se borró (p.ej. 409 tras guardar) antes de procesarse
+
+    faltan = [v for v in ("preview", "thumb") if not variante_existente(original, v)]
+    if ext in _PDF_EXT:
+        faltan = [v for v in faltan if v == "thumb"]  # el PDF ya es su propia vista previa
+    if not faltan:
+        return {}
+
+    os.makedirs(os.path.join(os.path.dirname(original), VARIANTES_SUBDIR), exist_ok=True)
+    Image.MAX_IMAGE_PIXELS = 60_000_000  # fotos de celular sí; bombas de descompresión no
+
+    if ext in _PDF_EXT:
+        img = _primera_pagina_pdf(original)
+        if img is None:
+            return {}
+    else:
+        img = Image.open(original)
+        img.draft("RGB", (UPLOAD_PREVIEW_PX, UPLOAD_PREVIEW_PX))  # JPEG: decodifica ya reducido
+        img = ImageOps.exif_transpose(img)  # fotos de celular vienen rotadas por EXIF
+    img = _a_rgb(img)
+
+    out: Dict[str, str] = {}
+    for variante, px in (("preview", UPLOAD_PREVIEW_PX), ("thumb", UPLOAD_THUMB_PX)):
+        if variante not in faltan:
+            continue
+        copia = img.copy()
+        copia.thumbnail((px, px), Image.LANCZOS)
+        out[variante] = _guardar(copia, _ruta_variante(original, variante, ""))
+    return out
+
+
+def _run(original: str) -> None:
+    try:
+        generar_variantes(original)
+    except Exception:
+        logger.exception("Variantes: falló %s", original)
+
+
+# =========================
+#  Pool de procesos
+# =========================
+_pool = None
+_pool_lock = threading.Lock()
+_pendientes: set = set()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=UPLOAD_VARIANTS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _submit(original: str) -> None:
+    fut = _get_pool().submit(_run, original)
+    fut.add_done_callback(lambda _f: _pendientes.discard(original))
+
+
+def encolar(path: Optional[str]) -> None:
+    """Encola la generación de variantes de `path` (no bloquea; ignora lo que no aplica)."""
+    global _pool
+    if not path:
+        return
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in _IMAGE_EXT and ext not in _PDF_EXT:
+        return
+    original = os.path.abspath(path)
+    with _pool_lock:
+        if original in _pendientes:
+            return
+        _pendientes.add(original)
+    try:
+        try:
+            _submit(original)
+        except BrokenProcessPool:
+            # Un worker murió (OOM con una imagen enorme): se recrea el pool y se reintenta una vez
+            with _pool_lock:
+                _pool = None
+            _submit(original)
+    except Exception:
+        _pendientes.discard(original)
+        logger.exception("Variantes: no se pudo encolar %s", original)
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+        _pendientes.clear()
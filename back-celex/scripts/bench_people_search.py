@@ -0,0 +1,89 @@
+# scripts/bench_people_search.py
+"""
+Compara la búsqueda de personas anterior (ILIKE '%q%' por campo) contra la
+nueva (LIKE por palabra sobre f_unaccent(lower(...)) + índice trigram).
+
+Crea una tabla TEMP con N usuarios sintéticos (nombres con acentos), le pone
+el mismo índice que ix_users_search_trgm y corre EXPLAIN ANALYZE de ambas.
+No toca la tabla users real.
+
+Uso:
+    python -m scripts.bench_people_search [N] [consulta...]
+    python -m scripts.bench_people_search 200000 "jose perez"
+"""
+import sys
+import time
+
+from sqlalchemy import text
+
+from app.database import engine
+from app.db_upgrades import apply_db_upgrades
+from app.search import PERSONA_DOC_SQL, normaliza, _escape_like
+
+NOMBRES = ["José", "María", "Ángel", "Sofía", "Andrés", "Inés", "Raúl", "Mónica", "Héctor", "Lucía"]
+APELLIDOS = ["Pérez", "Gómez", "Núñez", "Martínez", "Ramírez", "López", "Hernández", "Sánchez", "Díaz", "Ortíz"]
+
+
+def _crear_tabla(conn, n: int):
+    nombres = "ARRAY[" + ",".join(f"'{x}'" for x in NOMBRES) + "]"
+    apellidos = "ARRAY[" + ",".join(f"'{x}'" for x in APELLIDOS) + "]"
+    conn.execute(text("DROP TABLE IF EXISTS bench_users"))
+    conn.execute(text(f"""
+        CREATE TEMP TABLE bench_users AS
+        SELECT g AS id,
+               ({nombres})[1 + g % 10] AS first_name,
+               ({apellidos})[1 + (g / 10) % 10] || ' ' || ({apellidos})[1 + (g / 100) % 10] AS last_name,
+               'user' || g || '@example.com' AS email,
+               upper(substr(md5(g::text), 1, 18)) AS curp,
+               CASE WHEN g % 3 = 0 THEN (2020000000 + g)::text END AS boleta,
+               now() - (g || ' minutes')::interval AS created_at
+        FROM generate_series(1, :n) AS g
+    """), {"n": n})
+    conn.execute(text(f"CREATE INDEX ON bench_users USING gin ({PERSONA_DOC_SQL} gin_trgm_ops)"))
+    conn.execute(text("ANALYZE bench_users"))
+
+
+def _explain(conn, sql: str, params: dict) -> str:
+    t0 = time.perf_counter()
+    plan = conn.execute(text("EXPLAIN (ANALYZE, BUFFERS) " + sql), params).scalars().all()
+    dt = (time.perf_counter() - t0) * 1000
+    return f"{dt:8.1f} ms\n    " + "\n    ".join(plan)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    q = " ".join(sys.argv[2:]) or "jose perez"
+
+    apply_db_upgrades(engine)  # pg_trgm, unaccent y f_unaccent
+
+    with engine.begin() as conn:
+        print(f"Creando {n} usuarios sintéticos…")
+        _crear_tabla(conn, n)
+
+        # --- Anterior: ILIKE de la frase completa por campo (no usa índices, no ignora acentos) ---
+        like = f"%{q.strip()}%"
+        viejo = (
+            "SELECT id FROM bench_users WHERE first_name ILIKE :p OR last_name ILIKE :p "
+            "OR email ILIKE :p OR curp ILIKE :p OR boleta ILIKE :p "
+            "ORDER BY created_at DESC LIMIT 25"
+        )
+        print(f"\nILIKE por campo ('{q}'):", _explain(conn, viejo, {"p": like}))
+        total_viejo = conn.execute(text(viejo.replace(" LIMIT 25", "")), {"p": like}).rowcount
+
+        # --- Nuevo: cada palabra sobre el documento normalizado + ranking ---
+        term = normaliza(q)
+        tokens = [t for t in term.split() if t]
+        params = {"term": term, **{f"t{i}": f"%{_escape_like(t)}%" for i, t in enumerate(tokens)}}
+        where = " AND ".join(f"{PERSONA_DOC_SQL} LIKE :t{i}" for i in range(len(tokens)))
+        nuevo = (
+            f"SELECT id FROM bench_users WHERE {where} "
+            f"ORDER BY word_similarity(:term, {PERSONA_DOC_SQL}) DESC, created_at DESC LIMIT 25"
+        )
+        print(f"\nTrigram sin acentos ('{term}'):", _explain(conn, nuevo, params))
+        total_nuevo = conn.execute(text(nuevo.replace(" LIMIT 25", "")), params).rowcount
+
+        print(f"\nCoincidencias: ILIKE={total_viejo}  trigram={total_nuevo}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# scripts/gc_uploads.py
+"""
+Limpia archivos subidos que ya no referencia ninguna fila (ver app/upload_gc.py).
+
+Uso (p.ej. en cron diario):
+    python -m scripts.gc_uploads --dry-run
+    python -m scripts.gc_uploads                       # mueve a cuarentena
+    python -m scripts.gc_uploads --modo borrar --gracia-horas 72
+"""
+import argparse
+
+from app.database import SessionLocal
+from app.upload_gc import UPLOAD_GC_GRACE_HOURS, recolectar
+
+
+def _mb(n: int) -> str:
+    return f"{n / (1024 * 1024):.1f} MB"
+
+
+def main():
+    ap = argparse.ArgumentParser(description="GC de uploads huérfanos")
+    ap.add_argument("--modo", choices=["borrar", "cuarentena"], default="cuarentena")
+    ap.add_argument("--gracia-horas", type=int, default=UPLOAD_GC_GRACE_HOURS)
+    ap.add_argument("--dry-run", action="store_true", help="Solo reporta, no toca archivos")
+    args = ap.parse_args()
+
+    db = SessionLocal()
+    try:
+        rep = recolectar(db, modo=args.modo, gracia_horas=args.gracia_horas, dry_run=args.dry_run)
+    finally:
+        db.close()
+
+    print(f"Rutas referenciadas en BD: {rep.referenciados}")
+    for nombre, s in rep.por_directorio.items():
+        print(f"  {nombre:16} revisados={s['revisados']:7}  huérfanos={s['huerfanos']:6}  {_mb(s['bytes'])}")
+    accion = "se recuperarían" if rep.dry_run else ("borrados" if rep.modo == "borrar" else "en cuarentena")
+    print(
+        f"Total: {rep.huerfanos} huérfanos ({_mb(rep.bytes_recuperados)} {accion}), "
+        f"{rep.recientes} recientes omitidos por gracia, {rep.errores} errores"
+    )
+
+
+if __name__ == "__main__":
+    main()